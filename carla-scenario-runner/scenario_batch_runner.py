@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Welcome to the ScenarioRunner's batch execution
+
+Executes a list of scenario jobs in parallel on several CARLA servers.
+Every line of the job file contains the scenario_runner.py arguments of one job, e.g.:
+
+    --openscenario srunner/examples/FollowLeadingVehicle.xosc
+    --scenario FollowLeadingVehicle_1 --reloadWorld
+    --route srunner/data/routes_debug.xml srunner/data/all_towns_traffic_scenarios1_3_4.json 0
+"""
+
+from __future__ import print_function
+
+import argparse
+from argparse import RawTextHelpFormatter
+import sys
+
+from srunner.tools.batch_scheduler import BatchJob, BatchScheduler, SimulatorEndpoint
+
+
+def main():
+    """
+    main function
+    """
+    description = ("CARLA Scenario Runner: Execute a batch of scenarios in parallel on several CARLA servers\n")
+
+    # pylint: disable=line-too-long
+    parser = argparse.ArgumentParser(description=description,
+                                     formatter_class=RawTextHelpFormatter)
+    parser.add_argument('jobs', help='File with the scenario_runner.py arguments of one job per line')
+    parser.add_argument('--endpoints', nargs='+', default=['127.0.0.1:2000:8000'],
+                        help='CARLA servers to use as host:port:trafficManagerPort (default: 127.0.0.1:2000:8000)')
+    parser.add_argument('--outputDir', default='batch_results',
+                        help='Directory for the output files of all jobs (default: batch_results)')
+    parser.add_argument('--repetitions', default=1, type=int, help='Number of executions of each job')
+    parser.add_argument('--retries', default=1, type=int, help='Number of retries of a failed job')
+    parser.add_argument('--jobTimeout', default=None, type=float, help='Timeout of a single job in seconds')
+    parser.add_argument('--scenarioRunnerArgs', default='',
+                        help='Additional arguments passed to scenario_runner.py for all jobs\n'
+                        '(e.g. "--sync --timeout 20")')
+    # pylint: enable=line-too-long
+
+    arguments = parser.parse_args()
+
+    endpoints = [SimulatorEndpoint.parse(endpoint, arguments.scenarioRunnerArgs.split(), arguments.jobTimeout)
+                 for endpoint in arguments.endpoints]
+    jobs = BatchJob.parse_job_file(arguments.jobs, arguments.repetitions)
+    print("Executing {} jobs on {} endpoints".format(len(jobs), len(endpoints)))
+
+    scheduler = BatchScheduler(endpoints, arguments.outputDir, arguments.retries)
+    jobs = scheduler.run(jobs)
+
+    failed = [job for job in jobs if not job.executed]
+    print("{} of {} jobs executed, results in {}/batch_results.json".format(
+        len(jobs) - len(failed), len(jobs), arguments.outputDir))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
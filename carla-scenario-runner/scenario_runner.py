@@ -28,6 +28,8 @@ import signal
 import sys
 import time
 import json
+import queue
+import threading
 import pkg_resources
 
 import carla
@@ -38,6 +40,7 @@ from srunner.scenariomanager.scenario_manager import ScenarioManager
 from srunner.scenarios.open_scenario import OpenScenario
 from srunner.scenarios.route_scenario import RouteScenario
 from srunner.tools.scenario_parser import ScenarioConfigurationParser
+from srunner.tools.parameter_sweep import ParameterSweep, SweepResultWriter
 from srunner.tools.route_parser import RouteParser
 
 # Version of scenario_runner
@@ -74,6 +77,10 @@ class ScenarioRunner(object):
     agent_instance = None
     module_agent = None
 
+    # Worker mode (see run_worker())
+    WORKER_READY = "ScenarioRunner worker: ready"
+    WORKER_IDLE = "ScenarioRunner worker: idle"
+
     def __init__(self, args):
         """
         Setup CARLA client and world
@@ -102,10 +109,12 @@ class ScenarioRunner(object):
             self.module_agent = importlib.import_module(module_name)
 
         # Create the ScenarioManager
-        self.manager = ScenarioManager(self._args.debug, self._args.sync, self._args.timeout)
+        self.manager = ScenarioManager(self._args.debug, self._args.sync, self._args.timeout, self._args.profile)
 
         # Create signal handler for SIGINT
         self._shutdown_requested = False
+        self._quit_requested = False
+        self._scenario_analyzed_fct = None
         if sys.platform != 'win32':
             signal.signal(signal.SIGHUP, self._signal_handler)
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -131,6 +140,7 @@ class ScenarioRunner(object):
         Terminate scenario ticking when receiving a signal interrupt
         """
         self._shutdown_requested = True
+        self._quit_requested = True
         if self.manager:
             self.manager.stop_scenario()
 
@@ -258,8 +268,12 @@ class ScenarioRunner(object):
         filename = None
         if self._args.file:
             filename = config_name + current_time + ".txt"
+        profile_filename = None
+        if self._args.profile:
+            profile_filename = config_name + current_time + "_profile.json"
 
-        if not self.manager.analyze_scenario(self._args.output, filename, junit_filename, json_filename):
+        if not self.manager.analyze_scenario(self._args.output, filename, junit_filename, json_filename,
+                                             profile_filename):
             print("All scenario tests were passed successfully!")
         else:
             print("Not all scenario tests were successful")
@@ -407,12 +421,20 @@ class ScenarioRunner(object):
                     os.getenv('SCENARIO_RUNNER_ROOT', "./"), self._args.record, config.name)
                 self.client.start_recorder(recorder_name, True)
 
+            events_filename = None
+            if self._args.events:
+                events_filename = "{}{}_events.jsonl".format(
+                    os.path.join(self._args.outputDir, config.name),
+                    datetime.now().strftime('%Y-%m-%d-%H-%M-%S'))
+
             # Load scenario and run it
             self.manager.load_scenario(scenario, self.agent_instance)
-            self.manager.run_scenario()
+            self.manager.run_scenario(events_filename)
 
             # Provide outputs if required
             self._analyze_scenario(config)
+            if self._scenario_analyzed_fct is not None:
+                self._scenario_analyzed_fct(self.manager)
 
             # Remove all actors, stop the recorder and save all criterias (if needed)
             scenario.remove_all_actors()
@@ -475,6 +497,16 @@ class ScenarioRunner(object):
                 self._cleanup()
         return result
 
+    def _get_openscenario_configuration(self, openscenario_params):
+        """
+        Parse the OpenSCENARIO configuration.
+
+        A new configuration is created for every run, as building the scenario modifies it. Repeated
+        runs of a file are still cheap: the validated scenario and catalog trees are cached by
+        OpenScenarioConfiguration, only the parameters are resolved again.
+        """
+        return OpenScenarioConfiguration(self._args.openscenario, self.client, openscenario_params)
+
     def _run_openscenario(self):
         """
         Run a scenario based on OpenSCENARIO
@@ -486,15 +518,67 @@ class ScenarioRunner(object):
             self._cleanup()
             return False
 
+        config = self._get_openscenario_configuration(self._get_openscenario_params())
+
+        result = self._load_and_run_scenario(config)
+        self._cleanup()
+        return result
+
+    def _get_openscenario_params(self):
+        """
+        Parse the --openscenarioparams overwrites ('key:value,...')
+        """
         openscenario_params = {}
         if self._args.openscenarioparams is not None:
             for entry in self._args.openscenarioparams.split(','):
                 [key, val] = [m.strip() for m in entry.split(':')]
                 openscenario_params[key] = val
-        config = OpenScenarioConfiguration(self._args.openscenario, self.client, openscenario_params)
+        return openscenario_params
 
-        result = self._load_and_run_scenario(config)
-        self._cleanup()
+    def _run_parameter_sweep(self):
+        """
+        Run the OpenSCENARIO file once per parameter set of the sweep and
+        write one result row per run into the sweep output file
+        """
+        if not os.path.isfile(self._args.openscenario):
+            print("File does not exist")
+            self._cleanup()
+            return False
+
+        sweep = ParameterSweep.parse(self._args.sweep)
+        writer = SweepResultWriter(self._args.sweepOutput, sweep.get_parameter_names())
+        base_params = self._get_openscenario_params()
+        result = True
+        try:
+            for index, params in enumerate(sweep):
+                if self._shutdown_requested:
+                    break
+                print("Parameter sweep run {}/{}: {}".format(index + 1, len(sweep), params))
+                run_params = dict(base_params)
+                run_params.update(params)
+
+                executed = []
+                self._scenario_analyzed_fct = executed.append
+                self.finished = False
+                self.ego_vehicles = []
+                try:
+                    # The validated xml is cached, only the parameter layer is resolved per run
+                    config = OpenScenarioConfiguration(self._args.openscenario, self.client, run_params)
+                    self._load_and_run_scenario(config)
+                except Exception:   # pylint: disable=broad-except
+                    traceback.print_exc()
+                self._cleanup()
+
+                if executed:
+                    writer.add(params, executed[0])
+                else:
+                    writer.add(params)
+                    result = False
+        finally:
+            self._scenario_analyzed_fct = None
+            writer.close()
+
+        print("Parameter sweep results written to {}".format(self._args.sweepOutput))
         return result
 
     def run(self):
@@ -502,7 +586,9 @@ class ScenarioRunner(object):
         Run all scenarios according to provided commandline args
         """
         result = True
-        if self._args.openscenario:
+        if self._args.openscenario and self._args.sweep:
+            result = self._run_parameter_sweep()
+        elif self._args.openscenario:
             result = self._run_openscenario()
         elif self._args.route:
             result = self._run_route()
@@ -512,6 +598,79 @@ class ScenarioRunner(object):
         print("No more scenarios .... Exiting")
         return result
 
+    def _read_worker_commands(self, commands):
+        """
+        Read the worker commands from stdin (one json object per line).
+        "stop" is handled immediately, all other commands are queued for the worker loop.
+        """
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                commands.put({"command": "quit"})
+                return
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                command = json.loads(line)
+            except ValueError:
+                print("ScenarioRunner worker: invalid command '{}'".format(line))
+                continue
+            if command.get("command") in ("stop", "quit"):
+                self._shutdown_requested = True
+                if self.manager:
+                    self.manager.stop_scenario()
+            if command.get("command") == "quit":
+                self._quit_requested = True
+            commands.put(command)
+
+    def run_worker(self):
+        """
+        Keep the runner alive and execute OpenSCENARIO files on request.
+
+        Commands are read from stdin, one json object per line:
+            {"command": "run", "openscenario": "<file>", "params": "<key:value,...>"}
+            {"command": "stop"}
+            {"command": "quit"}
+
+        The CARLA client, all imports and the parsed scenario configurations stay warm between runs.
+        WORKER_IDLE is printed once per requested scenario, after it finished.
+        """
+        commands = queue.Queue()
+        reader = threading.Thread(target=self._read_worker_commands, args=(commands,))
+        reader.daemon = True
+        reader.start()
+
+        print(self.WORKER_READY)
+        sys.stdout.flush()
+        while not self._quit_requested:
+            try:
+                command = commands.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if command.get("command") != "run":
+                continue
+
+            self._args.openscenario = command.get("openscenario")
+            self._args.openscenarioparams = command.get("params")
+            self._shutdown_requested = False
+            self.finished = False
+            self.ego_vehicles = []
+            start_time = time.time()
+            try:
+                result = self._run_openscenario()
+            except Exception:   # pylint: disable=broad-except
+                traceback.print_exc()
+                result = False
+                self._cleanup()
+            print("ScenarioRunner worker: scenario {} finished with result {} after {:.1f}s".format(
+                self._args.openscenario, result, time.time() - start_time))
+            print(self.WORKER_IDLE)
+            sys.stdout.flush()
+
+        print("ScenarioRunner worker: exiting")
+        return True
+
 
 def main():
     """
@@ -542,6 +701,11 @@ def main():
         '--scenario', help='Name of the scenario to be executed. Use the preposition \'group:\' to run all scenarios of one class, e.g. ControlLoss or FollowLeadingVehicle')
     parser.add_argument('--openscenario', help='Provide an OpenSCENARIO definition')
     parser.add_argument('--openscenarioparams', help='Overwrited for OpenSCENARIO ParameterDeclaration')
+    parser.add_argument('--sweep',
+                        help='Run the OpenSCENARIO file for a sweep of ParameterDeclaration values,\n'
+                        'given as json file or inline (e.g. "Speed=5:15:2.5,Distance=10;20")')
+    parser.add_argument('--sweepOutput', default='sweep_results.csv',
+                        help='File for the results of the parameter sweep (default: sweep_results.csv)')
     parser.add_argument(
         '--route', help='Run a route as a scenario (input: (route_file,scenario_file,[route id]))', nargs='+', type=str)
 
@@ -553,12 +717,17 @@ def main():
     parser.add_argument('--file', action="store_true", help='Write results into a txt file')
     parser.add_argument('--junit', action="store_true", help='Write results into a junit file')
     parser.add_argument('--json', action="store_true", help='Write results into a JSON file')
+    parser.add_argument('--events', action="store_true",
+                        help='Stream the traffic events into a JSON Lines file while running (*_events.jsonl)')
     parser.add_argument('--outputDir', default='', help='Directory for output files (default: this directory)')
 
     parser.add_argument('--configFile', default='', help='Provide an additional scenario configuration file (*.xml)')
     parser.add_argument('--additionalScenario', default='', help='Provide additional scenario implementations (*.py)')
 
     parser.add_argument('--debug', action="store_true", help='Run with debug output')
+    parser.add_argument('--profile', action="store_true",
+                        help='Measure the update() calls of all scenario behaviours.\n'
+                        'Written into a *_profile.json file and shown in the --debug tree')
     parser.add_argument('--reloadWorld', action="store_true",
                         help='Reload the CARLA world before starting a scenario (default=True)')
     parser.add_argument('--record', type=str, default='',
@@ -566,6 +735,9 @@ def main():
     parser.add_argument('--randomize', action="store_true", help='Scenario parameters are randomized')
     parser.add_argument('--repetitions', default=1, type=int, help='Number of scenario executions')
     parser.add_argument('--waitForEgo', action="store_true", help='Connect the scenario to an existing ego vehicle')
+    parser.add_argument('--worker', action="store_true",
+                        help='Keep running and execute OpenSCENARIO files requested via stdin\n'
+                        '(see ScenarioRunner.run_worker)')
 
     arguments = parser.parse_args()
     # pylint: enable=line-too-long
@@ -575,11 +747,16 @@ def main():
         print(*ScenarioConfigurationParser.get_list_of_scenarios(arguments.configFile), sep='\n')
         return 1
 
-    if not arguments.scenario and not arguments.openscenario and not arguments.route:
+    if not arguments.scenario and not arguments.openscenario and not arguments.route and not arguments.worker:
         print("Please specify either a scenario or use the route mode\n\n")
         parser.print_help(sys.stdout)
         return 1
 
+    if arguments.worker and (arguments.route or arguments.scenario or arguments.agent):
+        print("The worker mode only supports OpenSCENARIO files\n\n")
+        parser.print_help(sys.stdout)
+        return 1
+
     if arguments.route and (arguments.openscenario or arguments.scenario):
         print("The route mode cannot be used together with a scenario (incl. OpenSCENARIO)'\n\n")
         parser.print_help(sys.stdout)
@@ -590,7 +767,12 @@ def main():
         parser.print_help(sys.stdout)
         return 1
 
-    if arguments.openscenarioparams and not arguments.openscenario:
+    if arguments.sweep and (not arguments.openscenario or arguments.worker):
+        print("The parameter sweep requires --openscenario and cannot be used in worker mode\n\n")
+        parser.print_help(sys.stdout)
+        return 1
+
+    if arguments.openscenarioparams and not arguments.openscenario and not arguments.worker:
         print("WARN: Ignoring --openscenarioparams when --openscenario is not specified")
 
     if arguments.route:
@@ -603,9 +785,13 @@ def main():
     result = True
     try:
         scenario_runner = ScenarioRunner(arguments)
-        result = scenario_runner.run()
+        if arguments.worker:
+            result = scenario_runner.run_worker()
+        else:
+            result = scenario_runner.run()
     except Exception:   # pylint: disable=broad-except
         traceback.print_exc()
+        result = False
 
     finally:
         if scenario_runner is not None:
@@ -88,6 +88,12 @@ class AgentWrapper(object):
         """
         Remove and destroy all sensors
         """
+        statistics = self._agent.sensor_interface.get_bundle_statistics()
+        if statistics['bundles']:
+            print("Agent sensor bundles: {}, dropped frames: {}, mean skew: {:.3f} s, max skew: {:.3f} s".format(
+                statistics['bundles'], statistics['dropped_frames'], statistics['mean_skew'], statistics['max_skew']))
+        self._agent.sensor_interface.cleanup()
+
         for i, _ in enumerate(self._sensors_list):
             if self._sensors_list[i] is not None:
                 self._sensors_list[i].stop()
@@ -12,6 +12,7 @@ from __future__ import print_function
 import carla
 
 from srunner.autoagents.sensor_interface import SensorInterface
+from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
 from srunner.scenariomanager.timer import GameTime
 from srunner.tools.route_manipulation import downsample_route
 
@@ -22,13 +23,18 @@ class AutonomousAgent(object):
     Autonomous agent base class. All user agents have to be derived from this class
     """
 
+    # Handling of sensors without data for a frame and of frames the agent was too slow for (see SensorInterface)
+    sensor_missing_policy = 'raise'
+    sensor_stale_policy = 'queue'
+
     def __init__(self, path_to_conf_file):
         #  current global plans to reach a destination
         self._global_plan = None
         self._global_plan_world_coord = None
 
         # this data structure will contain all sensor data
-        self.sensor_interface = SensorInterface()
+        self.sensor_interface = SensorInterface(missing_policy=self.sensor_missing_policy,
+                                                stale_policy=self.sensor_stale_policy)
 
         # agent's initialization
         self.setup(path_to_conf_file)
@@ -86,7 +92,9 @@ class AutonomousAgent(object):
         Execute the agent call, e.g. agent()
         Returns the next vehicle controls
         """
-        input_data = self.sensor_interface.get_data()
+        # In synchronous mode, the agent always gets the sensor data of the current frame
+        frame = GameTime.get_frame() if CarlaDataProvider.is_sync_mode() else None
+        input_data = self.sensor_interface.get_data(frame)
 
         timestamp = GameTime.get_time()
         wallclock = GameTime.get_wallclocktime()
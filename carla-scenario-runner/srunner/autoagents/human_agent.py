@@ -74,6 +74,9 @@ class HumanAgent(AutonomousAgent):
     Human agent to control the ego vehicle via keyboard
     """
 
+    # Always show the newest camera image
+    sensor_stale_policy = 'drop'
+
     current_control = None
     agent_engaged = False
     prev_timestamp = 0
@@ -25,6 +25,9 @@ class NpcAgent(AutonomousAgent):
     _agent = None
     _route_assigned = False
 
+    # The sensor data is not used
+    sensor_missing_policy = 'skip'
+
     def setup(self, path_to_conf_file):
         """
         Setup the agent parameters
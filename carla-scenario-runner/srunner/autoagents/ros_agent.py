@@ -51,8 +51,16 @@ class RosAgent(AutonomousAgent):
     the utilized datatypes there.
 
     This agent expects a roscore to be running.
+
+    Only the sensor data of the current frame is published, sensors that missed the frame are skipped.
+
+    If SENSOR_SHARED_MEMORY_PREFIX is defined in your environment, camera and lidar data is not converted
+    to ROS messages, but written to the shared memory segments '<prefix>_<sensor id>'
+    (see srunner/autoagents/sensor_shm.py for the reader).
     """
 
+    sensor_missing_policy = 'skip'
+
     speed = None
     current_control = None
     stack_process = None
@@ -61,6 +69,7 @@ class RosAgent(AutonomousAgent):
     step_mode_possible = None
     vehicle_info_publisher = None
     global_plan_published = None
+    shared_memory_sensors = None
 
     def setup(self, path_to_conf_file):
         """
@@ -159,6 +168,14 @@ class RosAgent(AutonomousAgent):
                 raise TypeError("Invalid sensor type: {}".format(sensor['type']))
         # pylint: enable=line-too-long
 
+        # share camera and lidar data via shared memory, if requested
+        self.shared_memory_sensors = []
+        shared_memory_prefix = os.environ.get('SENSOR_SHARED_MEMORY_PREFIX')
+        if shared_memory_prefix:
+            self.shared_memory_sensors = [sensor['id'] for sensor in self.sensors()
+                                          if sensor['type'] in ('sensor.camera.rgb', 'sensor.lidar.ray_cast')]
+            self.sensor_interface.enable_shared_memory(shared_memory_prefix, tags=self.shared_memory_sensors)
+
     def destroy(self):
         """
         Cleanup of all ROS publishers
@@ -428,6 +445,9 @@ class RosAgent(AutonomousAgent):
         # publish data of all sensors
         for key, val in input_data.items():
             new_data_available = True
+            if key in self.shared_memory_sensors:
+                # already written to shared memory by the sensor interface
+                continue
             sensor_type = self.id_to_sensor_type_map[key]
             if sensor_type == 'sensor.camera.rgb':
                 self.publish_camera(key, val[1])
@@ -8,15 +8,9 @@ This file containts CallBack class and SensorInterface, responsible of
 handling the use of sensors for the agents
 """
 
-import copy
 import logging
-
-try:
-    from queue import Queue
-    from queue import Empty
-except ImportError:
-    from Queue import Queue
-    from Queue import Empty
+import threading
+import time
 
 import numpy as np
 
@@ -68,7 +62,6 @@ class CallBack(object):
         parses cameras
         """
         array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
-        array = copy.deepcopy(array)
         array = np.reshape(array, (image.height, image.width, 4))
         self._data_provider.update_sensor(tag, array, image.frame)
 
@@ -77,7 +70,6 @@ class CallBack(object):
         parses lidar sensors
         """
         points = np.frombuffer(lidar_data.raw_data, dtype=np.dtype('f4'))
-        points = copy.deepcopy(points)
         points = np.reshape(points, (int(points.shape[0] / 4), 4))
         self._data_provider.update_sensor(tag, points, lidar_data.frame)
 
@@ -87,9 +79,8 @@ class CallBack(object):
         """
         # [depth, azimuth, altitute, velocity]
         points = np.frombuffer(radar_data.raw_data, dtype=np.dtype('f4'))
-        points = copy.deepcopy(points)
         points = np.reshape(points, (int(points.shape[0] / 4), 4))
-        points = np.flip(points, 1)
+        points = points[:, ::-1]
         self._data_provider.update_sensor(tag, points, radar_data.frame)
 
     def _parse_gnss_cb(self, gnss_data, tag):
@@ -116,19 +107,190 @@ class CallBack(object):
         self._data_provider.update_sensor(tag, array, imu_data.frame)
 
 
+class SensorRingBuffer(object):
+
+    """
+    Preallocated buffer for the data of one sensor, with one slot per frame.
+
+    The data passed to write() (usually a view of the raw CARLA data) is copied once into the
+    next slot, which is only reallocated if the data does not fit (e.g. a lidar with more points).
+    The arrays returned by get() are views of the slots. A pinned slot (see pin()) is skipped by
+    write(), other slots stay valid until the sensor has written 'slots' more frames.
+    """
+
+    def __init__(self, slots=4):
+        self._arrays = [None] * slots
+        self._views = [None] * slots
+        self._frames = [None] * slots
+        self._arrival_times = [None] * slots
+        self._index = 0
+        self._pinned = None
+
+    def pin(self, frame):
+        """
+        Protect the slot of the frame from being overwritten, until another frame (or None) is pinned
+        """
+        self._pinned = None
+        for index, slot_frame in enumerate(self._frames):
+            if frame is not None and slot_frame == frame:
+                self._pinned = index
+
+    def write(self, data, frame):
+        """
+        Copy the data of the frame into the next slot, which is not pinned. Returns the arrival time
+        """
+        data = np.asarray(data)
+        index = self._index
+        if index == self._pinned and len(self._arrays) > 1:
+            index = (index + 1) % len(self._arrays)
+        self._index = (index + 1) % len(self._arrays)
+
+        # The slot is invalid while it is written
+        self._frames[index] = None
+
+        array = self._arrays[index]
+        if array is None or array.dtype != data.dtype or array.shape[1:] != data.shape[1:] \
+                or (data.ndim > 0 and array.shape[0] < data.shape[0]):
+            array = np.empty_like(data, order='C')
+            self._arrays[index] = array
+        view = array[:data.shape[0]] if data.ndim > 0 else array
+        np.copyto(view, data)
+
+        self._views[index] = view
+        self._arrival_times[index] = time.time()
+        self._frames[index] = frame
+        return self._arrival_times[index]
+
+    def get(self, frame):
+        """
+        Returns the (view, arrival time) of the frame, or None if it is not (or no longer) buffered
+        """
+        for index, slot_frame in enumerate(self._frames):
+            if slot_frame == frame:
+                return self._views[index], self._arrival_times[index]
+        return None
+
+    def get_latest(self, max_frame=None):
+        """
+        Returns the (frame, view, arrival time) of the newest buffered frame (not newer than max_frame),
+        or None if there is none
+        """
+        latest = None
+        for index, slot_frame in enumerate(self._frames):
+            if slot_frame is None or (max_frame is not None and slot_frame > max_frame):
+                continue
+            if latest is None or slot_frame > self._frames[latest]:
+                latest = index
+        if latest is None:
+            return None
+        return self._frames[latest], self._views[latest], self._arrival_times[latest]
+
+    def get_latest_frame(self):
+        latest = self.get_latest()
+        return latest[0] if latest is not None else None
+
+    def get_frames(self):
+        """
+        Returns the buffered frames
+        """
+        return [frame for frame in self._frames if frame is not None]
+
+
+class SensorStatistics(object):
+
+    """
+    Latency statistics of one sensor. The latency is the time the agent had to wait for the data
+    of a requested frame (0 if it was already buffered)
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.gathered = 0
+        self.missing = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def add_latency(self, latency):
+        latency = max(latency, 0.0)
+        self.gathered += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def to_dict(self):
+        return {
+            "frames": self.frames,
+            "gathered": self.gathered,
+            "missing": self.missing,
+            "mean_latency": self.total_latency / self.gathered if self.gathered else 0.0,
+            "max_latency": self.max_latency
+        }
+
+
+class SensorBundle(dict):
+
+    """
+    The data of all sensors for one frame, as dictionary {tag: (frame, data)}.
+
+    In addition, it provides the frame, the skew (time between the arrival of the first and
+    the last sensor data of the frame) and the number of frames dropped before this one.
+    """
+
+    def __init__(self, frame, data, skew=0.0, dropped_frames=0):
+        super(SensorBundle, self).__init__(data)
+        self.frame = frame
+        self.skew = skew
+        self.dropped_frames = dropped_frames
+
+
 class SensorInterface(object):
 
     """
     Class that contains all sensor data
+
+    The data of every sensor is kept in a SensorRingBuffer. get_data() gathers the data of one frame
+    from all sensors. Sensors that have not delivered the frame within the timeout are handled
+    according to the missing policy:
+    - 'raise': raise SensorReceivedNoData (default)
+    - 'last': use the newest older data of the sensor
+    - 'skip': leave the sensor out of the returned data
+
+    If no frame is requested, the stale policy selects the frame to gather:
+    - 'queue': the oldest buffered frame after the previously returned one, so that every frame
+      is delivered in order while it is buffered (default)
+    - 'drop': the newest buffered frame, older frames are dropped
     """
 
-    def __init__(self):
+    MISSING_POLICIES = ('raise', 'last', 'skip')
+    STALE_POLICIES = ('queue', 'drop')
+
+    def __init__(self, timeout=10.0, missing_policy='raise', stale_policy='queue', buffer_slots=4):
         """
         Initializes the class
         """
+        if missing_policy not in self.MISSING_POLICIES:
+            raise ValueError("Invalid missing sensor policy [{}]".format(missing_policy))
+        if stale_policy not in self.STALE_POLICIES:
+            raise ValueError("Invalid stale frame policy [{}]".format(stale_policy))
+
         self._sensors_objects = {}
-        self._new_data_buffers = Queue()
-        self._queue_timeout = 10
+        self._buffers = {}
+        self._statistics = {}
+        self._condition = threading.Condition()
+        self._queue_timeout = timeout
+        self._missing_policy = missing_policy
+        self._stale_policy = stale_policy
+        self._buffer_slots = buffer_slots
+        self._last_frame = None
+
+        self._shared_memory_prefix = None
+        self._shared_memory_slots = 4
+        self._shared_memory_tags = None
+        self._shared_memory_writers = {}
+
+        self._bundles = 0
+        self._dropped_frames = 0
+        self._total_skew = 0.0
+        self._max_skew = 0.0
 
     def register_sensor(self, tag, sensor):
         """
@@ -138,28 +300,180 @@ class SensorInterface(object):
             raise ValueError("Duplicated sensor tag [{}]".format(tag))
 
         self._sensors_objects[tag] = sensor
+        self._buffers[tag] = SensorRingBuffer(self._buffer_slots)
+        self._statistics[tag] = SensorStatistics()
 
     def update_sensor(self, tag, data, timestamp):
         """
-        Updates the sensor
+        Updates the sensor, the data is copied into the sensor's ring buffer
         """
         if tag not in self._sensors_objects:
             raise ValueError("The sensor with tag [{}] has not been created!".format(tag))
 
-        self._new_data_buffers.put((tag, timestamp, data))
+        # written under the lock: get_data() must not look up or pin a slot while it is overwritten
+        with self._condition:
+            arrival_time = self._buffers[tag].write(data, timestamp)
+            self._statistics[tag].frames += 1
+            self._condition.notify_all()
+
+        if self._shared_memory_prefix is not None:
+            self._write_shared_memory(tag, data, timestamp, arrival_time)
 
-    def get_data(self):
+    def enable_shared_memory(self, prefix, slots=4, tags=None):
         """
-        Returns the data of a sensor
+        Additionally write the data of the sensors (all, or the given tags) to shared memory segments
+        named '<prefix>_<tag>', to be read by other local processes (see sensor_shm.SharedMemorySensorReader).
+        The segments are created with the first data of each sensor.
         """
+        self._shared_memory_prefix = prefix
+        self._shared_memory_slots = slots
+        self._shared_memory_tags = tags
+
+    def _write_shared_memory(self, tag, data, frame, arrival_time):
+        """
+        Errors are only logged, the shared memory must not break the delivery of the sensor data.
+        A sensor whose segment can not be created is not written to shared memory anymore.
+        """
+        if self._shared_memory_tags is not None and tag not in self._shared_memory_tags:
+            return
+        from srunner.autoagents.sensor_shm import SharedMemorySensorWriter, get_segment_name
+
+        writer = self._shared_memory_writers.get(tag)
+        if writer is None:
+            # Leave room for sensors with a varying amount of data (e.g. lidar points)
+            slot_size = np.asarray(data).nbytes * 2
+            try:
+                writer = SharedMemorySensorWriter(get_segment_name(self._shared_memory_prefix, tag),
+                                                  slot_size, self._shared_memory_slots)
+            except Exception as e:  # pylint: disable=broad-except
+                logging.error('Cannot create the shared memory segment of sensor [%s]: %s', tag, e)
+                writer = False
+            self._shared_memory_writers[tag] = writer
+        if not writer:
+            return
+
         try:
-            data_dict = {}
-            while len(data_dict.keys()) < len(self._sensors_objects.keys()):
+            if not writer.write(data, frame, arrival_time):
+                logging.warning('Data of sensor [%s] does not fit into its shared memory segment', tag)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error('Cannot write the data of sensor [%s] to shared memory: %s', tag, e)
 
-                sensor_data = self._new_data_buffers.get(True, self._queue_timeout)
-                data_dict[sensor_data[0]] = ((sensor_data[1], sensor_data[2]))
+    def cleanup(self):
+        """
+        Remove the shared memory segments
+        """
+        for writer in self._shared_memory_writers.values():
+            if writer:
+                writer.close()
+        self._shared_memory_writers = {}
 
-        except Empty:
-            raise SensorReceivedNoData("A sensor took too long to send its data")
+    def get_data(self, frame=None):
+        """
+        Returns the data of all sensors for one frame, as SensorBundle (dictionary {tag: (frame, data)}).
+        The data arrays are views of the ring buffers (see SensorRingBuffer), which are not overwritten
+        until the next call of get_data(). Consumers keeping the data longer have to copy it.
+
+        Without frame, the frame is selected by the stale policy.
+        """
+        if not self._buffers:
+            return SensorBundle(frame, {})
+
+        request_time = time.time()
+        deadline = request_time + self._queue_timeout
+
+        with self._condition:
+            # the consumer is done with the previously returned bundle
+            for buffer_ in self._buffers.values():
+                buffer_.pin(None)
+
+            if frame is None:
+                frame = self._wait_for_new_frame(deadline)
+
+            data_dict = {}
+            arrival_times = []
+            while True:
+                for tag, buffer_ in self._buffers.items():
+                    if tag not in data_dict:
+                        entry = buffer_.get(frame)
+                        if entry is not None:
+                            data_dict[tag] = (frame, entry[0])
+                            arrival_times.append(entry[1])
+                            self._statistics[tag].add_latency(entry[1] - request_time)
+
+                remaining = deadline - time.time()
+                if len(data_dict) == len(self._buffers) or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            for tag in self._buffers:
+                if tag not in data_dict:
+                    self._statistics[tag].missing += 1
+                    self._handle_missing_sensor(tag, frame, data_dict)
+
+            for tag, (data_frame, _) in data_dict.items():
+                self._buffers[tag].pin(data_frame)
+
+            dropped_frames = 0
+            if self._last_frame is not None and frame > self._last_frame:
+                dropped_frames = frame - self._last_frame - 1
+            skew = max(arrival_times) - min(arrival_times) if arrival_times else 0.0
+            self._bundles += 1
+            self._dropped_frames += dropped_frames
+            self._total_skew += skew
+            self._max_skew = max(self._max_skew, skew)
+            self._last_frame = frame
+
+        return SensorBundle(frame, data_dict, skew, dropped_frames)
+
+    def _wait_for_new_frame(self, deadline):
+        """
+        Wait until any sensor has data newer than the last returned frame and return the frame to gather
+        """
+        while True:
+            frames = set()
+            complete_frames = None
+            for buffer_ in self._buffers.values():
+                buffer_frames = set(buffer_.get_frames())
+                frames |= buffer_frames
+                complete_frames = buffer_frames if complete_frames is None else complete_frames & buffer_frames
+            if self._last_frame is not None:
+                frames = set(frame for frame in frames if frame > self._last_frame)
+                complete_frames = set(frame for frame in complete_frames if frame > self._last_frame)
+            if frames:
+                if self._stale_policy == 'drop':
+                    return max(frames)
+                # Frames already overwritten in one of the buffers are skipped, if possible
+                return min(complete_frames) if complete_frames else min(frames)
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise SensorReceivedNoData("A sensor took too long to send its data")
+            self._condition.wait(remaining)
+
+    def _handle_missing_sensor(self, tag, frame, data_dict):
+        if self._missing_policy == 'raise':
+            raise SensorReceivedNoData("The sensor [{}] took too long to send the data of frame {}".format(tag, frame))
+        elif self._missing_policy == 'last':
+            latest = self._buffers[tag].get_latest(frame)
+            if latest is None:
+                raise SensorReceivedNoData("The sensor [{}] has not sent any data yet".format(tag))
+            data_dict[tag] = (latest[0], latest[1])
+
+    def get_statistics(self):
+        """
+        Returns the latency statistics of all sensors, as dictionary {tag: statistics}
+        """
+        with self._condition:
+            return {tag: statistics.to_dict() for tag, statistics in self._statistics.items()}
 
-        return data_dict
+    def get_bundle_statistics(self):
+        """
+        Returns the number of returned bundles and dropped frames and the skew between the sensors
+        """
+        with self._condition:
+            return {
+                "bundles": self._bundles,
+                "dropped_frames": self._dropped_frames,
+                "mean_skew": self._total_skew / self._bundles if self._bundles else 0.0,
+                "max_skew": self._max_skew
+            }
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a shared memory transport for sensor data, which allows several local
+processes (recorders, visualizers, bridges...) to read the sensor data without serialization.
+
+Each sensor is written to one POSIX shared memory segment, holding a ring of frames:
+
+    global header | slot headers | slot data
+
+The global header contains the layout, the number of written frames and the process id of the writer. Every slot header
+contains a sequence number, the frame, the timestamp, the dtype and the shape of the data.
+The sequence number is odd while the slot is written, so readers can detect incomplete or
+overwritten data (seqlock).
+
+Usage (writer, e.g. SensorInterface.enable_shared_memory()):
+    writer = SharedMemorySensorWriter('srunner_Center', slot_size=1920 * 1080 * 4)
+    writer.write(array, frame, timestamp)
+
+Usage (reader, in any local process):
+    reader = SharedMemorySensorReader('srunner_Center')
+    data = reader.wait_for_frame(after_frame=None, timeout=1.0)
+    ... use data.array (a view of the shared memory) ...
+    if not data.is_valid(): the data was overwritten while it was used
+"""
+
+from __future__ import print_function
+
+import argparse
+import errno
+import logging
+import os
+import struct
+import time
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError:
+    shared_memory = None
+    resource_tracker = None
+
+
+MAGIC = b'SRSHM001'
+MAX_DIMENSIONS = 4
+
+# magic, slots, slot size, write count, process id of the writer
+GLOBAL_HEADER = struct.Struct('<8sIQQI')
+GLOBAL_HEADER_SIZE = 64
+# sequence, frame, timestamp, dtype, number of dimensions, shape, number of bytes
+SLOT_HEADER = struct.Struct('<Qqd8sI{}IQ'.format(MAX_DIMENSIONS))
+SLOT_HEADER_SIZE = 64
+
+WRITE_COUNT_OFFSET = struct.calcsize('<8sIQ')
+
+
+def _check_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError('cannot import multiprocessing.shared_memory, make sure to use Python 3.8 or newer')
+
+
+def _is_process_running(pid):
+    if pid <= 0:
+        # no writer process recorded
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        # EPERM: the process exists, but belongs to another user
+        return e.errno == errno.EPERM
+    return True
+
+
+def get_segment_name(prefix, tag):
+    """
+    Returns the name of the shared memory segment of a sensor
+    """
+    return "{}_{}".format(prefix, "".join(c if c.isalnum() else '_' for c in str(tag)))
+
+
+class SharedMemorySensorWriter(object):
+
+    """
+    Writes the frames of one sensor into a shared memory ring with the given number of slots.
+    Data larger than slot_size (bytes) can not be written.
+    """
+
+    def __init__(self, name, slot_size, slots=4):
+        _check_shared_memory()
+        self.name = name
+        self.slot_size = int(slot_size)
+        self.slots = slots
+        self._data_offset = GLOBAL_HEADER_SIZE + slots * SLOT_HEADER_SIZE
+        self._shm = self._create(name, self._data_offset + slots * self.slot_size)
+        self._buffer = self._shm.buf
+        self._write_count = 0
+        self._sequences = [0] * slots
+
+        GLOBAL_HEADER.pack_into(self._buffer, 0, MAGIC, slots, self.slot_size, 0, os.getpid())
+
+    @staticmethod
+    def _create(name, size):
+        """
+        Create the segment. A sensor segment of the same name left by a crashed process is removed first.
+        Raises FileExistsError if the segment is still used by a running writer, or is no sensor segment.
+        """
+        try:
+            return shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            pass
+
+        # not registered at the resource tracker, which would remove the segment of a running writer at exit
+        existing = SharedMemorySensorReader._attach(name)  # pylint: disable=protected-access
+        try:
+            owner = None
+            if existing.size >= GLOBAL_HEADER.size:
+                magic, _, _, _, owner = GLOBAL_HEADER.unpack_from(existing.buf, 0)
+                if magic != MAGIC:
+                    owner = None
+            if owner is None:
+                raise FileExistsError("Shared memory segment [{}] exists and contains no sensor data".format(name))
+            if _is_process_running(owner):
+                raise FileExistsError("Shared memory segment [{}] is used by process {}".format(name, owner))
+        finally:
+            existing.close()
+
+        logging.warning('Removing stale shared memory segment [%s] of process %d', name, owner)
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+    def write(self, data, frame, timestamp=0.0):
+        """
+        Copy the data of the frame into the next slot. Returns False if the data does not fit
+        """
+        data = np.asarray(data)
+        if data.nbytes > self.slot_size or data.ndim > MAX_DIMENSIONS:
+            return False
+
+        index = self._write_count % self.slots
+        header_offset = GLOBAL_HEADER_SIZE + index * SLOT_HEADER_SIZE
+        data_offset = self._data_offset + index * self.slot_size
+
+        # odd sequence: the slot is being written
+        self._sequences[index] += 1
+        struct.pack_into('<Q', self._buffer, header_offset, self._sequences[index])
+
+        target = np.ndarray(data.shape, dtype=data.dtype, buffer=self._buffer, offset=data_offset)
+        np.copyto(target, data)
+
+        shape = list(data.shape) + [0] * (MAX_DIMENSIONS - data.ndim)
+        self._sequences[index] += 1
+        SLOT_HEADER.pack_into(self._buffer, header_offset, self._sequences[index], frame, timestamp,
+                              data.dtype.str.encode('ascii'), data.ndim, *(shape + [data.nbytes]))
+
+        self._write_count += 1
+        struct.pack_into('<Q', self._buffer, WRITE_COUNT_OFFSET, self._write_count)
+        return True
+
+    def close(self):
+        """
+        Close and remove the shared memory segment
+        """
+        if self._shm is not None:
+            self._buffer = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class SharedSensorData(object):
+
+    """
+    Frame read from the shared memory. The array is a view of the shared memory,
+    is_valid() tells if the slot has not been overwritten since it was read
+    """
+
+    def __init__(self, reader, index, sequence, frame, timestamp, array):
+        self._reader = reader
+        self._index = index
+        self._sequence = sequence
+        self.frame = frame
+        self.timestamp = timestamp
+        self.array = array
+
+    def is_valid(self):
+        return self._reader.get_sequence(self._index) == self._sequence
+
+    def copy(self):
+        """
+        Returns a copy of the array, or None if the slot was overwritten while copying
+        """
+        array = self.array.copy()
+        return array if self.is_valid() else None
+
+
+class SharedMemorySensorReader(object):
+
+    """
+    Reads the frames of one sensor from the shared memory segment created by a SharedMemorySensorWriter
+    """
+
+    def __init__(self, name):
+        _check_shared_memory()
+        self.name = name
+        self._shm = self._attach(name)
+        self._buffer = self._shm.buf
+
+        magic, self.slots, self.slot_size, _, self.writer_pid = GLOBAL_HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Shared memory segment [{}] contains no sensor data".format(name))
+        self._data_offset = GLOBAL_HEADER_SIZE + self.slots * SLOT_HEADER_SIZE
+
+    @staticmethod
+    def _attach(name):
+        """
+        Attach to the segment without registering it at the resource tracker, only the writer removes it
+        """
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13, attaching always registers the segment
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                return shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+
+    def get_write_count(self):
+        return struct.unpack_from('<Q', self._buffer, WRITE_COUNT_OFFSET)[0]
+
+    def get_sequence(self, index):
+        return struct.unpack_from('<Q', self._buffer, GLOBAL_HEADER_SIZE + index * SLOT_HEADER_SIZE)[0]
+
+    def _read_slot(self, index):
+        values = SLOT_HEADER.unpack_from(self._buffer, GLOBAL_HEADER_SIZE + index * SLOT_HEADER_SIZE)
+        sequence, frame, timestamp, dtype, ndim = values[:5]
+        if sequence == 0 or sequence % 2 == 1:
+            return None
+        shape = values[5:5 + ndim]
+        array = np.ndarray(shape, dtype=np.dtype(dtype.rstrip(b'\0').decode('ascii')), buffer=self._buffer,
+                           offset=self._data_offset + index * self.slot_size)
+        data = SharedSensorData(self, index, sequence, frame, timestamp, array)
+        return data if data.is_valid() else None
+
+    def read_latest(self):
+        """
+        Returns the newest complete frame (SharedSensorData), or None if there is none
+        """
+        write_count = self.get_write_count()
+        for count in range(write_count, max(write_count - self.slots, 0), -1):
+            data = self._read_slot((count - 1) % self.slots)
+            if data is not None:
+                return data
+        return None
+
+    def read(self, frame):
+        """
+        Returns the given frame (SharedSensorData), or None if it is not (or no longer) available
+        """
+        for index in range(self.slots):
+            data = self._read_slot(index)
+            if data is not None and data.frame == frame:
+                return data
+        return None
+
+    def wait_for_frame(self, after_frame=None, timeout=1.0, poll_interval=0.0005):
+        """
+        Wait for a frame newer than after_frame and return the newest one (None after the timeout)
+        """
+        deadline = time.time() + timeout
+        while True:
+            data = self.read_latest()
+            if data is not None and (after_frame is None or data.frame > after_frame):
+                return data
+            if time.time() > deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        if self._shm is not None:
+            self._buffer = None
+            self._shm.close()
+            self._shm = None
+
+
+def _benchmark_reader(name, duration, results):
+    """
+    Read all new frames and touch their data, as a visualizer or recorder would
+    """
+    reader = SharedMemorySensorReader(name)
+    received = 0
+    invalid = 0
+    last_frame = None
+    latencies = []
+    end_time = time.time() + duration
+    while time.time() < end_time:
+        data = reader.wait_for_frame(last_frame, timeout=0.1)
+        if data is None:
+            continue
+        latencies.append(time.time() - data.timestamp)
+        int(data.array[::16, ::16].sum())
+        if data.is_valid():
+            received += 1
+        else:
+            invalid += 1
+        last_frame = data.frame
+    reader.close()
+    results.put((received, invalid, float(np.mean(latencies)) if latencies else 0.0))
+
+
+def main():
+    """
+    Benchmark: one writer and several reader processes sharing camera frames
+    """
+    import multiprocessing  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description="Shared memory sensor transport benchmark")
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--fps', default=30.0, type=float, help='Frames per second (0: as fast as possible)')
+    parser.add_argument('--readers', default=3, type=int)
+    parser.add_argument('--duration', default=5.0, type=float, help='Seconds to write frames')
+    args = parser.parse_args()
+
+    name = get_segment_name('srunner_benchmark', time.time())
+    image = np.random.randint(0, 255, (args.height, args.width, 4), dtype=np.uint8)
+    writer = SharedMemorySensorWriter(name, image.nbytes)
+
+    results = multiprocessing.Queue()
+    readers = [multiprocessing.Process(target=_benchmark_reader, args=(name, args.duration + 0.5, results))
+               for _ in range(args.readers)]
+    for process in readers:
+        process.start()
+    time.sleep(0.3)
+
+    frames = 0
+    write_time = 0.0
+    start_time = time.time()
+    while time.time() - start_time < args.duration:
+        write_start = time.time()
+        writer.write(image, frames, write_start)
+        write_time += time.time() - write_start
+        frames += 1
+        if args.fps > 0:
+            time.sleep(max(0.0, start_time + frames / args.fps - time.time()))
+    elapsed = time.time() - start_time
+
+    reader_results = [results.get() for _ in readers]
+    for process in readers:
+        process.join()
+    writer.close()
+
+    print("{}x{} RGBA frames: {} written in {:.2f} s ({:.1f} fps, {:.2f} ms per write, {:.0f} MB/s)".format(
+        args.width, args.height, frames, elapsed, frames / elapsed, 1e3 * write_time / frames,
+        frames * image.nbytes / 1e6 / elapsed))
+    for i, (received, invalid, latency) in enumerate(reader_results):
+        print("Reader {}: {} frames received, {} overwritten while reading, {:.2f} ms mean latency".format(
+            i, received, invalid, 1e3 * latency))
+
+
+if __name__ == '__main__':
+    main()
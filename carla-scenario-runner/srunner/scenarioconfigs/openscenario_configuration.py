@@ -9,6 +9,8 @@
 This module provides the key configuration parameters for a scenario based on OpenSCENARIO
 """
 
+import copy
+import hashlib
 import logging
 import os
 import xml.etree.ElementTree as ET
@@ -29,17 +31,30 @@ class OpenScenarioConfiguration(ScenarioConfiguration):
     """
     Limitations:
     - Only one Story + Init is supported per Storyboard
+
+    Parsed and validated scenario and catalog files are cached in-process, keyed by the file content.
+    Only the parameters are resolved for each configuration, so e.g. variants of a scenario with
+    different parameters share the parsed tree. To skip the XSD validation in other processes, the
+    content hashes of valid files are remembered as empty marker files in cache_dir (disabled if empty),
+    which has to be a private directory of the current user. Nothing is ever loaded from the cache_dir.
     """
 
+    CACHE_VERSION = 3
+    cache_dir = os.getenv('SCENARIO_RUNNER_CACHE_DIR',
+                          os.path.join(os.path.expanduser("~"), ".cache", "scenario_runner", "openscenario"))
+
+    _xsd_schema = None
+    _cache = {}
+
     def __init__(self, filename, client, custom_params):
 
-        self.xml_tree = ET.parse(filename)
         self.filename = filename
         self._custom_params = custom_params if custom_params is not None else {}
-
-        self._validate_openscenario_configuration()
         self.client = client
 
+        # the cached tree gets modified (parameters, scenario building), so every configuration gets its own copy
+        self.xml_tree = ET.ElementTree(copy.deepcopy(self._load_validated_xml(filename)))
+
         self.catalogs = {}
 
         self.other_actors = []
@@ -59,25 +74,68 @@ class OpenScenarioConfiguration(ScenarioConfiguration):
         self._set_parameters()
         self._parse_openscenario_configuration()
 
-    def _validate_openscenario_configuration(self):
+    @staticmethod
+    def _get_xsd_schema():
         """
-        Validate the given OpenSCENARIO config against the 1.0 XSD
-
-        Note: This will throw if the config is not valid. But this is fine here.
+        The OpenSCENARIO 1.0 XSD, compiled once per process
         """
-        xsd_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../openscenario/OpenSCENARIO.xsd")
-        xsd = xmlschema.XMLSchema(xsd_file)
-        xsd.validate(self.xml_tree)
+        if OpenScenarioConfiguration._xsd_schema is None:
+            xsd_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../openscenario/OpenSCENARIO.xsd")
+            OpenScenarioConfiguration._xsd_schema = xmlschema.XMLSchema(xsd_file)
+        return OpenScenarioConfiguration._xsd_schema
 
-    def _validate_openscenario_catalog_configuration(self, catalog_xml_tree):
+    @classmethod
+    def _get_private_cache_dir(cls):
+        """
+        Returns cache_dir, created if required, or None if it is disabled or also writable by other users
+        """
+        if not cls.cache_dir:
+            return None
+        try:
+            if not os.path.isdir(cls.cache_dir):
+                os.makedirs(cls.cache_dir, 0o700)
+            status = os.stat(cls.cache_dir)
+        except OSError as e:
+            logging.getLogger("[SR:OpenScenarioConfiguration]").warning(
+                " Could not create cache directory %s: %s", cls.cache_dir, e)
+            return None
+        if hasattr(os, 'getuid') and (status.st_uid != os.getuid() or status.st_mode & 0o022):
+            logging.getLogger("[SR:OpenScenarioConfiguration]").warning(
+                " Ignoring cache directory %s, it is not a private directory of the current user", cls.cache_dir)
+            return None
+        return cls.cache_dir
+
+    @classmethod
+    def _load_validated_xml(cls, filename):
         """
-        Validate the given OpenSCENARIO catalog config against the 1.0 XSD
+        Parse the given OpenSCENARIO (or catalog) file and validate it against the 1.0 XSD.
+        Returns the root element, which is shared with other configurations and must not be modified.
 
-        Note: This will throw if the catalog config is not valid. But this is fine here.
+        Note: This will throw if the file is not valid. But this is fine here.
         """
-        xsd_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../openscenario/OpenSCENARIO.xsd")
-        xsd = xmlschema.XMLSchema(xsd_file)
-        xsd.validate(catalog_xml_tree)
+        with open(filename, 'rb') as input_file:
+            content = input_file.read()
+        key = hashlib.sha1("{}:".format(cls.CACHE_VERSION).encode() + content).hexdigest()
+
+        root = cls._cache.get(key)
+        if root is not None:
+            return root
+
+        xml_tree = ET.ElementTree(ET.fromstring(content))
+        cache_dir = cls._get_private_cache_dir()
+        marker_file_name = os.path.join(cache_dir, key + ".valid") if cache_dir else None
+        if marker_file_name is None or not os.path.isfile(marker_file_name):
+            cls._get_xsd_schema().validate(xml_tree)
+            if marker_file_name:
+                try:
+                    open(marker_file_name, 'w').close()
+                except (IOError, OSError) as e:
+                    logging.getLogger("[SR:OpenScenarioConfiguration]").warning(
+                        " Could not cache %s: %s", filename, e)
+
+        root = xml_tree.getroot()
+        cls._cache[key] = root
+        return root
 
     def _parse_openscenario_configuration(self):
         """
@@ -131,9 +189,8 @@ class OpenScenarioConfiguration(ScenarioConfiguration):
             if not os.path.isfile(catalog_path):
                 self.logger.warning(" The %s path for the %s Catalog is invalid", catalog_path, catalog_type)
             else:
-                xml_tree = ET.parse(catalog_path)
-                self._validate_openscenario_catalog_configuration(xml_tree)
-                catalog = xml_tree.find("Catalog")
+                # catalog entries are copied before use (see OpenScenarioParser.get_catalog_entry)
+                catalog = self._load_validated_xml(catalog_path).find("Catalog")
                 catalog_name = catalog.attrib.get("name")
                 self.catalogs[catalog_name] = {}
                 for entry in catalog:
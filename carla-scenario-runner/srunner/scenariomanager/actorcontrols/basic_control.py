@@ -13,6 +13,10 @@ this class.
 A user must not modify the module.
 """
 
+import carla
+
+from srunner.scenariomanager.actorcontrols.control_batch import ControlBatch
+
 
 class BasicControl(object):
 
@@ -108,6 +112,39 @@ class BasicControl(object):
             "This function must be re-implemented by the user-defined actor control."
             "If this error becomes visible the class hierarchy is somehow broken")
 
+    def _apply_control(self, control):
+        """
+        Apply a carla.VehicleControl or carla.WalkerControl to the actor.
+        While the ScenarioManager ticks the scenario, the command is sent with the batch of all actors.
+        """
+        if isinstance(control, carla.WalkerControl):
+            command = carla.command.ApplyWalkerControl(self._actor.id, control)
+        else:
+            command = carla.command.ApplyVehicleControl(self._actor.id, control)
+        if not ControlBatch.add(command):
+            self._actor.apply_control(control)
+
+    def _set_target_velocity(self, velocity):
+        """
+        Set the target velocity (carla.Vector3D) of the actor (batched, see _apply_control)
+        """
+        if not ControlBatch.add(carla.command.ApplyTargetVelocity(self._actor.id, velocity)):
+            self._actor.set_target_velocity(velocity)
+
+    def _set_target_angular_velocity(self, angular_velocity):
+        """
+        Set the target angular velocity (carla.Vector3D) of the actor (batched, see _apply_control)
+        """
+        if not ControlBatch.add(carla.command.ApplyTargetAngularVelocity(self._actor.id, angular_velocity)):
+            self._actor.set_target_angular_velocity(angular_velocity)
+
+    def _set_transform(self, transform):
+        """
+        Move the actor to the carla.Transform (batched, see _apply_control)
+        """
+        if not ControlBatch.add(carla.command.ApplyTransform(self._actor.id, transform)):
+            self._actor.set_transform(transform)
+
     def run_step(self):
         """
         Pure virtual function to run one step of the controllers's control loop.
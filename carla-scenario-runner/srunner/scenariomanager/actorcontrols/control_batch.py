@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides the collection of the actor control commands issued during one tick,
+which are then sent to CARLA in a single batch.
+"""
+
+
+class ControlBatch(object):
+
+    """
+    This (static) class collects the control commands (carla.command.*) of all actor controllers.
+
+    The ScenarioManager starts the collection before ticking the scenario tree and flushes the
+    collected commands with a single client.apply_batch() afterwards. Outside of begin()/flush()
+    the controllers apply their commands directly (see BasicControl).
+    """
+
+    _client = None
+    _commands = None
+
+    @staticmethod
+    def begin(client):
+        """
+        Start collecting commands, which are later sent via the given client.
+        Without client (None), nothing is collected.
+        """
+        ControlBatch._client = client
+        ControlBatch._commands = [] if client is not None else None
+
+    @staticmethod
+    def is_active():
+        return ControlBatch._commands is not None
+
+    @staticmethod
+    def add(command):
+        """
+        Add a command to the batch. Returns False if no batch is active (the caller has to apply it directly).
+        """
+        if ControlBatch._commands is None:
+            return False
+        ControlBatch._commands.append(command)
+        return True
+
+    @staticmethod
+    def flush():
+        """
+        Send all collected commands in one batch and stop collecting. Returns the number of commands.
+        """
+        commands = ControlBatch._commands
+        client = ControlBatch._client
+        ControlBatch._commands = None
+        ControlBatch._client = None
+        if commands:
+            client.apply_batch(commands)
+            return len(commands)
+        return 0
@@ -18,6 +18,7 @@ from agents.navigation.local_planner import RoadOption
 
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
 from srunner.scenariomanager.actorcontrols.basic_control import BasicControl
+from srunner.tools.waypoint_graph_cache import WaypointGraphCache
 
 
 class NpcVehicleControl(BasicControl):
@@ -82,7 +83,8 @@ class NpcVehicleControl(BasicControl):
         """
         plan = []
         for transform in self._waypoints:
-            waypoint = CarlaDataProvider.get_map().get_waypoint(
+            # route waypoints are often shared by several actors, so their projections are cached
+            waypoint = WaypointGraphCache.get_waypoint(
                 transform.location, project_to_road=True, lane_type=carla.LaneType.Any)
             plan.append((waypoint, RoadOption.LANEFOLLOW))
         self._local_planner.set_global_plan(plan)
@@ -149,9 +151,10 @@ class NpcVehicleControl(BasicControl):
         if self._local_planner.done():
             self._reached_goal = True
 
-        self._actor.apply_control(control)
+        self._apply_control(control)
 
-        current_speed = math.sqrt(self._actor.get_velocity().x**2 + self._actor.get_velocity().y**2)
+        current_velocity = self._actor.get_velocity()
+        current_speed = math.sqrt(current_velocity.x**2 + current_velocity.y**2)
 
         if self._init_speed:
 
@@ -161,7 +164,7 @@ class NpcVehicleControl(BasicControl):
                 yaw = self._actor.get_transform().rotation.yaw * (math.pi / 180)
                 vx = math.cos(yaw) * target_speed
                 vy = math.sin(yaw) * target_speed
-                self._actor.set_target_velocity(carla.Vector3D(vx, vy, 0))
+                self._set_target_velocity(carla.Vector3D(vx, vy, 0))
 
         # Change Brake light state
         if (current_speed > target_speed or target_speed < 0.2) and not self._brake_lights_active:
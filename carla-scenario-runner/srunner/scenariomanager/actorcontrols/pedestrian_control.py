@@ -84,12 +84,12 @@ class PedestrianControl(BasicControl):
                 current_transform = self._actor.get_transform()
                 new_transform = current_transform
                 new_transform.location = new_transform.location + carla.Location(z=0.3)
-                self._actor.set_transform(new_transform)
+                self._set_transform(new_transform)
                 self._colliding_actor = None
                 return
                 #direction = direction + carla.Location(z=0.3)
             control.direction = direction / direction_norm
-            self._actor.apply_control(control)
+            self._apply_control(control)
             if direction_norm < 1.0:
                 self._waypoints = self._waypoints[1:]
                 if not self._waypoints:
@@ -103,6 +103,6 @@ class PedestrianControl(BasicControl):
 
         else:
             control.direction = self._actor.get_transform().rotation.get_forward_vector()
-            self._actor.apply_control(control)
+            self._apply_control(control)
 
         self._colliding_actor = None
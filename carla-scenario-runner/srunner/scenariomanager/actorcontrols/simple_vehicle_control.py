@@ -14,6 +14,7 @@ Limitations:
 - Can only consider obstacles in forward facing reaching (i.e. in tight corners obstacles may be ignored).
 """
 
+from collections import deque
 from distutils.util import strtobool
 import math
 
@@ -23,6 +24,7 @@ from srunner.scenariomanager.actorcontrols.basic_control import BasicControl
 from srunner.scenariomanager.actorcontrols.visualizer import Visualizer
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
 from srunner.scenariomanager.timer import GameTime
+from srunner.tools.waypoint_graph_cache import WaypointGraphCache
 
 
 class SimpleVehicleControl(BasicControl):
@@ -61,9 +63,12 @@ class SimpleVehicleControl(BasicControl):
 
     Attributes:
 
-        _generated_waypoint_list (list of carla.Transform): List of target waypoints the actor
+        _generated_waypoint_list (deque of carla.Transform): List of target waypoints the actor
             should travel along. A waypoint here is of type carla.Transform!
-            Defaults to [].
+            Defaults to an empty deque.
+        _generated_waypoint_tail (carla.Waypoint): Map waypoint of the last entry of _generated_waypoint_list,
+            from which the list is extended.
+            Defaults to None.
         _last_update (float): Last time step the update function (tick()) was called.
             Defaults to None.
         _consider_obstacles (boolean): Enable/Disable consideration of obstacles
@@ -84,7 +89,8 @@ class SimpleVehicleControl(BasicControl):
 
     def __init__(self, actor, args=None):
         super(SimpleVehicleControl, self).__init__(actor)
-        self._generated_waypoint_list = []
+        self._generated_waypoint_list = deque()
+        self._generated_waypoint_tail = None
         self._last_update = None
         self._consider_traffic_lights = False
         self._consider_obstacles = False
@@ -167,7 +173,7 @@ class SimpleVehicleControl(BasicControl):
         if self._reached_goal:
             # Reached the goal, so stop
             velocity = carla.Vector3D(0, 0, 0)
-            self._actor.set_target_velocity(velocity)
+            self._set_target_velocity(velocity)
             return
 
         if self._visualizer:
@@ -175,46 +181,51 @@ class SimpleVehicleControl(BasicControl):
 
         self._reached_goal = False
 
+        # The location is only requested once per step
+        location = CarlaDataProvider.get_location(self._actor)
+
         if not self._waypoints:
             # No waypoints are provided, so we have to create a list of waypoints internally
             # get next waypoints from map, to avoid leaving the road
             self._reached_goal = False
 
-            map_wp = None
-            if not self._generated_waypoint_list:
-                map_wp = CarlaDataProvider.get_map().get_waypoint(CarlaDataProvider.get_location(self._actor))
-            else:
-                map_wp = CarlaDataProvider.get_map().get_waypoint(self._generated_waypoint_list[-1].location)
-            while len(self._generated_waypoint_list) < 50:
-                map_wps = map_wp.next(2.0)
-                if map_wps:
-                    self._generated_waypoint_list.append(map_wps[0].transform)
-                    map_wp = map_wps[0]
-                else:
-                    break
+            if not self._generated_waypoint_list or self._generated_waypoint_tail is None:
+                self._generated_waypoint_list.clear()
+                self._generated_waypoint_tail = CarlaDataProvider.get_map().get_waypoint(location)
+            if len(self._generated_waypoint_list) < 50:
+                # the successors are shared with all other actors driving along the same lanes
+                for map_wp in WaypointGraphCache.get_successors(
+                        self._generated_waypoint_tail, 50 - len(self._generated_waypoint_list), 2.0):
+                    self._generated_waypoint_list.append(map_wp.transform)
+                    self._generated_waypoint_tail = map_wp
 
             # Remove all waypoints that are too close to the vehicle
             while (self._generated_waypoint_list and
-                   self._generated_waypoint_list[0].location.distance(self._actor.get_location()) < 0.5):
-                self._generated_waypoint_list = self._generated_waypoint_list[1:]
+                   self._generated_waypoint_list[0].location.distance(location) < 0.5):
+                self._generated_waypoint_list.popleft()
 
-            direction_norm = self._set_new_velocity(self._offset_waypoint(self._generated_waypoint_list[0]))
+            target = self._generated_waypoint_list[0]
+            direction_norm = self._set_new_velocity(self._offset_waypoint(target), location, target.rotation.yaw)
             if direction_norm < 2.0:
-                self._generated_waypoint_list = self._generated_waypoint_list[1:]
+                self._generated_waypoint_list.popleft()
         else:
+            if not isinstance(self._waypoints, deque):
+                # copy into a deque, dropping reached waypoints is then O(1)
+                self._waypoints = deque(self._waypoints)
+
             # When changing from "free" driving without pre-defined waypoints to a defined route with waypoints
             # it may happen that the first few waypoints are too close to the ego vehicle for obtaining a
             # reasonable control command. Therefore, we drop these waypoints first.
-            while self._waypoints and self._waypoints[0].location.distance(self._actor.get_location()) < 0.5:
-                self._waypoints = self._waypoints[1:]
+            while self._waypoints and self._waypoints[0].location.distance(location) < 0.5:
+                self._waypoints.popleft()
 
             self._reached_goal = False
             if not self._waypoints:
                 self._reached_goal = True
             else:
-                direction_norm = self._set_new_velocity(self._offset_waypoint(self._waypoints[0]))
+                direction_norm = self._set_new_velocity(self._offset_waypoint(self._waypoints[0]), location)
                 if direction_norm < 4.0:
-                    self._waypoints = self._waypoints[1:]
+                    self._waypoints.popleft()
                     if not self._waypoints:
                         self._reached_goal = True
 
@@ -238,7 +249,7 @@ class SimpleVehicleControl(BasicControl):
 
         return offset_location
 
-    def _set_new_velocity(self, next_location):
+    def _set_new_velocity(self, next_location, current_location=None, next_yaw=None):
         """
         Calculate and set the new actor veloctiy given the current actor
         location and the _next_location_
@@ -253,6 +264,8 @@ class SimpleVehicleControl(BasicControl):
 
         Args:
             next_location (carla.Location): Next target location of the actor
+            current_location (carla.Location): Current location of the actor (requested if None)
+            next_yaw (float): Heading at next_location, if known (otherwise taken from the map)
 
         returns:
             direction (carla.Vector3D): Length of direction vector of the actor
@@ -264,15 +277,19 @@ class SimpleVehicleControl(BasicControl):
         if not self._last_update:
             self._last_update = current_time
 
-        current_speed = math.sqrt(self._actor.get_velocity().x**2 + self._actor.get_velocity().y**2)
+        current_velocity = self._actor.get_velocity()
+        current_speed = math.sqrt(current_velocity.x**2 + current_velocity.y**2)
+
+        if current_location is None:
+            current_location = CarlaDataProvider.get_location(self._actor)
 
         if self._consider_obstacles:
             # If distance is less than the proximity threshold, adapt velocity
             if self._obstacle_distance < self._proximity_threshold:
                 distance = max(self._obstacle_distance, 0)
                 if distance > 0:
-                    current_speed_other = math.sqrt(
-                        self._obstacle_actor.get_velocity().x**2 + self._obstacle_actor.get_velocity().y**2)
+                    velocity_other = self._obstacle_actor.get_velocity()
+                    current_speed_other = math.sqrt(velocity_other.x**2 + velocity_other.y**2)
                     if current_speed_other < current_speed:
                         acceleration = -0.5 * (current_speed - current_speed_other)**2 / distance
                         target_speed = max(acceleration * (current_time - self._last_update) + current_speed, 0)
@@ -308,12 +325,12 @@ class SimpleVehicleControl(BasicControl):
 
         # set new linear velocity
         velocity = carla.Vector3D(0, 0, 0)
-        direction = next_location - CarlaDataProvider.get_location(self._actor)
+        direction = next_location - current_location
         direction_norm = math.sqrt(direction.x**2 + direction.y**2)
         velocity.x = direction.x / direction_norm * target_speed
         velocity.y = direction.y / direction_norm * target_speed
 
-        self._actor.set_target_velocity(velocity)
+        self._set_target_velocity(velocity)
 
         # set new angular velocity
         current_yaw = CarlaDataProvider.get_transform(self._actor).rotation.yaw
@@ -322,8 +339,9 @@ class SimpleVehicleControl(BasicControl):
         if self._waypoints:
             delta_yaw = math.degrees(math.atan2(direction.y, direction.x)) - current_yaw
         else:
-            new_yaw = CarlaDataProvider.get_map().get_waypoint(next_location).transform.rotation.yaw
-            delta_yaw = new_yaw - current_yaw
+            if next_yaw is None:
+                next_yaw = CarlaDataProvider.get_map().get_waypoint(next_location).transform.rotation.yaw
+            delta_yaw = next_yaw - current_yaw
 
         if math.fabs(delta_yaw) > 360:
             delta_yaw = delta_yaw % 360
@@ -338,7 +356,7 @@ class SimpleVehicleControl(BasicControl):
             angular_velocity.z = 0
         else:
             angular_velocity.z = delta_yaw / (direction_norm / target_speed)
-        self._actor.set_target_angular_velocity(angular_velocity)
+        self._set_target_angular_velocity(angular_velocity)
 
         self._last_update = current_time
 
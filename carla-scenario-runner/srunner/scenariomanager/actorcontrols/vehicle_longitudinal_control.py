@@ -63,11 +63,11 @@ class VehicleLongitudinalControl(BasicControl):
         else:
             control.throttle = 0.0
 
-        self._actor.apply_control(control)
+        self._apply_control(control)
 
         if self._init_speed:
             if abs(self._target_speed - current_speed) > 3:
                 yaw = self._actor.get_transform().rotation.yaw * (math.pi / 180)
                 vx = math.cos(yaw) * self._target_speed
                 vy = math.sin(yaw) * self._target_speed
-                self._actor.set_target_velocity(carla.Vector3D(vx, vy, 0))
+                self._set_target_velocity(carla.Vector3D(vx, vy, 0))
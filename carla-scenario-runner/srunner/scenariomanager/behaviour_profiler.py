@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a profiler for the behaviours of a py_trees scenario tree.
+
+The profiler is only attached (by the ScenarioManager) if profiling was requested,
+otherwise the behaviours are not touched at all.
+"""
+
+from __future__ import print_function
+
+import functools
+import json
+import time
+
+import carla
+
+
+# CARLA client calls counted as RPCs, if called while a behaviour is updated
+RPC_METHODS = {
+    carla.Actor: ['get_transform', 'get_location', 'get_velocity', 'get_angular_velocity', 'get_acceleration',
+                  'set_transform', 'set_target_velocity', 'add_impulse', 'destroy'],
+    carla.Vehicle: ['apply_control', 'get_control', 'set_autopilot', 'get_traffic_light',
+                    'get_traffic_light_state', 'is_at_traffic_light', 'get_speed_limit'],
+    carla.Walker: ['apply_control', 'get_control'],
+    carla.TrafficLight: ['get_state', 'set_state', 'get_elapsed_time', 'set_green_time',
+                         'set_red_time', 'set_yellow_time', 'freeze'],
+    carla.World: ['get_actors', 'get_actor', 'get_snapshot', 'get_settings', 'get_weather', 'set_weather',
+                  'get_map', 'try_spawn_actor', 'spawn_actor'],
+}
+
+
+class BehaviourStatistics(object):
+
+    """
+    Statistics of a single behaviour
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rpc_calls = 0
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "calls": self.calls,
+            "total_time": self.total_time,
+            "mean_time": self.total_time / self.calls if self.calls else 0.0,
+            "max_time": self.max_time,
+            "rpc_calls": self.rpc_calls
+        }
+
+
+class BehaviourProfiler(object):
+
+    """
+    Measures the update() calls of all behaviours of a scenario tree.
+
+    For every behaviour (identified by its path in the tree), the number of calls, the total
+    and maximum time of update() and the number of CARLA RPCs issued within update() are collected.
+    Composites tick their children outside of update(), so the times are not cumulative.
+
+    Usage:
+    profiler = BehaviourProfiler()
+    profiler.attach(scenario_tree)
+    ... tick the tree ...
+    profiler.detach()
+    profiler.get_report()
+    """
+
+    def __init__(self):
+        self._statistics = {}
+        self._behaviours = []
+        self._rpc_patches = []
+        self._active = []
+        self._tree = None
+
+    def attach(self, tree):
+        """
+        Wrap the update() of all behaviours of the tree and start counting RPCs
+        """
+        self.detach()
+        self._tree = tree
+        self._statistics = {}
+        self._wrap_behaviour(tree, tree.name)
+        self._patch_rpc_methods()
+
+    def detach(self):
+        """
+        Restore the behaviours and the CARLA classes. The statistics are kept.
+        """
+        for behaviour in self._behaviours:
+            del behaviour.update
+        self._behaviours = []
+        for cls, name, method in self._rpc_patches:
+            setattr(cls, name, method)
+        self._rpc_patches = []
+        self._active = []
+
+    def _wrap_behaviour(self, behaviour, path):
+        statistics = BehaviourStatistics(path)
+        self._statistics[id(behaviour)] = statistics
+
+        update = behaviour.update
+
+        @functools.wraps(update)
+        def profiled_update():
+            self._active.append(statistics)
+            start = time.time()
+            try:
+                return update()
+            finally:
+                duration = time.time() - start
+                self._active.pop()
+                statistics.calls += 1
+                statistics.total_time += duration
+                statistics.max_time = max(statistics.max_time, duration)
+
+        # the instance attribute shadows the class method, detach() removes it again
+        behaviour.update = profiled_update
+        self._behaviours.append(behaviour)
+
+        names = {}
+        for child in behaviour.children:
+            names[child.name] = names.get(child.name, 0) + 1
+            child_path = "{}/{}".format(path, child.name)
+            if names[child.name] > 1:
+                child_path += "#{}".format(names[child.name])
+            self._wrap_behaviour(child, child_path)
+
+    def _patch_rpc_methods(self):
+        for cls, names in RPC_METHODS.items():
+            for name in names:
+                method = cls.__dict__.get(name)
+                if method is None:
+                    continue
+                setattr(cls, name, self._count_rpc(method))
+                self._rpc_patches.append((cls, name, method))
+
+    def _count_rpc(self, method):
+        @functools.wraps(method)
+        def counted_method(*args, **kwargs):
+            if self._active:
+                self._active[-1].rpc_calls += 1
+            return method(*args, **kwargs)
+        return counted_method
+
+    def get_statistics(self, behaviour):
+        """
+        Returns the BehaviourStatistics of the behaviour (or None if it is not profiled)
+        """
+        return self._statistics.get(id(behaviour))
+
+    def get_report(self):
+        """
+        Returns the statistics of all behaviours, sorted by total time
+        """
+        return sorted([statistics.to_dict() for statistics in self._statistics.values()],
+                      key=lambda entry: entry["total_time"], reverse=True)
+
+    def write_report(self, filename):
+        with open(filename, 'w', encoding='utf-8') as fp:
+            json.dump({"behaviours": self.get_report()}, fp, indent=4)
+
+    def ascii_tree(self, show_status=True):
+        """
+        Returns the tree as ascii art, including the profiling information of every behaviour
+        """
+        lines = []
+
+        def add_node(behaviour, depth):
+            line = "    " * depth + behaviour.name
+            if show_status:
+                line += " [{}]".format(behaviour.status.value)
+            statistics = self.get_statistics(behaviour)
+            if statistics is not None and statistics.calls:
+                line += " (calls: {}, mean: {:.3f} ms, max: {:.3f} ms, rpcs: {})".format(
+                    statistics.calls, 1e3 * statistics.total_time / statistics.calls,
+                    1e3 * statistics.max_time, statistics.rpc_calls)
+            lines.append(line)
+            for child in behaviour.children:
+                add_node(child, depth + 1)
+
+        if self._tree is not None:
+            add_node(self._tree, 0)
+        return "\n".join(lines)
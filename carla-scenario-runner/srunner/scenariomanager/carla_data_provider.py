@@ -19,6 +19,8 @@ from six import iteritems
 
 import carla
 
+from srunner.scenariomanager.spawn_planner import SpawnPlanner
+
 
 def calculate_velocity(actor):
     """
@@ -50,6 +52,11 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
     _actor_location_map = {}
     _actor_transform_map = {}
     _traffic_light_map = {}
+    _traffic_light_ids = {}
+    _traffic_light_trigger_locations = {}
+    _traffic_light_yaws = {}
+    _traffic_light_groups = {}
+    _traffic_light_lanes = {}
     _carla_actor_pool = {}
     _client = None
     _world = None
@@ -58,6 +65,7 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
     _spawn_points = None
     _spawn_index = 0
     _blueprint_library = None
+    _blueprint_cache = {}
     _ego_vehicle_route = None
     _traffic_manager_port = 8000
     _random_seed = 2000
@@ -95,6 +103,15 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         for actor in actors:
             CarlaDataProvider.register_actor(actor)
 
+    @staticmethod
+    def _register_spawned_actors(actors):
+        """
+        Add the actors spawned by a batch to the actor pool and register them
+        """
+        actors = [actor for actor in actors if actor is not None]
+        CarlaDataProvider._carla_actor_pool.update((actor.id, actor) for actor in actors)
+        CarlaDataProvider.register_actors(actors)
+
     @staticmethod
     def on_carla_tick():
         """
@@ -181,6 +198,7 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         CarlaDataProvider._sync_flag = world.get_settings().synchronous_mode
         CarlaDataProvider._map = world.get_map()
         CarlaDataProvider._blueprint_library = world.get_blueprint_library()
+        CarlaDataProvider._blueprint_cache = {}
         CarlaDataProvider.generate_spawn_points()
         CarlaDataProvider.prepare_map()
 
@@ -242,6 +260,86 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
                 raise KeyError(
                     "Traffic light '{}' already registered. Cannot register twice!".format(traffic_light.id))
 
+        CarlaDataProvider._prepare_traffic_light_tables()
+
+    @staticmethod
+    def _prepare_traffic_light_tables():
+        """
+        Precompute the static traffic light topology of the map:
+        - the trigger location and the yaw of its lane for every traffic light
+        - the traffic light groups (one per junction)
+        - for every lane (road_id, section_id, lane_id) outside of a junction, the traffic light
+          closest to the end of the lane sequence leading to the next junction (see get_next_traffic_light)
+        """
+        CarlaDataProvider._traffic_light_ids = {}
+        CarlaDataProvider._traffic_light_trigger_locations = {}
+        CarlaDataProvider._traffic_light_yaws = {}
+        CarlaDataProvider._traffic_light_groups = {}
+        CarlaDataProvider._traffic_light_lanes = {}
+
+        trigger_centers = []
+        for traffic_light, transform in CarlaDataProvider._traffic_light_map.items():
+            CarlaDataProvider._traffic_light_ids[traffic_light.id] = traffic_light
+            trigger_location = CarlaDataProvider._get_trafficlight_trigger_location(traffic_light)
+            CarlaDataProvider._traffic_light_trigger_locations[traffic_light.id] = trigger_location
+            CarlaDataProvider._traffic_light_yaws[traffic_light.id] = \
+                CarlaDataProvider._map.get_waypoint(trigger_location).transform.rotation.yaw
+            if hasattr(traffic_light, 'trigger_volume'):
+                center = transform.transform(traffic_light.trigger_volume.location)
+                trigger_centers.append((traffic_light.id, center.x, center.y, center.z))
+
+        # One request per junction, all lights of a group share the list
+        for traffic_light in CarlaDataProvider._traffic_light_map:
+            if traffic_light.id not in CarlaDataProvider._traffic_light_groups:
+                group_ids = [tl.id for tl in traffic_light.get_group_traffic_lights()]
+                for group_id in group_ids:
+                    CarlaDataProvider._traffic_light_groups[group_id] = group_ids
+
+        if not trigger_centers:
+            return
+
+        def get_closest_traffic_light(location):
+            closest_id = None
+            closest_distance = float("inf")
+            for tl_id, x, y, z in trigger_centers:
+                distance = (x - location.x) ** 2 + (y - location.y) ** 2 + (z - location.z) ** 2
+                if distance < closest_distance:
+                    closest_id = tl_id
+                    closest_distance = distance
+            return closest_id
+
+        def get_lane_key(waypoint):
+            return (waypoint.road_id, waypoint.section_id, waypoint.lane_id)
+
+        # Lane ends in driving direction. Lanes followed by another lane outside of a junction inherit its light
+        lane_ends = {}
+        for entry_wp, exit_wp in CarlaDataProvider._map.get_topology():
+            if not entry_wp.is_junction:
+                lane_ends[get_lane_key(entry_wp)] = exit_wp
+
+        unresolved = object()
+
+        def resolve(key, visited):
+            if key in CarlaDataProvider._traffic_light_lanes:
+                return CarlaDataProvider._traffic_light_lanes[key]
+            visited.add(key)
+            exit_wp = lane_ends[key]
+            next_wps = exit_wp.next(2.0)
+            if not next_wps or next_wps[0].is_junction:
+                tl_id = get_closest_traffic_light(exit_wp.transform.location)
+            elif get_lane_key(next_wps[0]) not in lane_ends or get_lane_key(next_wps[0]) in visited:
+                # Unknown lane or closed loop without junction, left to get_next_traffic_light's search
+                return unresolved
+            else:
+                tl_id = resolve(get_lane_key(next_wps[0]), visited)
+                if tl_id is unresolved:
+                    return unresolved
+            CarlaDataProvider._traffic_light_lanes[key] = tl_id
+            return tl_id
+
+        for key in lane_ends:
+            resolve(key, set())
+
     @staticmethod
     def annotate_trafficlight_in_group(traffic_light):
         """
@@ -249,6 +347,18 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         """
         dict_annotations = {'ref': [], 'opposite': [], 'left': [], 'right': []}
 
+        if traffic_light.id in CarlaDataProvider._traffic_light_groups:
+            # Use the precomputed group and yaws (see prepare_map)
+            ref_yaw = CarlaDataProvider._traffic_light_yaws[traffic_light.id]
+            for target_id in CarlaDataProvider._traffic_light_groups[traffic_light.id]:
+                target_tl = CarlaDataProvider._traffic_light_ids[target_id]
+                if traffic_light.id == target_id:
+                    dict_annotations['ref'].append(target_tl)
+                else:
+                    diff = (CarlaDataProvider._traffic_light_yaws[target_id] - ref_yaw) % 360
+                    CarlaDataProvider._annotate_yaw_difference(dict_annotations, target_tl, diff)
+            return dict_annotations
+
         # Get the waypoints
         ref_location = CarlaDataProvider.get_trafficlight_trigger_location(traffic_light)
         ref_waypoint = CarlaDataProvider.get_map().get_waypoint(ref_location)
@@ -266,20 +376,36 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
                 target_yaw = target_waypoint.transform.rotation.yaw
 
                 diff = (target_yaw - ref_yaw) % 360
-
-                if diff > 330:
-                    continue
-                elif diff > 225:
-                    dict_annotations['right'].append(target_tl)
-                elif diff > 135.0:
-                    dict_annotations['opposite'].append(target_tl)
-                elif diff > 30:
-                    dict_annotations['left'].append(target_tl)
+                CarlaDataProvider._annotate_yaw_difference(dict_annotations, target_tl, diff)
 
         return dict_annotations
 
+    @staticmethod
+    def _annotate_yaw_difference(dict_annotations, target_tl, diff):
+        """
+        Add the traffic light to the annotation given by the yaw difference to the reference light
+        """
+        if diff > 330:
+            return
+        elif diff > 225:
+            dict_annotations['right'].append(target_tl)
+        elif diff > 135.0:
+            dict_annotations['opposite'].append(target_tl)
+        elif diff > 30:
+            dict_annotations['left'].append(target_tl)
+
     @staticmethod
     def get_trafficlight_trigger_location(traffic_light):    # pylint: disable=invalid-name
+        """
+        Returns the location that represents the trigger volume of the traffic light (precomputed in prepare_map)
+        """
+        location = CarlaDataProvider._traffic_light_trigger_locations.get(traffic_light.id)
+        if location is None:
+            return CarlaDataProvider._get_trafficlight_trigger_location(traffic_light)
+        return carla.Location(location.x, location.y, location.z)
+
+    @staticmethod
+    def _get_trafficlight_trigger_location(traffic_light):    # pylint: disable=invalid-name
         """
         Calculates the yaw of the waypoint that represents the trigger volume of the traffic light
         """
@@ -357,9 +483,13 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
             location = CarlaDataProvider.get_location(actor)
 
         waypoint = CarlaDataProvider.get_map().get_waypoint(location)
-        # Create list of all waypoints until next intersection
+        # Create list of all waypoints until next intersection,
+        # or until reaching a lane of the precomputed lane table (see prepare_map)
         list_of_waypoints = []
         while waypoint and not waypoint.is_intersection:
+            lane_key = (waypoint.road_id, waypoint.section_id, waypoint.lane_id)
+            if lane_key in CarlaDataProvider._traffic_light_lanes:
+                return CarlaDataProvider._traffic_light_ids.get(CarlaDataProvider._traffic_light_lanes[lane_key])
             list_of_waypoints.append(waypoint)
             waypoint = waypoint.next(2.0)[0]
 
@@ -409,6 +539,35 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         CarlaDataProvider._spawn_points = spawn_points
         CarlaDataProvider._spawn_index = 0
 
+    @staticmethod
+    def _get_spawn_planner():
+        """
+        Returns a SpawnPlanner for the remaining spawn points, which skips the ones occupied by vehicles and walkers.
+        The locations are taken from one world snapshot instead of requesting them actor by actor.
+        """
+        world = CarlaDataProvider._world
+        actor_ids = set(actor.id for actor in world.get_actors() if actor.type_id.startswith(('vehicle.', 'walker.')))
+        occupied_locations = [actor_snapshot.get_transform().location for actor_snapshot in world.get_snapshot()
+                              if actor_snapshot.id in actor_ids]
+        return SpawnPlanner(CarlaDataProvider._spawn_points, occupied_locations,
+                            start_index=CarlaDataProvider._spawn_index)
+
+    @staticmethod
+    def _get_blueprint_ids(model, safe=False):
+        """
+        Returns the ids of the blueprints matching the model (cached per model and safe flag)
+        """
+        key = (model, safe)
+        if key not in CarlaDataProvider._blueprint_cache:
+            blueprints = CarlaDataProvider._blueprint_library.filter(model)
+            if safe:
+                # Two wheeled vehicles take much longer to render + bicicles shouldn't behave like cars
+                blueprints = [bp for bp in blueprints
+                              if not bp.id.endswith('firetruck') and not bp.id.endswith('ambulance')
+                              and int(bp.get_attribute('number_of_wheels')) == 4]
+            CarlaDataProvider._blueprint_cache[key] = [bp.id for bp in blueprints]
+        return CarlaDataProvider._blueprint_cache[key]
+
     @staticmethod
     def create_blueprint(model, rolename='scenario', color=None, actor_category="car", actor_args={}, safe=False):
         """
@@ -429,21 +588,10 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
             'pedestrian': 'walker.pedestrian.0001',
         }
 
-        # Set the model
+        # Set the model (find() returns a copy, so the cached blueprints are not modified)
         try:
-            blueprints = CarlaDataProvider._blueprint_library.filter(model)
-            blueprints_ = []
-            if safe:
-                for bp in blueprints:
-                    if bp.id.endswith('firetruck') or bp.id.endswith('ambulance') \
-                            or int(bp.get_attribute('number_of_wheels')) != 4:
-                        # Two wheeled vehicles take much longer to render + bicicles shouldn't behave like cars
-                        continue
-                    blueprints_.append(bp)
-            else:
-                blueprints_ = blueprints
-
-            blueprint = CarlaDataProvider._rng.choice(blueprints_)
+            blueprint_id = CarlaDataProvider._rng.choice(CarlaDataProvider._get_blueprint_ids(model, safe))
+            blueprint = CarlaDataProvider._blueprint_library.find(str(blueprint_id))
         except ValueError:
             # The model is not part of the blueprint library. Let's take a default one for the given category
             bp_filter = "vehicle.*"
@@ -451,7 +599,8 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
             if new_model != '':
                 bp_filter = new_model
             print("WARNING: Actor model {} not available. Using instead {}".format(model, new_model))
-            blueprint = CarlaDataProvider._rng.choice(CarlaDataProvider._blueprint_library.filter(bp_filter))
+            blueprint_id = CarlaDataProvider._rng.choice(CarlaDataProvider._get_blueprint_ids(bp_filter))
+            blueprint = CarlaDataProvider._blueprint_library.find(str(blueprint_id))
 
         # Set the color
         if color:
@@ -501,22 +650,37 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         else:
             raise ValueError("class member \'client'\' not initialized yet")
 
-        # Wait (or not) for the actors to be spawned properly before we do anything
-        if not tick:
-            pass
-        elif sync_mode:
-            CarlaDataProvider._world.tick()
-        else:
-            CarlaDataProvider._world.wait_for_tick()
-
         actor_ids = [r.actor_id for r in responses if not r.error]
         for r in responses:
             if r.error:
                 print("WARNING: Not all actors were spawned")
                 break
+
+        # Wait (or not) for the actors to be spawned properly before we do anything
+        if tick:
+            CarlaDataProvider._wait_for_actors(actor_ids, ticked=sync_mode)
+
         actors = list(CarlaDataProvider._world.get_actors(actor_ids))
         return actors
 
+    @staticmethod
+    def _wait_for_actors(actor_ids, ticked=False, max_ticks=10):
+        """
+        Tick (synchronous mode) or wait for the next tick (asynchronous mode) until all actors
+        are part of the world snapshot. If the world was just ticked, the current snapshot is checked first.
+        """
+        world = CarlaDataProvider._world
+        snapshot = world.get_snapshot() if ticked else None
+        for _ in range(max_ticks):
+            if snapshot is not None and all(snapshot.has_actor(actor_id) for actor_id in actor_ids):
+                return
+            if CarlaDataProvider.is_sync_mode():
+                world.tick()
+                snapshot = world.get_snapshot()
+            else:
+                snapshot = world.wait_for_tick()
+        print("WARNING: Not all spawned actors are part of the world yet")
+
     @staticmethod
     def request_new_actor(model, spawn_point, rolename='scenario', autopilot=False,
                           random_location=False, color=None, actor_category="car",
@@ -582,6 +746,7 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         SetVehicleLightState = carla.command.SetVehicleLightState  # pylint: disable=invalid-name
 
         batch = []
+        planned_actors = []
 
         CarlaDataProvider.generate_spawn_points()
 
@@ -591,15 +756,10 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
             blueprint = CarlaDataProvider.create_blueprint(
                 actor.model, actor.rolename, actor.color, actor.category, actor.args, safe_blueprint)
 
-            # Get the spawn point
+            # Get the spawn point (random ones are chosen once all given spawn points are known)
             transform = actor.transform
             if actor.random_location:
-                if CarlaDataProvider._spawn_index >= len(CarlaDataProvider._spawn_points):
-                    print("No more spawn points to use")
-                    break
-                else:
-                    _spawn_point = CarlaDataProvider._spawn_points[CarlaDataProvider._spawn_index]  # pylint: disable=unsubscriptable-object
-                    CarlaDataProvider._spawn_index += 1
+                _spawn_point = None
 
             else:
                 _spawn_point = carla.Transform()
@@ -617,6 +777,24 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
                 else:
                     _spawn_point.location.z = transform.location.z + 0.2
 
+            planned_actors.append((actor, blueprint, _spawn_point))
+
+        spawn_planner = None
+        if any(actor.random_location for actor in actor_list):
+            spawn_planner = CarlaDataProvider._get_spawn_planner()
+            for _, _, _spawn_point in planned_actors:
+                if _spawn_point is not None:
+                    spawn_planner.occupy(_spawn_point.location)
+
+        for actor, blueprint, _spawn_point in planned_actors:
+
+            if _spawn_point is None:
+                _spawn_point = spawn_planner.get_next_spawn_point()
+                CarlaDataProvider._spawn_index = spawn_planner.get_index()
+                if _spawn_point is None:
+                    print("No more spawn points to use")
+                    break
+
             # Get the command
             command = SpawnActor(blueprint, _spawn_point)
             command.then(SetAutopilot(FutureActor, actor.autopilot, CarlaDataProvider._traffic_manager_port))
@@ -631,11 +809,7 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
             batch.append(command)
 
         actors = CarlaDataProvider.handle_actor_batch(batch, tick)
-        for actor in actors:
-            if actor is None:
-                continue
-            CarlaDataProvider._carla_actor_pool[actor.id] = actor
-            CarlaDataProvider.register_actor(actor)
+        CarlaDataProvider._register_spawned_actors(actors)
 
         return actors
 
@@ -658,6 +832,7 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         FutureActor = carla.command.FutureActor    # pylint: disable=invalid-name
 
         CarlaDataProvider.generate_spawn_points()
+        spawn_planner = CarlaDataProvider._get_spawn_planner() if random_location else None
 
         batch = []
 
@@ -666,12 +841,11 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
             blueprint = CarlaDataProvider.create_blueprint(model, rolename, safe=safe_blueprint)
 
             if random_location:
-                if CarlaDataProvider._spawn_index >= len(CarlaDataProvider._spawn_points):
+                spawn_point = spawn_planner.get_next_spawn_point()
+                CarlaDataProvider._spawn_index = spawn_planner.get_index()
+                if spawn_point is None:
                     print("No more spawn points to use. Spawned {} actors out of {}".format(i + 1, amount))
                     break
-                else:
-                    spawn_point = CarlaDataProvider._spawn_points[CarlaDataProvider._spawn_index]  # pylint: disable=unsubscriptable-object
-                    CarlaDataProvider._spawn_index += 1
             else:
                 try:
                     spawn_point = spawn_points[i]
@@ -685,11 +859,7 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
                                  CarlaDataProvider._traffic_manager_port)))
 
         actors = CarlaDataProvider.handle_actor_batch(batch, tick)
-        for actor in actors:
-            if actor is None:
-                continue
-            CarlaDataProvider._carla_actor_pool[actor.id] = actor
-            CarlaDataProvider.register_actor(actor)
+        CarlaDataProvider._register_spawned_actors(actors)
 
         return actors
 
@@ -800,6 +970,11 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         CarlaDataProvider._actor_location_map.clear()
         CarlaDataProvider._actor_transform_map.clear()
         CarlaDataProvider._traffic_light_map.clear()
+        CarlaDataProvider._traffic_light_ids = {}
+        CarlaDataProvider._traffic_light_trigger_locations = {}
+        CarlaDataProvider._traffic_light_yaws = {}
+        CarlaDataProvider._traffic_light_groups = {}
+        CarlaDataProvider._traffic_light_lanes = {}
         CarlaDataProvider._map = None
         CarlaDataProvider._world = None
         CarlaDataProvider._sync_flag = False
@@ -808,4 +983,5 @@ class CarlaDataProvider(object):  # pylint: disable=too-many-public-methods
         CarlaDataProvider._client = None
         CarlaDataProvider._spawn_points = None
         CarlaDataProvider._spawn_index = 0
+        CarlaDataProvider._blueprint_cache = {}
         CarlaDataProvider._rng = random.RandomState(CarlaDataProvider._random_seed)
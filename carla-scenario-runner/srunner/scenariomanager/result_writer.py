@@ -24,7 +24,7 @@ class ResultOutputProvider(object):
     It shall be used from the ScenarioManager only.
     """
 
-    def __init__(self, data, result, stdout=True, filename=None, junitfile=None, jsonfile=None):
+    def __init__(self, data, result, stdout=True, filename=None, junitfile=None, jsonfile=None, event_stream=None):
         """
         Setup all parameters
         - _data contains all scenario-related information
@@ -33,6 +33,7 @@ class ResultOutputProvider(object):
         - _filename is used to (de)activate file output in tabular form
         - _junit is used to (de)activate file output in junit form
         - _json is used to (de)activate file output in json form
+        - _event_stream is a ResultEventStream, which is finalized with the summary
         """
         self._data = data
         self._result = result
@@ -40,6 +41,7 @@ class ResultOutputProvider(object):
         self._filename = filename
         self._junit = junitfile
         self._json = jsonfile
+        self._event_stream = event_stream
 
         self._start_time = time.strftime('%Y-%m-%d %H:%M:%S',
                                          time.localtime(self._data.start_system_time))
@@ -54,6 +56,9 @@ class ResultOutputProvider(object):
             self._write_to_junit()
         if self._json is not None:
             self._write_to_reportjson()
+        if self._event_stream is not None:
+            self._event_stream.finalize(self._data.scenario.get_criteria(), self._result,
+                                        self.create_criteria_results())
 
         output = self.create_output_text()
         if self._filename is not None:
@@ -154,6 +159,19 @@ class ResultOutputProvider(object):
             ]
         }
         """
+        result_object = {
+            "scenario": self._data.scenario_tree.name,
+            "success": self._result in ["SUCCESS", "ACCEPTABLE"],
+            "criteria": self.create_criteria_results()
+        }
+
+        with open(self._json, "w", encoding='utf-8') as fp:
+            json.dump(result_object, fp, indent=4)
+
+    def create_criteria_results(self):
+        """
+        Returns the list of JSON-ready results of all criteria (and the duration)
+        """
         json_list = []
 
         def result_dict(name, actor, optional, expected, actual, success):
@@ -197,14 +215,7 @@ class ResultOutputProvider(object):
             )
         )
 
-        result_object = {
-            "scenario": self._data.scenario_tree.name,
-            "success": self._result in ["SUCCESS", "ACCEPTABLE"],
-            "criteria": json_list
-        }
-
-        with open(self._json, "w", encoding='utf-8') as fp:
-            json.dump(result_object, fp, indent=4)
+        return json_list
 
     def _write_to_junit(self):
         """
@@ -288,3 +299,89 @@ class ResultOutputProvider(object):
 
             junit_file.write("  </testsuite>\n")
             junit_file.write("</testsuites>\n")
+
+
+class ResultEventStream(object):
+
+    """
+    Writes the traffic events of the criteria to a JSON Lines file while the scenario is running.
+
+    Every line is a JSON object with a "type":
+    - "start": scenario name and start time
+    - "event": one traffic event (criterion, actor, event type, message and dictionary), written
+      when update() finds it in the criterion's list_traffic_events for the first time
+    - "summary": overall result and the results of all criteria, written by finalize()
+
+    The file is flushed after every update(), so a crashed run leaves all events up to the crash.
+    Only the number of already written events per criterion is kept in memory.
+    """
+
+    def __init__(self, filename, scenario_name):
+        self._file = open(filename, 'w', encoding='utf-8')  # pylint: disable=consider-using-with
+        self._positions = {}
+        self.event_count = 0
+        self._write_line({
+            "type": "start",
+            "scenario": scenario_name,
+            "start_time": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+        })
+        self._file.flush()
+
+    def _write_line(self, entry):
+        self._file.write(json.dumps(entry, default=str))
+        self._file.write("\n")
+
+    def update(self, criteria, frame=None, game_time=None):
+        """
+        Write the events added to the criteria since the last call
+        """
+        if self._file is None:
+            return
+
+        written = False
+        for criterion in criteria:
+            events = criterion.list_traffic_events
+            position = self._positions.get(id(criterion), 0)
+            if len(events) <= position:
+                continue
+
+            actor = "{}-{}".format(criterion.actor.type_id[8:], criterion.actor.id)
+            for event in events[position:]:
+                self._write_line({
+                    "type": "event",
+                    "frame": frame,
+                    "game_time": game_time,
+                    "criterion": criterion.name,
+                    "actor": actor,
+                    "event": event.get_type().name,
+                    "message": event.get_message(),
+                    "data": event.get_dict()
+                })
+            self.event_count += len(events) - position
+            self._positions[id(criterion)] = len(events)
+            written = True
+
+        if written:
+            self._file.flush()
+
+    def finalize(self, criteria, result, criteria_results):
+        """
+        Write the remaining events and the summary, and close the file
+        """
+        if self._file is None:
+            return
+
+        self.update(criteria)
+        self._write_line({
+            "type": "summary",
+            "success": result in ["SUCCESS", "ACCEPTABLE"],
+            "result": result,
+            "events": self.event_count,
+            "criteria": criteria_results
+        })
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -12,13 +12,16 @@ It must not be modified and is for reference only!
 
 from __future__ import print_function
 import sys
+import threading
 import time
 
 import py_trees
 
 from srunner.autoagents.agent_wrapper import AgentWrapper
+from srunner.scenariomanager.actorcontrols.control_batch import ControlBatch
+from srunner.scenariomanager.behaviour_profiler import BehaviourProfiler
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
-from srunner.scenariomanager.result_writer import ResultOutputProvider
+from srunner.scenariomanager.result_writer import ResultEventStream, ResultOutputProvider
 from srunner.scenariomanager.timer import GameTime
 from srunner.scenariomanager.watchdog import Watchdog
 
@@ -41,10 +44,11 @@ class ScenarioManager(object):
     5. If needed, cleanup with manager.stop_scenario()
     """
 
-    def __init__(self, debug_mode=False, sync_mode=False, timeout=2.0):
+    def __init__(self, debug_mode=False, sync_mode=False, timeout=2.0, profile=False):
         """
         Setups up the parameters, which will be filled at load_scenario()
 
+        With profile, the update() calls of all behaviours are measured (see BehaviourProfiler)
         """
         self.scenario = None
         self.scenario_tree = None
@@ -53,28 +57,49 @@ class ScenarioManager(object):
         self.other_actors = None
 
         self._debug_mode = debug_mode
+        self._profile = profile
+        self._profiler = None
+        self._event_stream = None
+        self._criteria = []
         self._agent = None
         self._sync_mode = sync_mode
         self._watchdog = None
         self._timeout = timeout
 
         self._running = False
-        self._timestamp_last_run = 0.0
+        self._last_frame = None
         self.scenario_duration_system = 0.0
         self.scenario_duration_game = 0.0
         self.start_system_time = None
         self.end_system_time = None
 
+        # In asynchronous mode, the latest snapshot is handed over by the world's on_tick callback
+        self._tick_condition = threading.Condition()
+        self._pending_snapshot = None
+        self._on_tick_id = None
+
+        # Tick statistics of the last run
+        self.ticks = 0
+        self.missed_frames = 0
+        self.ticks_per_second = 0.0
+
     def _reset(self):
         """
         Reset all parameters
         """
         self._running = False
-        self._timestamp_last_run = 0.0
+        self._last_frame = None
+        self._pending_snapshot = None
         self.scenario_duration_system = 0.0
         self.scenario_duration_game = 0.0
         self.start_system_time = None
         self.end_system_time = None
+        self.ticks = 0
+        self.missed_frames = 0
+        self.ticks_per_second = 0.0
+        if self._event_stream is not None:
+            self._event_stream.close()
+            self._event_stream = None
         GameTime.restart()
 
     def cleanup(self):
@@ -86,6 +111,9 @@ class ScenarioManager(object):
             self._watchdog.stop()
             self._watchdog = None
 
+        if self._profiler is not None:
+            self._profiler.detach()
+
         if self.scenario is not None:
             self.scenario.terminate()
 
@@ -112,14 +140,25 @@ class ScenarioManager(object):
         # To print the scenario tree uncomment the next line
         # py_trees.display.render_dot_tree(self.scenario_tree)
 
+        self._profiler = None
+        if self._profile:
+            self._profiler = BehaviourProfiler()
+            self._profiler.attach(self.scenario_tree)
+
         if self._agent is not None:
             self._agent.setup_sensors(self.ego_vehicles[0], self._debug_mode)
 
-    def run_scenario(self):
+    def run_scenario(self, events_file=None):
         """
         Trigger the start of the scenario and wait for it to finish/fail
+
+        With events_file, the traffic events of the criteria are streamed into this JSON Lines file
+        while the scenario is running (see ResultEventStream). The summary is added by analyze_scenario().
         """
         print("ScenarioManager: Running scenario {}".format(self.scenario_tree.name))
+        self._criteria = self.scenario.get_criteria() if self.scenario.test_criteria is not None else []
+        if events_file is not None:
+            self._event_stream = ResultEventStream(events_file, self.scenario_tree.name)
         self.start_system_time = time.time()
         start_game_time = GameTime.get_time()
 
@@ -127,15 +166,21 @@ class ScenarioManager(object):
         self._watchdog.start()
         self._running = True
 
-        while self._running:
-            timestamp = None
-            world = CarlaDataProvider.get_world()
-            if world:
-                snapshot = world.get_snapshot()
+        world = CarlaDataProvider.get_world()
+        if not self._sync_mode:
+            self._on_tick_id = world.on_tick(self._on_world_tick)
+
+        try:
+            while self._running:
+                snapshot = self._wait_for_snapshot(world)
                 if snapshot:
-                    timestamp = snapshot.timestamp
-            if timestamp:
-                self._tick_scenario(timestamp)
+                    self._tick_scenario(snapshot.timestamp)
+        finally:
+            if self._on_tick_id is not None:
+                world.remove_on_tick(self._on_tick_id)
+                self._on_tick_id = None
+            if self._event_stream is not None:
+                self._event_stream.update(self._criteria, GameTime.get_frame(), GameTime.get_time())
 
         self.cleanup()
 
@@ -145,18 +190,51 @@ class ScenarioManager(object):
         self.scenario_duration_system = self.end_system_time - \
             self.start_system_time
         self.scenario_duration_game = end_game_time - start_game_time
+        if self.scenario_duration_system > 0:
+            self.ticks_per_second = self.ticks / self.scenario_duration_system
+        print("ScenarioManager: {} ticks ({:.1f} ticks/s), {} missed frames".format(
+            self.ticks, self.ticks_per_second, self.missed_frames))
 
         if self.scenario_tree.status == py_trees.common.Status.FAILURE:
             print("ScenarioManager: Terminated due to failure")
 
+    def _on_world_tick(self, snapshot):
+        """
+        on_tick callback of the world (called from the client thread in asynchronous mode)
+        """
+        with self._tick_condition:
+            self._pending_snapshot = snapshot
+            self._tick_condition.notify()
+
+    def _wait_for_snapshot(self, world):
+        """
+        Returns the snapshot of the next frame to be handled or None.
+
+        In synchronous mode the world is ticked by _tick_scenario, so the current snapshot is the new frame.
+        In asynchronous mode this blocks until the on_tick callback delivered a frame (or the scenario was
+        stopped) instead of polling the server for snapshots.
+        """
+        if self._sync_mode:
+            return world.get_snapshot()
+
+        with self._tick_condition:
+            if self._pending_snapshot is None and self._running:
+                self._tick_condition.wait(0.5)
+            snapshot = self._pending_snapshot
+            self._pending_snapshot = None
+        return snapshot
+
     def _tick_scenario(self, timestamp):
         """
-        Run next tick of scenario and the agent.
+        Run next tick of scenario and the agent, at most once per simulator frame.
         If running synchornously, it also handles the ticking of the world.
         """
 
-        if self._timestamp_last_run < timestamp.elapsed_seconds and self._running:
-            self._timestamp_last_run = timestamp.elapsed_seconds
+        if (self._last_frame is None or self._last_frame < timestamp.frame) and self._running:
+            if self._last_frame is not None:
+                self.missed_frames += timestamp.frame - self._last_frame - 1
+            self._last_frame = timestamp.frame
+            self.ticks += 1
 
             self._watchdog.update()
 
@@ -173,14 +251,24 @@ class ScenarioManager(object):
             if self._agent is not None:
                 self.ego_vehicles[0].apply_control(ego_action)
 
-            # Tick scenario
-            self.scenario_tree.tick_once()
+            # Tick scenario, the control commands of all actor controllers are sent in one batch
+            ControlBatch.begin(CarlaDataProvider.get_client())
+            try:
+                self.scenario_tree.tick_once()
+            finally:
+                ControlBatch.flush()
 
             if self._debug_mode:
                 print("\n")
-                py_trees.display.print_ascii_tree(self.scenario_tree, show_status=True)
+                if self._profiler is not None:
+                    print(self._profiler.ascii_tree())
+                else:
+                    py_trees.display.print_ascii_tree(self.scenario_tree, show_status=True)
                 sys.stdout.flush()
 
+            if self._event_stream is not None:
+                self._event_stream.update(self._criteria, timestamp.frame, GameTime.get_time())
+
             if self.scenario_tree.status != py_trees.common.Status.RUNNING:
                 self._running = False
 
@@ -199,36 +287,57 @@ class ScenarioManager(object):
         This function is used by the overall signal handler to terminate the scenario execution
         """
         self._running = False
+        with self._tick_condition:
+            self._tick_condition.notify()
 
-    def analyze_scenario(self, stdout, filename, junit, json):
+    def get_scenario_result(self):
+        """
+        Returns the overall result of the scenario ("SUCCESS", "ACCEPTABLE", "FAILURE" or "TIMEOUT")
+        together with the failure and timeout flags
+        """
+        failure = False
+        timeout = False
+        result = "SUCCESS"
+
+        if self.scenario.test_criteria is not None:
+            for criterion in self.scenario.get_criteria():
+                if (not criterion.optional and
+                        criterion.test_status != "SUCCESS" and
+                        criterion.test_status != "ACCEPTABLE"):
+                    failure = True
+                    result = "FAILURE"
+                elif criterion.test_status == "ACCEPTABLE":
+                    result = "ACCEPTABLE"
+
+        if self.scenario.timeout_node.timeout and not failure:
+            timeout = True
+            result = "TIMEOUT"
+
+        return result, failure, timeout
+
+    def analyze_scenario(self, stdout, filename, junit, json, profile=None):
         """
         This function is intended to be called from outside and provide
         the final statistics about the scenario (human-readable, in form of a junit
         report, etc.)
+
+        If profiling is enabled, the behaviour statistics are written to the json file profile.
         """
 
-        failure = False
-        timeout = False
-        result = "SUCCESS"
+        if self._profiler is not None and profile is not None:
+            self._profiler.write_report(profile)
 
         if self.scenario.test_criteria is None:
             print("Nothing to analyze, this scenario has no criteria")
+            if self._event_stream is not None:
+                self._event_stream.close()
+                self._event_stream = None
             return True
 
-        for criterion in self.scenario.get_criteria():
-            if (not criterion.optional and
-                    criterion.test_status != "SUCCESS" and
-                    criterion.test_status != "ACCEPTABLE"):
-                failure = True
-                result = "FAILURE"
-            elif criterion.test_status == "ACCEPTABLE":
-                result = "ACCEPTABLE"
-
-        if self.scenario.timeout_node.timeout and not failure:
-            timeout = True
-            result = "TIMEOUT"
+        result, failure, timeout = self.get_scenario_result()
 
-        output = ResultOutputProvider(self, result, stdout, filename, junit, json)
+        output = ResultOutputProvider(self, result, stdout, filename, junit, json, self._event_stream)
         output.write()
+        self._event_stream = None
 
         return failure or timeout
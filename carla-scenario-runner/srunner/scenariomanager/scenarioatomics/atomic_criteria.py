@@ -26,6 +26,7 @@ import carla
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
 from srunner.scenariomanager.timer import GameTime
 from srunner.scenariomanager.traffic_events import TrafficEvent, TrafficEventType
+from srunner.tools.stop_line_table import StopLineTable
 
 
 class Criterion(py_trees.behaviour.Behaviour):
@@ -1718,6 +1719,17 @@ class RunningRedLightTest(Criterion):
                 center, waypoints = self.get_traffic_light_waypoints(_actor)
                 self._list_traffic_lights.append((_actor, center, waypoints))
 
+        # The stop lines of all traffic lights, so that update() only has to test the lines near the actor
+        self._stop_lines = StopLineTable()
+        for index, (_, _, waypoints) in enumerate(self._list_traffic_lights):
+            for wp in waypoints:
+                lft_lane_wp, rgt_lane_wp = self.get_stop_line(wp)
+                wp_dir = wp.transform.get_forward_vector()
+                self._stop_lines.add_line((lft_lane_wp.x, lft_lane_wp.y), (rgt_lane_wp.x, rgt_lane_wp.y),
+                                          index, wp.road_id, wp.lane_id, (wp_dir.x, wp_dir.y))
+        self._stop_lines.build()
+        self._light_centers = [carla.Location(center) for _, center, _ in self._list_traffic_lights]
+
     # pylint: disable=no-self-use
     def is_vehicle_crossing_line(self, seg1, seg2):
         """
@@ -1729,6 +1741,20 @@ class RunningRedLightTest(Criterion):
 
         return not inter.is_empty
 
+    def get_stop_line(self, wp):
+        """
+        Returns the end points of the stop line at the given waypoint of a traffic light
+        """
+        yaw_wp = wp.transform.rotation.yaw
+        lane_width = wp.lane_width
+        location_wp = wp.transform.location
+
+        lft_lane_wp = self.rotate_point(carla.Vector3D(0.4 * lane_width, 0.0, location_wp.z), yaw_wp + 90)
+        lft_lane_wp = location_wp + carla.Location(lft_lane_wp)
+        rgt_lane_wp = self.rotate_point(carla.Vector3D(0.4 * lane_width, 0.0, location_wp.z), yaw_wp - 90)
+        rgt_lane_wp = location_wp + carla.Location(rgt_lane_wp)
+        return lft_lane_wp, rgt_lane_wp
+
     def update(self):
         """
         Check if the actor is running a red light
@@ -1748,76 +1774,55 @@ class RunningRedLightTest(Criterion):
         tail_far_pt = self.rotate_point(carla.Vector3D(-veh_extent - 1, 0.0, location.z), transform.rotation.yaw)
         tail_far_pt = location + carla.Location(tail_far_pt)
 
-        for traffic_light, center, waypoints in self._list_traffic_lights:
+        if self.debug:
+            self._draw_traffic_lights()
 
-            if self.debug:
-                z = 2.1
-                if traffic_light.state == carla.TrafficLightState.Red:
-                    color = carla.Color(155, 0, 0)
-                elif traffic_light.state == carla.TrafficLightState.Green:
-                    color = carla.Color(0, 155, 0)
-                else:
-                    color = carla.Color(155, 155, 0)
-                self._world.debug.draw_point(center + carla.Location(z=z), size=0.2, color=color, life_time=0.01)
-                for wp in waypoints:
-                    text = "{}.{}".format(wp.road_id, wp.lane_id)
-                    self._world.debug.draw_string(
-                        wp.transform.location + carla.Location(x=1, z=z), text, color=color, life_time=0.01)
-                    self._world.debug.draw_point(
-                        wp.transform.location + carla.Location(z=z), size=0.1, color=color, life_time=0.01)
+        # Only the stop lines crossed by the "tail" of the vehicle are relevant
+        crossed_lines = self._stop_lines.get_crossed_lines((tail_close_pt.x, tail_close_pt.y),
+                                                           (tail_far_pt.x, tail_far_pt.y))
+        tail_wp = None
+        ve_dir = transform.get_forward_vector()
 
-            center_loc = carla.Location(center)
+        for line in crossed_lines:
+            light_index = self._stop_lines.owner[line]
+            traffic_light = self._list_traffic_lights[light_index][0]
 
             if self._last_red_light_id and self._last_red_light_id == traffic_light.id:
                 continue
-            if center_loc.distance(location) > self.DISTANCE_LIGHT:
+            if self._light_centers[light_index].distance(location) > self.DISTANCE_LIGHT:
                 continue
             if traffic_light.state != carla.TrafficLightState.Red:
                 continue
 
-            for wp in waypoints:
+            # Calculate the dot product (Might be unscaled, as only its sign is important)
+            wp_dir = self._stop_lines.direction[line]
+            dot_ve_wp = ve_dir.x * wp_dir[0] + ve_dir.y * wp_dir[1]
 
+            if tail_wp is None:
                 tail_wp = self._map.get_waypoint(tail_far_pt)
 
-                # Calculate the dot product (Might be unscaled, as only its sign is important)
-                ve_dir = CarlaDataProvider.get_transform(self._actor).get_forward_vector()
-                wp_dir = wp.transform.get_forward_vector()
-                dot_ve_wp = ve_dir.x * wp_dir.x + ve_dir.y * wp_dir.y + ve_dir.z * wp_dir.z
-
-                # Check the lane until all the "tail" has passed
-                if tail_wp.road_id == wp.road_id and tail_wp.lane_id == wp.lane_id and dot_ve_wp > 0:
-                    # This light is red and is affecting our lane
-                    yaw_wp = wp.transform.rotation.yaw
-                    lane_width = wp.lane_width
-                    location_wp = wp.transform.location
-
-                    lft_lane_wp = self.rotate_point(carla.Vector3D(0.4 * lane_width, 0.0, location_wp.z), yaw_wp + 90)
-                    lft_lane_wp = location_wp + carla.Location(lft_lane_wp)
-                    rgt_lane_wp = self.rotate_point(carla.Vector3D(0.4 * lane_width, 0.0, location_wp.z), yaw_wp - 90)
-                    rgt_lane_wp = location_wp + carla.Location(rgt_lane_wp)
-
-                    # Is the vehicle traversing the stop line?
-                    if self.is_vehicle_crossing_line((tail_close_pt, tail_far_pt), (lft_lane_wp, rgt_lane_wp)):
-
-                        self.test_status = "FAILURE"
-                        self.actual_value += 1
-                        location = traffic_light.get_transform().location
-                        red_light_event = TrafficEvent(event_type=TrafficEventType.TRAFFIC_LIGHT_INFRACTION)
-                        red_light_event.set_message(
-                            "Agent ran a red light {} at (x={}, y={}, z={})".format(
-                                traffic_light.id,
-                                round(location.x, 3),
-                                round(location.y, 3),
-                                round(location.z, 3)))
-                        red_light_event.set_dict({
-                            'id': traffic_light.id,
-                            'x': location.x,
-                            'y': location.y,
-                            'z': location.z})
-
-                        self.list_traffic_events.append(red_light_event)
-                        self._last_red_light_id = traffic_light.id
-                        break
+            # Check the lane until all the "tail" has passed
+            if tail_wp.road_id == self._stop_lines.road_id[line] and \
+                    tail_wp.lane_id == self._stop_lines.lane_id[line] and dot_ve_wp > 0:
+                # This light is red, is affecting our lane and the vehicle is traversing the stop line
+                self.test_status = "FAILURE"
+                self.actual_value += 1
+                light_location = traffic_light.get_transform().location
+                red_light_event = TrafficEvent(event_type=TrafficEventType.TRAFFIC_LIGHT_INFRACTION)
+                red_light_event.set_message(
+                    "Agent ran a red light {} at (x={}, y={}, z={})".format(
+                        traffic_light.id,
+                        round(light_location.x, 3),
+                        round(light_location.y, 3),
+                        round(light_location.z, 3)))
+                red_light_event.set_dict({
+                    'id': traffic_light.id,
+                    'x': light_location.x,
+                    'y': light_location.y,
+                    'z': light_location.z})
+
+                self.list_traffic_events.append(red_light_event)
+                self._last_red_light_id = traffic_light.id
 
         if self._terminate_on_failure and (self.test_status == "FAILURE"):
             new_status = py_trees.common.Status.FAILURE
@@ -1826,6 +1831,26 @@ class RunningRedLightTest(Criterion):
 
         return new_status
 
+    def _draw_traffic_lights(self):
+        """
+        Draw the traffic lights and their waypoints (debug)
+        """
+        z = 2.1
+        for traffic_light, center, waypoints in self._list_traffic_lights:
+            if traffic_light.state == carla.TrafficLightState.Red:
+                color = carla.Color(155, 0, 0)
+            elif traffic_light.state == carla.TrafficLightState.Green:
+                color = carla.Color(0, 155, 0)
+            else:
+                color = carla.Color(155, 155, 0)
+            self._world.debug.draw_point(center + carla.Location(z=z), size=0.2, color=color, life_time=0.01)
+            for wp in waypoints:
+                text = "{}.{}".format(wp.road_id, wp.lane_id)
+                self._world.debug.draw_string(
+                    wp.transform.location + carla.Location(x=1, z=z), text, color=color, life_time=0.01)
+                self._world.debug.draw_point(
+                    wp.transform.location + carla.Location(z=z), size=0.1, color=color, life_time=0.01)
+
     def rotate_point(self, point, angle):
         """
         rotate a given point by a given angle
@@ -1906,6 +1931,17 @@ class RunningStopTest(Criterion):
             if 'traffic.stop' in _actor.type_id:
                 self._list_stop_signs.append(_actor)
 
+        # Stop sign locations and trigger volumes (in world coordinates), so that they are not requested every tick
+        self._stop_locations = np.zeros((len(self._list_stop_signs), 3))
+        self._stop_trigger_centers = np.zeros((len(self._list_stop_signs), 2))
+        self._stop_trigger_extents = np.zeros((len(self._list_stop_signs), 2))
+        for index, stop in enumerate(self._list_stop_signs):
+            stop_t = stop.get_transform()
+            transformed_tv = stop_t.transform(stop.trigger_volume.location)
+            self._stop_locations[index] = (stop_t.location.x, stop_t.location.y, stop_t.location.z)
+            self._stop_trigger_centers[index] = (transformed_tv.x, transformed_tv.y)
+            self._stop_trigger_extents[index] = (stop.trigger_volume.extent.x, stop.trigger_volume.extent.y)
+
     @staticmethod
     def point_inside_boundingbox(point, bb_center, bb_extent):
         """
@@ -1936,18 +1972,22 @@ class RunningStopTest(Criterion):
         """
         Check if the given actor is affected by the stop
         """
-        affected = False
-        # first we run a fast coarse test
-        current_location = actor.get_location()
-        stop_location = stop.get_transform().location
-        if stop_location.distance(current_location) > self.PROXIMITY_THRESHOLD:
-            return affected
+        stop_index = self._list_stop_signs.index(stop)
+        return self._get_affecting_stops(actor.get_location(), [stop_index], multi_step) == [stop_index]
 
-        stop_t = stop.get_transform()
-        transformed_tv = stop_t.transform(stop.trigger_volume.location)
-
-        # slower and accurate test based on waypoint's horizon and geometric test
-        list_locations = [current_location]
+    def _get_affecting_stops(self, current_location, stop_indices, multi_step=20):
+        """
+        Returns the stops (of stop_indices, in the same order) affecting an actor at current_location
+        """
+        # first we run a fast coarse test
+        stop_indices = np.asarray(stop_indices, dtype=np.int64)
+        delta = self._stop_locations[stop_indices] - (current_location.x, current_location.y, current_location.z)
+        stop_indices = stop_indices[np.sqrt(np.sum(delta * delta, axis=1)) <= self.PROXIMITY_THRESHOLD]
+        if len(stop_indices) == 0:
+            return []
+
+        # slower and accurate test based on waypoint's horizon (computed once for all stops) and geometric test
+        list_locations = [(current_location.x, current_location.y)]
         waypoint = self._map.get_waypoint(current_location)
         for _ in range(multi_step):
             if waypoint:
@@ -1957,17 +1997,19 @@ class RunningStopTest(Criterion):
                 waypoint = next_wps[0]
                 if not waypoint:
                     break
-                list_locations.append(waypoint.transform.location)
+                list_locations.append((waypoint.transform.location.x, waypoint.transform.location.y))
 
-        for actor_location in list_locations:
-            if self.point_inside_boundingbox(actor_location, transformed_tv, stop.trigger_volume.extent):
-                affected = True
-
-        return affected
+        # same test as point_inside_boundingbox() for all locations and stops at once
+        distance = np.abs(np.array(list_locations)[:, None, :] - self._stop_trigger_centers[stop_indices][None, :, :])
+        inside = np.all(distance < self._stop_trigger_extents[stop_indices][None, :, :], axis=2)
+        return stop_indices[np.any(inside, axis=0)].tolist()
 
     def _scan_for_stop_sign(self):
         target_stop_sign = None
 
+        if not self._list_stop_signs:
+            return target_stop_sign
+
         ve_tra = CarlaDataProvider.get_transform(self._actor)
         ve_dir = ve_tra.get_forward_vector()
 
@@ -1977,11 +2019,11 @@ class RunningStopTest(Criterion):
         dot_ve_wp = ve_dir.x * wp_dir.x + ve_dir.y * wp_dir.y + ve_dir.z * wp_dir.z
 
         if dot_ve_wp > 0:  # Ignore all when going in a wrong lane
-            for stop_sign in self._list_stop_signs:
-                if self.is_actor_affected_by_stop(self._actor, stop_sign):
-                    # this stop sign is affecting the vehicle
-                    target_stop_sign = stop_sign
-                    break
+            affecting_stops = self._get_affecting_stops(self._actor.get_location(),
+                                                        range(len(self._list_stop_signs)))
+            if affecting_stops:
+                # this stop sign is affecting the vehicle
+                target_stop_sign = self._list_stop_signs[affecting_stops[0]]
 
         return target_stop_sign
 
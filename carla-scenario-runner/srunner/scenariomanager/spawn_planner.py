@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides the selection of free spawn points for actors spawned in one batch
+"""
+
+import math
+
+
+class SpawnPlanner(object):
+
+    """
+    Hands out the (shuffled) spawn points of the map, skipping the ones occupied by
+    other actors or by spawn points already handed out.
+
+    The occupied locations are kept in a spatial hash with cells of min_distance,
+    so checking a spawn point only compares it to the locations of the 3x3 neighbouring cells.
+
+    Usage:
+    planner = SpawnPlanner(spawn_points, [actor.get_location() for actor in actors])
+    planner.occupy(transform.location)
+    spawn_point = planner.get_next_spawn_point()
+    """
+
+    def __init__(self, spawn_points, occupied_locations=None, min_distance=3.0, start_index=0):
+        self._spawn_points = spawn_points
+        self._index = start_index
+        self._min_distance = min_distance
+        self._cells = {}
+        for location in occupied_locations or []:
+            self.occupy(location)
+
+    def _get_cell(self, x, y):
+        return (int(math.floor(x / self._min_distance)), int(math.floor(y / self._min_distance)))
+
+    def occupy(self, location):
+        """
+        Mark the location as occupied
+        """
+        cell = self._get_cell(location.x, location.y)
+        self._cells.setdefault(cell, []).append((location.x, location.y))
+
+    def is_free(self, location):
+        """
+        Returns True if no occupied location is closer than min_distance (in 2D)
+        """
+        cell_x, cell_y = self._get_cell(location.x, location.y)
+        min_distance_squared = self._min_distance * self._min_distance
+        for neighbour_x in range(cell_x - 1, cell_x + 2):
+            for neighbour_y in range(cell_y - 1, cell_y + 2):
+                for x, y in self._cells.get((neighbour_x, neighbour_y), ()):
+                    if (x - location.x) ** 2 + (y - location.y) ** 2 < min_distance_squared:
+                        return False
+        return True
+
+    def get_index(self):
+        """
+        Returns the index of the next spawn point to be checked
+        """
+        return self._index
+
+    def get_next_spawn_point(self):
+        """
+        Returns the next free spawn point (which is then occupied), or None if there is none left
+        """
+        while self._index < len(self._spawn_points):
+            spawn_point = self._spawn_points[self._index]
+            self._index += 1
+            if self.is_free(spawn_point.location):
+                self.occupy(spawn_point.location)
+                return spawn_point
+        return None
@@ -11,6 +11,7 @@ Basic scenario class using the OpenSCENARIO definition
 
 from __future__ import print_function
 
+import copy
 import itertools
 import os
 import py_trees
@@ -443,22 +444,30 @@ class OpenScenario(BasicScenario):
 
         return parallel_condition_groups
 
-    def _create_test_criteria(self):
+    @staticmethod
+    def get_criteria_conditions(storyboard):
         """
-        A list of all test criteria will be created that is later used
-        in parallel behavior tree.
+        Returns copies of the StopTrigger conditions named 'criteria_<Criterion>', renamed to '<Criterion>'.
+        The storyboard itself is not modified, so it can be used for further scenarios.
         """
-        parallel_criteria = py_trees.composites.Parallel("EndConditions (Criteria Group)",
-                                                         policy=py_trees.common.ParallelPolicy.SUCCESS_ON_ONE)
-
         criteria = []
-        for endcondition in self.config.storyboard.iter("StopTrigger"):
+        for endcondition in storyboard.iter("StopTrigger"):
             for condition in endcondition.iter("Condition"):
                 if condition.attrib.get('name').startswith('criteria_'):
+                    condition = copy.deepcopy(condition)
                     condition.set('name', condition.attrib.get('name')[9:])
                     criteria.append(condition)
+        return criteria
+
+    def _create_test_criteria(self):
+        """
+        A list of all test criteria will be created that is later used
+        in parallel behavior tree.
+        """
+        parallel_criteria = py_trees.composites.Parallel("EndConditions (Criteria Group)",
+                                                         policy=py_trees.common.ParallelPolicy.SUCCESS_ON_ONE)
 
-        for condition in criteria:
+        for condition in self.get_criteria_conditions(self.config.storyboard):
             criterion = OpenScenarioParser.convert_condition_to_atomic(condition, self.ego_vehicles)
             parallel_criteria.add_child(criterion)
 
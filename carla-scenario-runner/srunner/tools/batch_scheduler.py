@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a scheduler to execute batches of scenarios in parallel on several CARLA servers.
+
+Every job is executed by a separate scenario_runner.py process (the CarlaDataProvider is process global),
+one job at a time per simulator endpoint.
+"""
+
+from __future__ import print_function
+
+import glob
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class BatchJob(object):
+
+    """
+    A single scenario execution, given by the scenario_runner.py arguments selecting the scenario
+    (e.g. ['--openscenario', 'scenarios/F6.xosc'] or ['--route', 'routes.xml', 'scenarios.json', '0'])
+    """
+
+    def __init__(self, job_id, arguments, name=None):
+        self.job_id = job_id
+        self.arguments = list(arguments)
+        self.name = name if name is not None else self._get_default_name()
+        self.attempts = 0
+        self.executed = False
+        self.endpoint = None
+        self.output_dir = None
+        self.duration = None
+
+    def _get_default_name(self):
+        for index, argument in enumerate(self.arguments[:-1]):
+            if argument in ('--openscenario', '--scenario', '--route'):
+                return os.path.splitext(os.path.basename(self.arguments[index + 1]))[0]
+        return "job"
+
+    @staticmethod
+    def parse_job_file(job_file, repetitions=1):
+        """
+        Read the jobs from a file with one set of scenario_runner.py arguments per line.
+        Empty lines and lines starting with '#' are ignored.
+        """
+        jobs = []
+        with open(job_file, 'r', encoding='utf-8') as input_file:
+            for line in input_file:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                arguments = shlex.split(line)
+                for _ in range(repetitions):
+                    jobs.append(BatchJob(len(jobs), arguments))
+        return jobs
+
+
+def get_report_files(output_dir):
+    """
+    Returns the json reports written by the ResultOutputProvider (scenario_runner.py --json) into output_dir.
+    Other json output of scenario_runner.py (e.g. the --profile statistics) is skipped.
+    """
+    return [report_file for report_file in sorted(glob.glob(os.path.join(output_dir, "*.json")))
+            if not report_file.endswith("_profile.json")]
+
+
+class SimulatorEndpoint(object):
+
+    """
+    A CARLA server. Executes a job by running scenario_runner.py against it.
+
+    The scheduler only requires 'name' and 'run_job(job, output_dir)', so any stand-in
+    (e.g. a fake endpoint for testing) providing both can be used instead.
+    """
+
+    def __init__(self, host, port, traffic_manager_port, scenario_runner_args=None, job_timeout=None):
+        self.host = host
+        self.port = int(port)
+        self.traffic_manager_port = int(traffic_manager_port)
+        self.name = "{}:{}:{}".format(self.host, self.port, self.traffic_manager_port)
+        self._scenario_runner_args = scenario_runner_args if scenario_runner_args is not None else []
+        self._job_timeout = job_timeout
+        self._scenario_runner = os.path.join(
+            os.getenv('SCENARIO_RUNNER_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), "../..")),
+            "scenario_runner.py")
+
+    @staticmethod
+    def parse(endpoint, scenario_runner_args=None, job_timeout=None):
+        """
+        Create an endpoint from 'host:port:trafficManagerPort'
+        """
+        parts = endpoint.split(':')
+        if len(parts) != 3:
+            raise ValueError("Invalid endpoint '{}', expected host:port:trafficManagerPort".format(endpoint))
+        return SimulatorEndpoint(parts[0], parts[1], parts[2], scenario_runner_args, job_timeout)
+
+    def run_job(self, job, output_dir):
+        """
+        Execute the job. Returns True if scenario_runner.py executed the scenario (independent of its result).
+
+        The exit code of scenario_runner.py does not tell whether the scenario was executed, e.g. it is also
+        0 if the simulator can not be reached. So a job counts as executed, if its json report was written.
+        """
+        cmdline = [sys.executable, self._scenario_runner,
+                   "--host", self.host,
+                   "--port", str(self.port),
+                   "--trafficManagerPort", str(self.traffic_manager_port),
+                   "--json",
+                   "--outputDir", output_dir] + self._scenario_runner_args + job.arguments
+        with open(os.path.join(output_dir, "scenario_runner.log"), 'w', encoding='utf-8') as log_file:
+            try:
+                exit_code = subprocess.call(cmdline, stdout=log_file, stderr=subprocess.STDOUT,
+                                            timeout=self._job_timeout)
+            except subprocess.TimeoutExpired:
+                log_file.write("\nJob timed out after {}s\n".format(self._job_timeout))
+                return False
+            if not get_report_files(output_dir):
+                log_file.write("\nNo json report written (exit code {})\n".format(exit_code))
+                return False
+        return True
+
+
+class BatchScheduler(object):
+
+    """
+    Dispatches jobs to the endpoints, one job per endpoint at a time.
+
+    A failed job is retried (possibly on another endpoint) up to 'retries' times. An endpoint failing
+    'max_endpoint_failures' jobs in a row is not used anymore.
+    Every attempt gets its own output directory (<output_dir>/<job_id>_<name>/attempt_<n>), the json
+    results written by the ResultOutputProvider of the successful attempts are merged into
+    <output_dir>/batch_results.json.
+    """
+
+    def __init__(self, endpoints, output_dir, retries=1, max_endpoint_failures=3):
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self._endpoints = endpoints
+        self._output_dir = output_dir
+        self._retries = retries
+        self._max_endpoint_failures = max_endpoint_failures
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active_endpoints = 0
+        self._done = threading.Event()
+
+    def run(self, jobs):
+        """
+        Execute all jobs and return them (with their execution state) in job order
+        """
+        if not jobs:
+            return []
+        for job in jobs:
+            self._jobs.put(job)
+        self._pending = len(jobs)
+        self._active_endpoints = len(self._endpoints)
+        self._done.clear()
+
+        threads = []
+        for endpoint in self._endpoints:
+            thread = threading.Thread(target=self._run_endpoint, args=(endpoint,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        self._done.wait()
+        for thread in threads:
+            thread.join()
+
+        self.write_results(jobs)
+        return jobs
+
+    def _run_endpoint(self, endpoint):
+        consecutive_failures = 0
+        while not self._done.is_set():
+            try:
+                job = self._jobs.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            job.attempts += 1
+            job.endpoint = endpoint.name
+            job.output_dir = os.path.join(self._output_dir, "{}_{}".format(job.job_id, job.name),
+                                          "attempt_{}".format(job.attempts))
+            # a report left by an earlier batch in the same directory must not count for this attempt
+            if os.path.isdir(job.output_dir):
+                shutil.rmtree(job.output_dir)
+            os.makedirs(job.output_dir)
+
+            print("Running job {} ({}) on {}, attempt {}".format(job.job_id, job.name, endpoint.name, job.attempts))
+            start_time = time.time()
+            try:
+                job.executed = endpoint.run_job(job, job.output_dir)
+            except Exception as e:  # pylint: disable=broad-except
+                print("Job {} failed on {}: {}".format(job.job_id, endpoint.name, e))
+                job.executed = False
+            job.duration = time.time() - start_time
+
+            with self._lock:
+                if job.executed or job.attempts > self._retries:
+                    if not job.executed:
+                        print("Job {} ({}) failed after {} attempts".format(job.job_id, job.name, job.attempts))
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._done.set()
+                else:
+                    self._jobs.put(job)
+
+                if job.executed:
+                    consecutive_failures = 0
+                else:
+                    consecutive_failures += 1
+                    if consecutive_failures >= self._max_endpoint_failures:
+                        print("Endpoint {} failed {} jobs in a row. Not using it anymore.".format(
+                            endpoint.name, consecutive_failures))
+                        self._active_endpoints -= 1
+                        if self._active_endpoints == 0:
+                            print("No endpoints left, {} jobs not executed".format(self._pending))
+                            self._done.set()
+                        return
+
+    def write_results(self, jobs):
+        """
+        Merge the json results of all jobs into <output_dir>/batch_results.json
+        """
+        merged = []
+        for job in jobs:
+            entry = {
+                "job": job.job_id,
+                "name": job.name,
+                "arguments": job.arguments,
+                "endpoint": job.endpoint,
+                "attempts": job.attempts,
+                "executed": job.executed,
+                "duration": job.duration,
+                "results": []
+            }
+            if job.executed:
+                for result_file in get_report_files(job.output_dir):
+                    try:
+                        with open(result_file, 'r', encoding='utf-8') as input_file:
+                            entry["results"].append(json.load(input_file))
+                    except ValueError as e:
+                        print("Could not read result file {}: {}".format(result_file, e))
+            entry["success"] = job.executed and bool(entry["results"]) and \
+                all(result.get("success", False) for result in entry["results"])
+            merged.append(entry)
+
+        if not os.path.isdir(self._output_dir):
+            os.makedirs(self._output_dir)
+        with open(os.path.join(self._output_dir, "batch_results.json"), 'w', encoding='utf-8') as output_file:
+            json.dump(merged, output_file, indent=4)
+        return merged
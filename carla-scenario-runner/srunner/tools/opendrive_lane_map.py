@@ -0,0 +1,539 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a local lane lookup for OpenDRIVE maps, without the CARLA client.
+
+The OpenDRIVE file is parsed once: the reference line of every road is sampled and every lane is
+split into small strips (one per sample interval), which are stored in a uniform grid. A query
+projects the location onto the candidate strips of its grid cell and returns the lane containing
+it (or the nearest lane). Many locations can be queried at once with query_batch().
+
+Coordinates are CARLA world coordinates (the y axis is mirrored with respect to OpenDRIVE).
+
+Example:
+    lane_map = OpenDriveLaneMap.from_file("Town01.xodr")
+    lane = lane_map.query(location.x, location.y)
+    if lane is None or not lane.is_driving: ...
+
+    # or for a map loaded in CARLA
+    lane_map = OpenDriveLaneMap.from_string(world.get_map().to_opendrive())
+"""
+
+from __future__ import print_function
+
+import math
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+
+class LaneLocation(object):
+
+    """
+    Result of a single lane query
+    """
+
+    def __init__(self, road_id, section_id, lane_id, lane_type, junction_id, s, offset, lane_width, inside):
+        self.road_id = road_id
+        self.section_id = section_id
+        self.lane_id = lane_id
+        self.lane_type = lane_type
+        self.junction_id = junction_id
+        self.s = s
+        self.offset = offset
+        self.lane_width = lane_width
+        self.inside = inside
+
+    @property
+    def is_driving(self):
+        return self.lane_type == "driving"
+
+    @property
+    def is_junction(self):
+        return self.junction_id != -1
+
+    def __repr__(self):
+        return "LaneLocation(road_id={}, section_id={}, lane_id={}, lane_type={}, s={:.2f}, offset={:.2f})".format(
+            self.road_id, self.section_id, self.lane_id, self.lane_type, self.s, self.offset)
+
+
+class LaneQueryResult(object):
+
+    """
+    Result of a batched lane query, one entry per queried location.
+
+    lane_index is -1 for locations without a lane within the search distance.
+    """
+
+    def __init__(self, lane_map, lane_index, s, offset, lane_width, inside):
+        self._lane_map = lane_map
+        self.lane_index = lane_index
+        self.s = s
+        self.offset = offset
+        self.lane_width = lane_width
+        self.inside = inside
+
+    def _get(self, values, default):
+        result = np.full(len(self.lane_index), default, dtype=values.dtype)
+        found = self.lane_index >= 0
+        result[found] = values[self.lane_index[found]]
+        return result
+
+    @property
+    def found(self):
+        return self.lane_index >= 0
+
+    @property
+    def road_id(self):
+        return self._get(self._lane_map.lane_road_id, -1)
+
+    @property
+    def lane_id(self):
+        return self._get(self._lane_map.lane_lane_id, 0)
+
+    @property
+    def lane_type(self):
+        return self._get(self._lane_map.lane_type, "")
+
+    @property
+    def is_driving(self):
+        return self.lane_type == "driving"
+
+    def __len__(self):
+        return len(self.lane_index)
+
+    def __getitem__(self, index):
+        return self._lane_map.get_lane_location(
+            self.lane_index[index], self.s[index], self.offset[index], self.lane_width[index], self.inside[index])
+
+
+class OpenDriveLaneMap(object):
+
+    """
+    Lane geometry of an OpenDRIVE map with a spatial index for fast lane queries.
+
+    Args:
+        xodr (str): OpenDRIVE map content
+        step (float): Maximum sampling distance along the roads [m]
+        cell_size (float): Size of the grid cells of the spatial index [m]
+        search_distance (float): Locations further away from all lanes are not matched [m]
+    """
+
+    # maximum deviation of the sampled chords from curved reference lines [m]
+    _chord_tolerance = 0.02
+
+    def __init__(self, xodr, step=1.0, cell_size=2.0, search_distance=1.0):
+        self._step = step
+        self._cell_size = cell_size
+        self._search_distance = search_distance
+
+        # lane table
+        lane_road_id = []
+        lane_section_id = []
+        lane_lane_id = []
+        lane_type = []
+        lane_junction_id = []
+
+        # strip table (strips of all lanes along the sampled reference lines)
+        strips = []
+
+        root = ET.fromstring(xodr)
+        for road in root.iter("road"):
+            road_id = int(road.attrib["id"])
+            junction_id = int(road.attrib.get("junction", -1))
+            road_length = float(road.attrib["length"])
+            geometries = self._parse_geometries(road)
+            lane_offsets = self._parse_polynomials(road.find("lanes").findall("laneOffset"), "s")
+            sections = road.find("lanes").findall("laneSection")
+            section_starts = [float(section.attrib["s"]) for section in sections]
+
+            for section_id, section in enumerate(sections):
+                section_start = section_starts[section_id]
+                section_end = section_starts[section_id + 1] if section_id + 1 < len(sections) else road_length
+                if section_end - section_start < 1e-6:
+                    continue
+
+                s = self._sample_section(geometries, section_start, section_end)
+                x, y, hdg = self._evaluate_reference_line(geometries, s)
+                offset = self._evaluate_polynomials(lane_offsets, s)
+
+                for side, sign in (("left", 1.0), ("right", -1.0)):
+                    side_lanes = section.find(side)
+                    if side_lanes is None:
+                        continue
+                    lanes = sorted(side_lanes.findall("lane"), key=lambda lane: abs(int(lane.attrib["id"])))
+                    inner = offset.copy()
+                    for lane in lanes:
+                        widths = self._parse_polynomials(lane.findall("width"), "sOffset")
+                        width = self._evaluate_polynomials(widths, s - section_start)
+                        outer = inner + sign * width
+                        if np.max(width) > 1e-3:
+                            lane_index = len(lane_road_id)
+                            lane_road_id.append(road_id)
+                            lane_section_id.append(section_id)
+                            lane_lane_id.append(int(lane.attrib["id"]))
+                            lane_type.append(lane.attrib.get("type", "none"))
+                            lane_junction_id.append(junction_id)
+                            strips.append(self._create_strips(lane_index, s, x, y, hdg, inner, outer))
+                        inner = outer
+
+        self.lane_road_id = np.array(lane_road_id, dtype=np.int32)
+        self.lane_section_id = np.array(lane_section_id, dtype=np.int32)
+        self.lane_lane_id = np.array(lane_lane_id, dtype=np.int32)
+        self.lane_type = np.array(lane_type, dtype=object)
+        self.lane_junction_id = np.array(lane_junction_id, dtype=np.int32)
+
+        strips = np.concatenate(strips) if strips else np.zeros((0, 12))
+        self._strip_lane = strips[:, 0].astype(np.int32)
+        self._strip_start = strips[:, 1:3]
+        self._strip_direction = strips[:, 3:5]
+        self._strip_length = strips[:, 5]
+        self._strip_s = strips[:, 6:8]
+        self._strip_center = strips[:, 8:10]
+        self._strip_half_width = strips[:, 10:12]
+        # plain python copy of the strips for single queries (numpy has too much overhead for a few candidates)
+        self._strip_rows = strips.tolist()
+
+        self._build_grid()
+
+    @staticmethod
+    def from_file(filename, **kwargs):
+        with open(filename, 'r', encoding='utf-8') as xodr_file:
+            return OpenDriveLaneMap(xodr_file.read(), **kwargs)
+
+    @staticmethod
+    def from_string(xodr, **kwargs):
+        return OpenDriveLaneMap(xodr, **kwargs)
+
+    @staticmethod
+    def _parse_polynomials(elements, s_attribute):
+        """
+        Returns [(s, a, b, c, d)] sorted by s
+        """
+        return sorted([tuple(float(element.attrib.get(key, 0.0)) for key in (s_attribute, "a", "b", "c", "d"))
+                       for element in elements])
+
+    @staticmethod
+    def _evaluate_polynomials(polynomials, s):
+        """
+        Evaluate a piecewise cubic polynomial (e.g. laneOffset or width records) at the positions s
+        """
+        result = np.zeros(len(s))
+        if not polynomials:
+            return result
+        starts = np.array([polynomial[0] for polynomial in polynomials])
+        indices = np.clip(np.searchsorted(starts, s + 1e-9, side='right') - 1, 0, len(polynomials) - 1)
+        coefficients = np.array([polynomial[1:] for polynomial in polynomials])[indices]
+        ds = s - starts[indices]
+        return coefficients[:, 0] + ds * (coefficients[:, 1] + ds * (coefficients[:, 2] + ds * coefficients[:, 3]))
+
+    @staticmethod
+    def _parse_geometries(road):
+        geometries = []
+        for geometry in road.find("planView").findall("geometry"):
+            shape = list(geometry)[0]
+            entry = {
+                "s": float(geometry.attrib["s"]),
+                "x": float(geometry.attrib["x"]),
+                "y": float(geometry.attrib["y"]),
+                "hdg": float(geometry.attrib["hdg"]),
+                "length": float(geometry.attrib["length"]),
+                "type": shape.tag,
+                "attributes": {key: value for key, value in shape.attrib.items()}
+            }
+            geometries.append(entry)
+        return sorted(geometries, key=lambda geometry: geometry["s"])
+
+    def _get_max_step(self, geometry):
+        attributes = geometry["attributes"]
+        if geometry["type"] == "arc":
+            curvature = abs(float(attributes["curvature"]))
+        elif geometry["type"] == "spiral":
+            curvature = max(abs(float(attributes["curvStart"])), abs(float(attributes["curvEnd"])))
+        elif geometry["type"] in ("poly3", "paramPoly3"):
+            return min(self._step, 0.5)
+        else:
+            return self._step
+        if curvature < 1e-9:
+            return self._step
+        return min(self._step, math.sqrt(8 * self._chord_tolerance / curvature))
+
+    def _sample_section(self, geometries, section_start, section_end):
+        """
+        Sample positions along the reference line of a lane section, including all geometry changes
+        """
+        breaks = [section_start] + [geometry["s"] for geometry in geometries
+                                    if section_start < geometry["s"] < section_end] + [section_end]
+        samples = []
+        for start, end in zip(breaks[:-1], breaks[1:]):
+            geometry = self._get_geometry(geometries, start)
+            count = max(1, int(math.ceil((end - start) / self._get_max_step(geometry))))
+            samples.append(np.linspace(start, end, count + 1)[:-1])
+        samples.append([section_end])
+        return np.concatenate(samples)
+
+    @staticmethod
+    def _get_geometry(geometries, s):
+        result = geometries[0]
+        for geometry in geometries:
+            if geometry["s"] <= s + 1e-9:
+                result = geometry
+        return result
+
+    def _evaluate_reference_line(self, geometries, s):
+        x = np.zeros(len(s))
+        y = np.zeros(len(s))
+        hdg = np.zeros(len(s))
+        starts = np.array([geometry["s"] for geometry in geometries])
+        indices = np.clip(np.searchsorted(starts, s + 1e-9, side='right') - 1, 0, len(geometries) - 1)
+        for index, geometry in enumerate(geometries):
+            mask = indices == index
+            if np.any(mask):
+                x[mask], y[mask], hdg[mask] = self._evaluate_geometry(geometry, s[mask] - geometry["s"])
+        return x, y, hdg
+
+    @staticmethod
+    def _evaluate_geometry(geometry, ds):
+        """
+        Returns x, y and heading of the geometry at the distances ds from its start
+        """
+        x0 = geometry["x"]
+        y0 = geometry["y"]
+        hdg0 = geometry["hdg"]
+        attributes = geometry["attributes"]
+        geometry_type = geometry["type"]
+
+        if geometry_type == "arc" and abs(float(attributes["curvature"])) > 1e-12:
+            curvature = float(attributes["curvature"])
+            hdg = hdg0 + curvature * ds
+            return (x0 + (np.sin(hdg) - math.sin(hdg0)) / curvature,
+                    y0 - (np.cos(hdg) - math.cos(hdg0)) / curvature,
+                    hdg)
+
+        if geometry_type == "spiral":
+            curv_start = float(attributes["curvStart"])
+            curv_end = float(attributes["curvEnd"])
+            rate = (curv_end - curv_start) / geometry["length"]
+            # numerical integration along a fine grid
+            fine = np.linspace(0.0, geometry["length"], max(2, int(geometry["length"] / 0.05) + 1))
+            fine_hdg = hdg0 + curv_start * fine + 0.5 * rate * fine * fine
+            dx = np.diff(fine) * 0.5 * (np.cos(fine_hdg[1:]) + np.cos(fine_hdg[:-1]))
+            dy = np.diff(fine) * 0.5 * (np.sin(fine_hdg[1:]) + np.sin(fine_hdg[:-1]))
+            fine_x = x0 + np.concatenate(([0.0], np.cumsum(dx)))
+            fine_y = y0 + np.concatenate(([0.0], np.cumsum(dy)))
+            return (np.interp(ds, fine, fine_x), np.interp(ds, fine, fine_y),
+                    hdg0 + curv_start * ds + 0.5 * rate * ds * ds)
+
+        if geometry_type in ("poly3", "paramPoly3"):
+            if geometry_type == "poly3":
+                # approximation: the local u coordinate is used as arc length
+                u = ds
+                du = np.ones(len(ds))
+                a, b, c, d = [float(attributes[key]) for key in ("a", "b", "c", "d")]
+                v = a + u * (b + u * (c + u * d))
+                dv = b + u * (2 * c + u * 3 * d)
+            else:
+                # approximation: the parameter p is assumed to be proportional to the arc length
+                p = ds / geometry["length"] if attributes.get("pRange", "normalized") == "normalized" else ds
+                coefficients = {key: float(attributes[key]) for key in
+                                ("aU", "bU", "cU", "dU", "aV", "bV", "cV", "dV")}
+                u = coefficients["aU"] + p * (coefficients["bU"] + p * (coefficients["cU"] + p * coefficients["dU"]))
+                v = coefficients["aV"] + p * (coefficients["bV"] + p * (coefficients["cV"] + p * coefficients["dV"]))
+                du = coefficients["bU"] + p * (2 * coefficients["cU"] + p * 3 * coefficients["dU"])
+                dv = coefficients["bV"] + p * (2 * coefficients["cV"] + p * 3 * coefficients["dV"])
+            cos_hdg = math.cos(hdg0)
+            sin_hdg = math.sin(hdg0)
+            return (x0 + u * cos_hdg - v * sin_hdg,
+                    y0 + u * sin_hdg + v * cos_hdg,
+                    hdg0 + np.arctan2(dv, du))
+
+        # line
+        return x0 + ds * math.cos(hdg0), y0 + ds * math.sin(hdg0), hdg0 + np.zeros(len(ds))
+
+    @staticmethod
+    def _create_strips(lane_index, s, x, y, hdg, inner, outer):
+        """
+        Split a lane into strips between consecutive samples. Every strip is stored by the chord of the
+        reference line (in CARLA coordinates) and the lateral center and half width of the lane at both ends.
+
+        Columns: lane, start x/y, direction x/y, length, start/end s, start/end center, start/end half width
+        """
+        # OpenDRIVE -> CARLA: mirror the y axis. The lateral offsets are kept with the
+        # OpenDRIVE convention (positive to the left of the reference line).
+        start = np.stack([x[:-1], -y[:-1]], axis=1)
+        direction = np.stack([x[1:] - x[:-1], -(y[1:] - y[:-1])], axis=1)
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        valid = length > 1e-6
+        direction[valid] /= length[valid, None]
+        # degenerated chords use the heading of the reference line
+        direction[~valid] = np.stack([np.cos(hdg[:-1]), -np.sin(hdg[:-1])], axis=1)[~valid]
+
+        center = 0.5 * (inner + outer)
+        half_width = 0.5 * np.abs(outer - inner)
+        return np.column_stack([np.full(len(length), lane_index), start, direction, length,
+                                s[:-1], s[1:], center[:-1], center[1:], half_width[:-1], half_width[1:]])
+
+    def _build_grid(self):
+        """
+        Register every strip in all grid cells overlapped by its (search distance enlarged) bounding box
+        """
+        # lateral offsets are positive to the left of the reference line, which is (dy, -dx) in CARLA coordinates
+        normal = np.stack([self._strip_direction[:, 1], -self._strip_direction[:, 0]], axis=1)
+        end = self._strip_start + self._strip_direction * self._strip_length[:, None]
+        corners = []
+        for point, index in ((self._strip_start, 0), (end, 1)):
+            for sign in (-1.0, 1.0):
+                lateral = self._strip_center[:, index] + sign * self._strip_half_width[:, index]
+                corners.append(point + normal * lateral[:, None])
+        corners = np.stack(corners, axis=1)
+        lower = corners.min(axis=1) - self._search_distance
+        upper = corners.max(axis=1) + self._search_distance
+
+        if len(corners):
+            self._grid_origin = lower.min(axis=0)
+            grid_size = np.floor((upper.max(axis=0) - self._grid_origin) / self._cell_size).astype(np.int64) + 1
+        else:
+            self._grid_origin = np.zeros(2)
+            grid_size = np.ones(2, dtype=np.int64)
+        self._grid_size = grid_size
+
+        cell_lower = np.floor((lower - self._grid_origin) / self._cell_size).astype(np.int64)
+        cell_upper = np.floor((upper - self._grid_origin) / self._cell_size).astype(np.int64)
+
+        cell_ids = []
+        strip_ids = []
+        for strip in range(len(cell_lower)):
+            cells_x = np.arange(cell_lower[strip, 0], cell_upper[strip, 0] + 1)
+            cells_y = np.arange(cell_lower[strip, 1], cell_upper[strip, 1] + 1)
+            cells = (cells_x[:, None] * grid_size[1] + cells_y[None, :]).ravel()
+            cell_ids.append(cells)
+            strip_ids.append(np.full(len(cells), strip, dtype=np.int64))
+
+        cell_ids = np.concatenate(cell_ids) if cell_ids else np.zeros(0, dtype=np.int64)
+        strip_ids = np.concatenate(strip_ids) if strip_ids else np.zeros(0, dtype=np.int64)
+        order = np.argsort(cell_ids, kind='stable')
+        self._cell_strips = strip_ids[order]
+        self._cell_start = np.searchsorted(cell_ids[order], np.arange(grid_size[0] * grid_size[1] + 1))
+        self._cell_strip_lists = {}
+
+    def get_lane_location(self, lane_index, s, offset, lane_width, inside):
+        """
+        Returns the LaneLocation of a lane index (as returned by query_batch()) or None for -1
+        """
+        if lane_index < 0:
+            return None
+        return LaneLocation(int(self.lane_road_id[lane_index]), int(self.lane_section_id[lane_index]),
+                            int(self.lane_lane_id[lane_index]), self.lane_type[lane_index],
+                            int(self.lane_junction_id[lane_index]), float(s), float(offset),
+                            float(lane_width), bool(inside))
+
+    def query(self, x, y, lane_types=None):
+        """
+        Returns the LaneLocation of the lane at (x, y), the nearest lane if the location is outside
+        all lanes, or None if there is no lane within the search distance.
+
+        lane_types (list of str) restricts the result to lanes of these types (e.g. ["driving"])
+        """
+        cell_x = int(math.floor((x - self._grid_origin[0]) / self._cell_size))
+        cell_y = int(math.floor((y - self._grid_origin[1]) / self._cell_size))
+        if not (0 <= cell_x < self._grid_size[0] and 0 <= cell_y < self._grid_size[1]):
+            return None
+        cell_id = cell_x * int(self._grid_size[1]) + cell_y
+        strips = self._cell_strip_lists.get(cell_id)
+        if strips is None:
+            strips = [self._strip_rows[strip] for strip in
+                      self._cell_strips[self._cell_start[cell_id]:self._cell_start[cell_id + 1]].tolist()]
+            self._cell_strip_lists[cell_id] = strips
+
+        best = None
+        best_key = None
+        for (lane, start_x, start_y, direction_x, direction_y, length,
+             start_s, end_s, start_center, end_center, start_half, end_half) in strips:
+            if lane_types is not None and self.lane_type[int(lane)] not in lane_types:
+                continue
+            delta_x = x - start_x
+            delta_y = y - start_y
+            along = delta_x * direction_x + delta_y * direction_y
+            lateral = delta_x * direction_y - delta_y * direction_x
+            ratio = min(max(along / length, 0.0), 1.0) if length > 1e-9 else 0.0
+            center = start_center + ratio * (end_center - start_center)
+            half_width = start_half + ratio * (end_half - start_half)
+            center_distance = abs(lateral - center)
+            distance = math.hypot(along - ratio * length, max(center_distance - half_width, 0.0))
+            key = (distance, center_distance)
+            if best_key is None or key < best_key:
+                best_key = key
+                best = (lane, start_s + ratio * (end_s - start_s), lateral - center, 2 * half_width)
+
+        if best is None or best_key[0] > self._search_distance:
+            return None
+        return self.get_lane_location(int(best[0]), best[1], best[2], best[3], best_key[0] < 1e-9)
+
+    def query_batch(self, points, lane_types=None):
+        """
+        Query the lanes of many locations at once. points is an array of shape (n, 2) with x and y.
+        Returns a LaneQueryResult.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        count = len(points)
+        lane_index = np.full(count, -1, dtype=np.int64)
+        s = np.zeros(count)
+        offset = np.zeros(count)
+        lane_width = np.zeros(count)
+        inside = np.zeros(count, dtype=bool)
+
+        # candidate strips of the grid cell of every point
+        cell = np.floor((points - self._grid_origin) / self._cell_size).astype(np.int64)
+        valid = np.all((cell >= 0) & (cell < self._grid_size), axis=1)
+        cell_id = np.where(valid, cell[:, 0] * self._grid_size[1] + cell[:, 1], 0)
+        first = self._cell_start[cell_id]
+        counts = np.where(valid, self._cell_start[cell_id + 1] - first, 0)
+        total = int(counts.sum())
+        if total == 0:
+            return LaneQueryResult(self, lane_index, s, offset, lane_width, inside)
+
+        point = np.repeat(np.arange(count), counts)
+        position = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        strip = self._cell_strips[np.repeat(first, counts) + position]
+
+        if lane_types is not None:
+            allowed = np.isin(self.lane_type[self._strip_lane[strip]], list(lane_types))
+            point = point[allowed]
+            strip = strip[allowed]
+            if len(strip) == 0:
+                return LaneQueryResult(self, lane_index, s, offset, lane_width, inside)
+
+        # project the points onto the strips
+        delta = points[point] - self._strip_start[strip]
+        direction = self._strip_direction[strip]
+        length = self._strip_length[strip]
+        along = delta[:, 0] * direction[:, 0] + delta[:, 1] * direction[:, 1]
+        lateral = delta[:, 0] * direction[:, 1] - delta[:, 1] * direction[:, 0]
+        ratio = np.clip(along / np.maximum(length, 1e-9), 0.0, 1.0)
+        along_distance = np.abs(along - ratio * length)
+
+        center = self._strip_center[strip, 0] + ratio * (self._strip_center[strip, 1] - self._strip_center[strip, 0])
+        half_width = self._strip_half_width[strip, 0] + ratio * (
+            self._strip_half_width[strip, 1] - self._strip_half_width[strip, 0])
+        center_distance = np.abs(lateral - center)
+        distance = np.hypot(along_distance, np.maximum(center_distance - half_width, 0.0))
+
+        # best strip per point: inside/nearest lane first, then the nearest lane center
+        order = np.lexsort((center_distance, distance, point))
+        best = order[np.r_[True, point[order][1:] != point[order][:-1]]]
+        best = best[distance[best] <= self._search_distance]
+
+        best_point = point[best]
+        best_strip = strip[best]
+        lane_index[best_point] = self._strip_lane[best_strip]
+        s[best_point] = self._strip_s[best_strip, 0] + ratio[best] * (
+            self._strip_s[best_strip, 1] - self._strip_s[best_strip, 0])
+        offset[best_point] = lateral[best] - center[best]
+        lane_width[best_point] = 2 * half_width[best]
+        inside[best_point] = distance[best] < 1e-9
+        return LaneQueryResult(self, lane_index, s, offset, lane_width, inside)
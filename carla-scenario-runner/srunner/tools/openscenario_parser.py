@@ -16,6 +16,8 @@ import copy
 import datetime
 import math
 import operator
+import re
+from functools import lru_cache
 
 import py_trees
 import carla
@@ -200,14 +202,59 @@ class OpenScenarioParser(object):
         if additional_parameter_dict is not None:
             parameter_dict = dict(list(parameter_dict.items()) + list(additional_parameter_dict.items()))
 
-        for node in xml_tree.iter():
-            for key in node.attrib:
-                for param in sorted(parameter_dict, key=len, reverse=True):
-                    if "$" + param in node.attrib[key]:
-                        node.attrib[key] = node.attrib[key].replace("$" + param, parameter_dict[param])
+        OpenScenarioParser.replace_parameter_references(xml_tree, parameter_dict)
 
         return xml_tree, parameter_dict
 
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _get_parameter_reference_pattern(parameter_names):
+        """
+        Compile a regex matching "$" followed by any of the parameter names.
+        Longer names come first, so that the longest parameter name matches (e.g. $speed_max before $speed).
+        """
+        names = sorted(parameter_names, key=len, reverse=True)
+        return re.compile(r"\$(" + "|".join(re.escape(name) for name in names) + ")")
+
+    @staticmethod
+    def replace_parameter_references(xml_tree, parameter_dict):
+        """
+        Replace all parameter references ("$name") in the attributes of all nodes of xml_tree
+        by the parameter values. Every attribute is resolved in a single pass.
+
+        References within parameter values are expanded as well, with the same result as replacing
+        the parameters one after the other (longest name first): a value may refer to parameters
+        whose names are not longer than its own.
+
+        Args:
+            xml_tree: Containing all nodes that should be updated
+            parameter_dict (dictionary): Parameters (key, value)
+        """
+        if not parameter_dict:
+            return
+
+        pattern = OpenScenarioParser._get_parameter_reference_pattern(frozenset(parameter_dict))
+
+        # expand the references within the values, as the following replacements would have done
+        names = sorted(parameter_dict, key=len, reverse=True)
+        values = {}
+        for index, name in enumerate(names):
+            value = parameter_dict[name]
+            if "$" in value:
+                for later_name in names[index + 1:]:
+                    if "$" + later_name in value:
+                        value = value.replace("$" + later_name, parameter_dict[later_name])
+            values[name] = value
+
+        def replace(match):
+            return values[match.group(1)]
+
+        for node in xml_tree.iter():
+            attrib = node.attrib
+            for key in attrib:
+                if "$" in attrib[key]:
+                    attrib[key] = pattern.sub(replace, attrib[key])
+
     @staticmethod
     def set_global_parameters(parameter_dict):
         """
@@ -269,11 +316,7 @@ class OpenScenarioParser(object):
                 value = parameter_assignment.attrib.get("value")
                 parameter_dict[parameter] = value
 
-        for node in entry_instance.iter():
-            for key in node.attrib:
-                for param in sorted(parameter_dict, key=len, reverse=True):
-                    if "$" + param in node.attrib[key]:
-                        node.attrib[key] = node.attrib[key].replace("$" + param, parameter_dict[param])
+        OpenScenarioParser.replace_parameter_references(entry_instance, parameter_dict)
 
         OpenScenarioParser.set_parameters(entry_instance, OpenScenarioParser.global_osc_parameters)
 
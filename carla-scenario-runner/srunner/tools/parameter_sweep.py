@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides the expansion of OpenSCENARIO parameter sweeps into parameter sets
+and the columnar (csv) output of the sweep results.
+
+A sweep is given either as json file:
+
+    {
+        "mode": "grid",
+        "parameters": {
+            "Leading1Speed": {"start": 5, "stop": 15, "step": 2.5},
+            "PedestrianSpeed": [1.0, 1.39, 2.0]
+        }
+    }
+
+or inline as 'Leading1Speed=5:15:2.5,PedestrianSpeed=1.0;1.39;2.0' (always a grid).
+
+The mode "grid" runs all combinations, "zip" combines the n-th values of all parameters.
+"""
+
+from __future__ import print_function
+
+import csv
+import itertools
+import json
+import math
+import os
+
+
+class ParameterSweep(object):
+
+    """
+    Expands parameter ranges into the parameter sets of the single scenario runs
+    """
+
+    def __init__(self, parameters, mode="grid"):
+        if mode not in ("grid", "zip"):
+            raise ValueError("Unknown sweep mode '{}', expected 'grid' or 'zip'".format(mode))
+        self.mode = mode
+        self.parameters = [(name, self._expand_values(name, values)) for name, values in parameters]
+        if mode == "zip" and len(set(len(values) for _, values in self.parameters)) > 1:
+            raise ValueError("All parameters of a 'zip' sweep need the same number of values")
+
+    @staticmethod
+    def _format_value(value):
+        if isinstance(value, float):
+            return "{:.10g}".format(value)
+        return str(value)
+
+    @staticmethod
+    def _expand_values(name, values):
+        if isinstance(values, dict):
+            start = float(values["start"])
+            stop = float(values["stop"])
+            step = float(values["step"])
+            if step <= 0:
+                raise ValueError("The step of sweep parameter '{}' has to be positive".format(name))
+            # the last value must not exceed stop, e.g. 0:1:0.6 is [0, 0.6]
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            values = [start + index * step for index in range(count)]
+        if not values:
+            raise ValueError("Sweep parameter '{}' has no values".format(name))
+        return [ParameterSweep._format_value(value) for value in values]
+
+    @staticmethod
+    def parse(sweep):
+        """
+        Create a sweep from a json file or an inline definition (see module description)
+        """
+        if os.path.isfile(sweep):
+            with open(sweep, 'r', encoding='utf-8') as sweep_file:
+                definition = json.load(sweep_file)
+            return ParameterSweep(list(definition["parameters"].items()), definition.get("mode", "grid"))
+
+        parameters = []
+        for entry in sweep.split(','):
+            name, values = [m.strip() for m in entry.split('=')]
+            if ':' in values:
+                start, stop, step = values.split(':')
+                parameters.append((name, {"start": start, "stop": stop, "step": step}))
+            else:
+                parameters.append((name, values.split(';')))
+        return ParameterSweep(parameters)
+
+    def get_parameter_names(self):
+        return [name for name, _ in self.parameters]
+
+    def __len__(self):
+        if self.mode == "zip":
+            return len(self.parameters[0][1])
+        count = 1
+        for _, values in self.parameters:
+            count *= len(values)
+        return count
+
+    def __iter__(self):
+        """
+        Yields the parameter dict of every run
+        """
+        names = self.get_parameter_names()
+        values = [values for _, values in self.parameters]
+        combinations = zip(*values) if self.mode == "zip" else itertools.product(*values)
+        for combination in combinations:
+            yield dict(zip(names, combination))
+
+
+class SweepResultWriter(object):
+
+    """
+    Streams the results of the sweep runs into a csv file, one row per run and one column per
+    parameter and criterion (actual value). The criteria columns are taken from the first executed run.
+    """
+
+    def __init__(self, filename, parameter_names):
+        self._filename = filename
+        self._parameter_names = parameter_names
+        self._criteria_names = None
+        self._file = None
+        self._writer = None
+        self._pending_rows = []
+
+    @staticmethod
+    def _get_criteria_values(manager):
+        values = []
+        counts = {}
+        for criterion in manager.scenario.get_criteria():
+            counts[criterion.name] = counts.get(criterion.name, 0) + 1
+            name = criterion.name
+            if counts[criterion.name] > 1:
+                name = "{}_{}".format(criterion.name, counts[criterion.name])
+            values.append((name, criterion.actual_value))
+        return values
+
+    def _open(self, criteria_names):
+        self._criteria_names = criteria_names
+        self._file = open(self._filename, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self._parameter_names +
+                              ["executed", "result", "duration_game", "duration_system"] + criteria_names)
+        for row in self._pending_rows:
+            self._writer.writerow(row + [""] * len(criteria_names))
+        self._pending_rows = []
+
+    def add(self, parameters, manager=None):
+        """
+        Write the result of a run. manager is the ScenarioManager after the run, None if the run failed.
+        """
+        row = [parameters.get(name, "") for name in self._parameter_names]
+        if manager is None:
+            row += [False, "", "", ""]
+            if self._writer is None:
+                # header is not known yet
+                self._pending_rows.append(row)
+                return
+            row += [""] * len(self._criteria_names)
+        else:
+            criteria = self._get_criteria_values(manager)
+            if self._writer is None:
+                self._open([name for name, _ in criteria])
+            criteria = dict(criteria)
+            result, _, _ = manager.get_scenario_result()
+            row += [True, result, manager.scenario_duration_game, manager.scenario_duration_system]
+            row += [criteria.get(name, "") for name in self._criteria_names]
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        if self._writer is None:
+            self._open([])
+        self._file.close()
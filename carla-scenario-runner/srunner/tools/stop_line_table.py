@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a table of 2D line segments (e.g. the stop lines of traffic lights)
+with a grid index, to find the lines crossed by a moving segment without testing all of them.
+"""
+
+import math
+
+import numpy as np
+
+
+class StopLineTable(object):
+
+    """
+    Table of 2D stop line segments.
+
+    Every line has an owner index (e.g. the index of its traffic light), a lane key (road_id, lane_id)
+    and the driving direction of the lane. Lines are added with add_line() and indexed by build().
+
+    Usage:
+    table = StopLineTable()
+    table.add_line((x0, y0), (x1, y1), owner, road_id, lane_id, (dir_x, dir_y))
+    table.build()
+    crossed = table.get_crossed_lines((x0, y0), (x1, y1))
+    """
+
+    def __init__(self, cell_size=10.0):
+        self._cell_size = cell_size
+        self._lines = []
+
+        self.start = np.zeros((0, 2))
+        self.end = np.zeros((0, 2))
+        self.owner = np.zeros(0, dtype=np.int64)
+        self.road_id = np.zeros(0, dtype=np.int64)
+        self.lane_id = np.zeros(0, dtype=np.int64)
+        self.direction = np.zeros((0, 2))
+        self._cells = {}
+
+    def __len__(self):
+        return len(self.owner)
+
+    def add_line(self, start, end, owner, road_id, lane_id, direction):
+        self._lines.append((start[0], start[1], end[0], end[1], owner, road_id, lane_id, direction[0], direction[1]))
+
+    def build(self):
+        """
+        Convert the added lines into arrays and register them in the grid cells overlapped by their bounding box
+        """
+        lines = np.array(self._lines, dtype=np.float64).reshape(-1, 9)
+        self.start = lines[:, 0:2]
+        self.end = lines[:, 2:4]
+        self.owner = lines[:, 4].astype(np.int64)
+        self.road_id = lines[:, 5].astype(np.int64)
+        self.lane_id = lines[:, 6].astype(np.int64)
+        self.direction = lines[:, 7:9]
+
+        cells = {}
+        lower = np.floor(np.minimum(self.start, self.end) / self._cell_size).astype(np.int64)
+        upper = np.floor(np.maximum(self.start, self.end) / self._cell_size).astype(np.int64)
+        for index in range(len(lines)):
+            for cell_x in range(lower[index, 0], upper[index, 0] + 1):
+                for cell_y in range(lower[index, 1], upper[index, 1] + 1):
+                    cells.setdefault((cell_x, cell_y), []).append(index)
+        self._cells = {cell: np.array(indices, dtype=np.int64) for cell, indices in cells.items()}
+
+    def get_candidates(self, start, end):
+        """
+        Returns the indices of all lines registered in the grid cells overlapped by the segment's bounding box
+        """
+        lower_x = int(math.floor(min(start[0], end[0]) / self._cell_size))
+        lower_y = int(math.floor(min(start[1], end[1]) / self._cell_size))
+        upper_x = int(math.floor(max(start[0], end[0]) / self._cell_size))
+        upper_y = int(math.floor(max(start[1], end[1]) / self._cell_size))
+        candidates = [self._cells[(cell_x, cell_y)]
+                      for cell_x in range(lower_x, upper_x + 1)
+                      for cell_y in range(lower_y, upper_y + 1)
+                      if (cell_x, cell_y) in self._cells]
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        if len(candidates) == 1:
+            return candidates[0]
+        return np.unique(np.concatenate(candidates))
+
+    def get_crossed_lines(self, start, end):
+        """
+        Returns the indices (in ascending order) of all lines intersecting the segment start-end
+        (touching and collinear overlapping segments count as intersecting)
+        """
+        candidates = self.get_candidates(start, end)
+        if len(candidates) == 0:
+            return candidates
+
+        p_x, p_y = start
+        r_x, r_y = end[0] - start[0], end[1] - start[1]
+        a = self.start[candidates]
+        b = self.end[candidates]
+
+        # orientation of the line end points relative to the segment and vice versa
+        side_a = r_x * (a[:, 1] - p_y) - r_y * (a[:, 0] - p_x)
+        side_b = r_x * (b[:, 1] - p_y) - r_y * (b[:, 0] - p_x)
+        line = b - a
+        side_p = line[:, 0] * (p_y - a[:, 1]) - line[:, 1] * (p_x - a[:, 0])
+        side_q = line[:, 0] * (end[1] - a[:, 1]) - line[:, 1] * (end[0] - a[:, 0])
+        crossing = (side_a * side_b <= 0) & (side_p * side_q <= 0)
+
+        # collinear segments only intersect if their bounding boxes overlap
+        collinear = (side_a == 0) & (side_b == 0)
+        if np.any(collinear):
+            overlap = ((np.minimum(a[:, 0], b[:, 0]) <= max(p_x, end[0])) &
+                       (np.maximum(a[:, 0], b[:, 0]) >= min(p_x, end[0])) &
+                       (np.minimum(a[:, 1], b[:, 1]) <= max(p_y, end[1])) &
+                       (np.maximum(a[:, 1], b[:, 1]) >= min(p_y, end[1])))
+            crossing &= ~collinear | overlap
+
+        return candidates[crossing]
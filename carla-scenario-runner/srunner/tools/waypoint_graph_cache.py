@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a cache of the lane graph (waypoint successors) of the current map,
+which is shared by all actor controllers.
+"""
+
+from collections import OrderedDict
+import math
+
+from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
+
+
+class WaypointGraphCache(object):
+
+    """
+    This (static) class caches waypoint successors and waypoint projections of the current map.
+
+    The successors are stored per (road_id, section_id, lane_id, s bucket), with buckets of the successor
+    distance. The successor of a bucket is computed from the waypoint at the start of the bucket (in driving
+    direction), so it is the same for all waypoints within the bucket and between 0 and distance ahead of
+    them, independent of which waypoint was requested first. Following a chain of successors therefore only
+    queries the map once per bucket and lane, independent of the number of actors driving along it.
+    Buckets whose start is not part of the lane section (at the section borders) are not cached.
+
+    The projections are kept in a LRU cache of MAX_PROJECTIONS locations.
+
+    The cache is built lazily and reset when the map changes.
+    """
+
+    MAX_PROJECTIONS = 10000
+
+    _map_name = None
+    _successors = {}
+    _projections = OrderedDict()
+
+    @staticmethod
+    def _check_map():
+        carla_map = CarlaDataProvider.get_map()
+        if carla_map.name != WaypointGraphCache._map_name:
+            WaypointGraphCache.reset()
+            WaypointGraphCache._map_name = carla_map.name
+        return carla_map
+
+    @staticmethod
+    def get_key(waypoint, distance):
+        """
+        Returns the key of the bucket of the waypoint. Lanes with a positive id are driven against the
+        s direction, so their buckets start at their upper end.
+        """
+        if waypoint.lane_id > 0:
+            bucket = int(math.ceil(waypoint.s / distance))
+        else:
+            bucket = int(math.floor(waypoint.s / distance))
+        return (waypoint.road_id, waypoint.section_id, waypoint.lane_id, bucket, distance)
+
+    @staticmethod
+    def _get_bucket_start(carla_map, key):
+        road_id, section_id, lane_id, bucket, distance = key
+        waypoint = carla_map.get_waypoint_xodr(road_id, lane_id, bucket * distance)
+        if waypoint is None or waypoint.section_id != section_id:
+            return None
+        return waypoint
+
+    @staticmethod
+    def get_next(waypoint, distance=2.0):
+        """
+        Returns the (first) successor of the bucket of the waypoint in the given distance (see above),
+        or None at the end of a lane
+        """
+        carla_map = WaypointGraphCache._check_map()
+        key = WaypointGraphCache.get_key(waypoint, distance)
+        if key not in WaypointGraphCache._successors:
+            bucket_start = WaypointGraphCache._get_bucket_start(carla_map, key)
+            if bucket_start is None:
+                next_wps = waypoint.next(distance)
+                return next_wps[0] if next_wps else None
+            next_wps = bucket_start.next(distance)
+            WaypointGraphCache._successors[key] = next_wps[0] if next_wps else None
+        return WaypointGraphCache._successors[key]
+
+    @staticmethod
+    def get_successors(waypoint, count, distance=2.0):
+        """
+        Returns a chain of up to count successors of the waypoint, each in the given distance to the previous one
+        """
+        successors = []
+        for _ in range(count):
+            waypoint = WaypointGraphCache.get_next(waypoint, distance)
+            if waypoint is None:
+                break
+            successors.append(waypoint)
+        return successors
+
+    @staticmethod
+    def get_waypoint(location, project_to_road=True, lane_type=None):
+        """
+        Returns the waypoint of the location (see carla.Map.get_waypoint). Projections of the same
+        location (1 cm resolution), e.g. the route waypoints used by several actors, are cached.
+        """
+        carla_map = WaypointGraphCache._check_map()
+        key = (round(location.x, 2), round(location.y, 2), round(location.z, 2), project_to_road, lane_type)
+        projections = WaypointGraphCache._projections
+        if key in projections:
+            projections.move_to_end(key)
+            return projections[key]
+
+        if lane_type is None:
+            waypoint = carla_map.get_waypoint(location, project_to_road=project_to_road)
+        else:
+            waypoint = carla_map.get_waypoint(location, project_to_road=project_to_road, lane_type=lane_type)
+        projections[key] = waypoint
+        if len(projections) > WaypointGraphCache.MAX_PROJECTIONS:
+            projections.popitem(last=False)
+        return waypoint
+
+    @staticmethod
+    def reset():
+        """
+        Clear the cache
+        """
+        WaypointGraphCache._map_name = None
+        WaypointGraphCache._successors = {}
+        WaypointGraphCache._projections = OrderedDict()
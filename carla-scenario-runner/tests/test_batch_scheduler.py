@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+BatchScheduler and SimulatorEndpoint with fake endpoints and a fake scenario_runner.py,
+no simulator required.
+"""
+
+import json
+import os
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from srunner.tools.batch_scheduler import (BatchJob,  # pylint: disable=wrong-import-position
+                                           BatchScheduler,
+                                           SimulatorEndpoint)
+
+# Behaves like scenario_runner.py depending on the port:
+# 2000 executes the scenario, 2001 can not connect to CARLA (but exits with 0 as scenario_runner.py did)
+FAKE_SCENARIO_RUNNER = textwrap.dedent("""
+    import json, os, sys
+    arguments = sys.argv[1:]
+    port = arguments[arguments.index("--port") + 1]
+    output_dir = arguments[arguments.index("--outputDir") + 1]
+    if port == "2001":
+        print("RuntimeError: time-out of 10000ms while waiting for the simulator")
+        sys.exit(0)
+    with open(os.path.join(output_dir, "FollowLeadingVehicle2020-01-01-00-00-00.json"), "w") as output_file:
+        json.dump({"scenario": "FollowLeadingVehicle", "success": True, "criteria": []}, output_file)
+    with open(os.path.join(output_dir, "FollowLeadingVehicle2020-01-01-00-00-00_profile.json"), "w") as output_file:
+        json.dump({"behaviours": []}, output_file)
+""")
+
+
+class FakeEndpoint(object):
+
+    """
+    Endpoint writing a report for every job, except the first 'failures' ones
+    """
+
+    def __init__(self, name, failures=0, success=True):
+        self.name = name
+        self.jobs = []
+        self._failures = failures
+        self._success = success
+
+    def run_job(self, job, output_dir):
+        self.jobs.append(job.job_id)
+        if len(self.jobs) <= self._failures:
+            return False
+        with open(os.path.join(output_dir, "{}.json".format(job.name)), 'w', encoding='utf-8') as output_file:
+            json.dump({"scenario": job.name, "success": self._success, "criteria": []}, output_file)
+        with open(os.path.join(output_dir, "{}_profile.json".format(job.name)), 'w', encoding='utf-8') as output_file:
+            json.dump({"behaviours": []}, output_file)
+        return True
+
+
+def create_jobs(count):
+    return [BatchJob(i, ['--openscenario', 'scenario_{}.xosc'.format(i)]) for i in range(count)]
+
+
+def create_endpoint(tmp_path, port):
+    script = tmp_path / "scenario_runner.py"
+    script.write_text(FAKE_SCENARIO_RUNNER)
+    endpoint = SimulatorEndpoint("127.0.0.1", port, 8000)
+    endpoint._scenario_runner = str(script)  # pylint: disable=protected-access
+    return endpoint
+
+
+def test_executed_if_report_written(tmp_path):
+    endpoint = create_endpoint(tmp_path, 2000)
+    output_dir = tmp_path / "attempt_1"
+    output_dir.mkdir()
+    assert endpoint.run_job(create_jobs(1)[0], str(output_dir))
+
+
+def test_not_executed_without_report(tmp_path):
+    endpoint = create_endpoint(tmp_path, 2001)
+    output_dir = tmp_path / "attempt_1"
+    output_dir.mkdir()
+    assert not endpoint.run_job(create_jobs(1)[0], str(output_dir))
+    assert "No json report written" in (output_dir / "scenario_runner.log").read_text()
+
+
+def test_unreachable_simulator_is_retried_elsewhere(tmp_path):
+    endpoints = [create_endpoint(tmp_path, 2001), create_endpoint(tmp_path, 2000)]
+    endpoints[1].name = "good"
+    jobs = BatchScheduler(endpoints, str(tmp_path / "results"), retries=3).run(create_jobs(4))
+    assert all(job.executed for job in jobs)
+    assert all(job.endpoint == "good" for job in jobs)
+
+
+def test_reports_of_an_earlier_batch_are_ignored(tmp_path):
+    job = create_jobs(1)[0]
+    # report of the first attempt of an earlier batch writing into the same directory
+    attempt_dir = tmp_path / "results" / "{}_{}".format(job.job_id, job.name) / "attempt_1"
+    attempt_dir.mkdir(parents=True)
+    (attempt_dir / "scenario_02020-01-01-00-00-00.json").write_text('{"success": true}')
+
+    jobs = BatchScheduler([create_endpoint(tmp_path, 2001)], str(tmp_path / "results"), retries=0).run([job])
+    assert not jobs[0].executed
+    assert not (attempt_dir / "scenario_02020-01-01-00-00-00.json").exists()
+
+
+def test_results_are_merged_without_profiles(tmp_path):
+    endpoints = [FakeEndpoint("flaky", failures=2), FakeEndpoint("good")]
+    jobs = BatchScheduler(endpoints, str(tmp_path), retries=2).run(create_jobs(10))
+
+    assert all(job.executed for job in jobs)
+    with open(str(tmp_path / "batch_results.json"), 'r', encoding='utf-8') as input_file:
+        results = json.load(input_file)
+    assert [entry["job"] for entry in results] == list(range(10))
+    for entry in results:
+        assert entry["success"]
+        assert entry["results"] == [{"scenario": entry["name"], "success": True, "criteria": []}]
+
+
+def test_failed_jobs_and_dead_endpoint(tmp_path):
+    endpoints = [FakeEndpoint("dead", failures=1000)]
+    jobs = BatchScheduler(endpoints, str(tmp_path), retries=1, max_endpoint_failures=3).run(create_jobs(5))
+
+    assert not any(job.executed for job in jobs)
+    # the endpoint is retired after 3 failures in a row, the remaining jobs are not executed at all
+    assert len(endpoints[0].jobs) == 3
+    with open(str(tmp_path / "batch_results.json"), 'r', encoding='utf-8') as input_file:
+        results = json.load(input_file)
+    assert not any(entry["success"] for entry in results)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+The commands of all actor controllers are sent with one apply_batch() call per tick,
+by the ScenarioManager also if ticking the scenario tree raises.
+
+Requires the CARLA PythonAPI, but no running simulator: client and actors are replaced by fakes.
+"""
+
+from collections import namedtuple
+import os
+import sys
+
+import pytest
+
+carla = pytest.importorskip("carla")
+py_trees = pytest.importorskip("py_trees")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from srunner.scenariomanager.actorcontrols.basic_control import BasicControl
+from srunner.scenariomanager.actorcontrols.control_batch import ControlBatch
+from srunner.scenariomanager.actorcontrols.pedestrian_control import PedestrianControl
+from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
+from srunner.scenariomanager.scenario_manager import ScenarioManager
+from srunner.scenariomanager.scenarioatomics.atomic_behaviors import UpdateAllActorControls
+from srunner.scenariomanager.timer import GameTime
+# pylint: enable=wrong-import-position
+
+NUM_WALKERS = 5
+NUM_TICKS = 10
+
+
+class RecordingClient(object):
+
+    def __init__(self):
+        self.batches = []
+
+    def apply_batch(self, commands):
+        self.batches.append(list(commands))
+
+
+class FakeSidewalk(object):
+    type_id = "static.sidewalk"
+
+
+class FakeWalker(object):
+
+    """
+    Walker which only accepts batched commands
+    """
+
+    is_alive = True
+
+    def __init__(self, actor_id, x):
+        self.id = actor_id
+        self._location = carla.Location(x=x)
+        self.direct_calls = 0
+
+    def get_control(self):
+        return carla.WalkerControl()
+
+    def get_location(self):
+        return self._location
+
+    def get_transform(self):
+        return carla.Transform(self._location)
+
+    def apply_control(self, _):
+        self.direct_calls += 1
+
+    def set_transform(self, _):
+        self.direct_calls += 1
+
+
+def create_controller(walker):
+    # without the collision sensor spawned by PedestrianControl.__init__()
+    controller = PedestrianControl.__new__(PedestrianControl)
+    BasicControl.__init__(controller, walker)
+    controller._colliding_actor = None  # pylint: disable=protected-access
+    controller.update_target_speed(1.4)
+    controller.update_waypoints([carla.Transform(carla.Location(x=100.0, y=10.0))])
+    return controller
+
+
+def test_one_batch_per_tick():
+    client = RecordingClient()
+    walkers = [FakeWalker(i + 1, 2.0 * i) for i in range(NUM_WALKERS)]
+    controllers = [create_controller(walker) for walker in walkers]
+
+    for tick in range(NUM_TICKS):
+        if tick == 3:
+            # stuck at a sidewalk: the walker is lifted instead of controlled
+            controllers[0]._colliding_actor = FakeSidewalk()  # pylint: disable=protected-access
+        ControlBatch.begin(client)
+        for controller in controllers:
+            controller.run_step()
+        assert ControlBatch.flush() == NUM_WALKERS
+
+    assert len(client.batches) == NUM_TICKS
+    assert all(walker.direct_calls == 0 for walker in walkers)
+    for tick, batch in enumerate(client.batches):
+        assert sorted(command.actor_id for command in batch) == [walker.id for walker in walkers]
+        transforms = [command for command in batch if isinstance(command, carla.command.ApplyTransform)]
+        assert len(transforms) == (1 if tick == 3 else 0)
+
+
+def test_direct_calls_outside_of_a_tick():
+    walker = FakeWalker(1, 0.0)
+    controller = create_controller(walker)
+    controller._colliding_actor = FakeSidewalk()  # pylint: disable=protected-access
+    controller.run_step()
+    controller.run_step()
+    assert walker.direct_calls == 2
+    assert ControlBatch.flush() == 0
+
+
+Timestamp = namedtuple('Timestamp', ['frame', 'delta_seconds', 'elapsed_seconds'])
+
+
+class FakeWatchdog(object):
+
+    def update(self):
+        pass
+
+
+class FailingBehaviour(py_trees.behaviour.Behaviour):
+
+    """
+    Raises in the given tick, after the actor controls were updated
+    """
+
+    def __init__(self, failing_tick):
+        super(FailingBehaviour, self).__init__("FailingBehaviour")
+        self._failing_tick = failing_tick
+        self._ticks = 0
+
+    def update(self):
+        self._ticks += 1
+        if self._ticks == self._failing_tick:
+            raise RuntimeError("behaviour failed")
+        return py_trees.common.Status.RUNNING
+
+
+def create_manager(walkers, failing_tick=None):
+    controllers = {walker.id: create_controller(walker) for walker in walkers}
+    py_trees.blackboard.Blackboard().set("ActorsWithController", controllers, overwrite=True)
+
+    tree = py_trees.composites.Parallel("Scenario", policy=py_trees.common.ParallelPolicy.SUCCESS_ON_ALL)
+    tree.add_child(UpdateAllActorControls())
+    if failing_tick is not None:
+        tree.add_child(FailingBehaviour(failing_tick))
+
+    manager = ScenarioManager()
+    manager.scenario_tree = tree
+    manager._watchdog = FakeWatchdog()  # pylint: disable=protected-access
+    manager._running = True  # pylint: disable=protected-access
+    return manager
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = RecordingClient()
+    monkeypatch.setattr(CarlaDataProvider, "_client", client)
+    monkeypatch.setattr(CarlaDataProvider, "_world", object())
+    GameTime.restart()
+    yield client
+    py_trees.blackboard.Blackboard().set("ActorsWithController", {}, overwrite=True)
+
+
+def test_manager_sends_one_batch_per_tree_tick(client):
+    walkers = [FakeWalker(i + 1, 2.0 * i) for i in range(NUM_WALKERS)]
+    manager = create_manager(walkers)
+
+    for frame in range(1, NUM_TICKS + 1):
+        manager._tick_scenario(Timestamp(frame, 0.05, 0.05 * frame))  # pylint: disable=protected-access
+        # a second tick of the same frame is ignored
+        manager._tick_scenario(Timestamp(frame, 0.05, 0.05 * frame))  # pylint: disable=protected-access
+
+    assert len(client.batches) == NUM_TICKS
+    assert all(len(batch) == NUM_WALKERS for batch in client.batches)
+    assert all(walker.direct_calls == 0 for walker in walkers)
+    assert not ControlBatch.is_active()
+
+
+def test_manager_flushes_the_batch_if_the_tree_raises(client):
+    walkers = [FakeWalker(i + 1, 2.0 * i) for i in range(NUM_WALKERS)]
+    manager = create_manager(walkers, failing_tick=2)
+
+    manager._tick_scenario(Timestamp(1, 0.05, 0.05))  # pylint: disable=protected-access
+    with pytest.raises(RuntimeError):
+        manager._tick_scenario(Timestamp(2, 0.05, 0.1))  # pylint: disable=protected-access
+
+    # the commands queued before the failure are sent, and nothing is collected afterwards
+    assert [len(batch) for batch in client.batches] == [NUM_WALKERS, NUM_WALKERS]
+    assert not ControlBatch.is_active()
+    assert all(walker.direct_calls == 0 for walker in walkers)
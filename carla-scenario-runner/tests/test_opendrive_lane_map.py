@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+OpenDriveLaneMap on the Town01 map shipped with the demo, no simulator required.
+
+The single and the batched queries have to give the same results, and a few locations
+(computed from the straight roads 4 and 7 of the OpenDRIVE file) have to hit the known lanes.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from srunner.tools.opendrive_lane_map import OpenDriveLaneMap  # pylint: disable=wrong-import-position
+
+XODR_FILE = os.path.join(os.path.dirname(ROOT), "Town01.xodr")
+
+# (x, y, lane_types, expected (road_id, lane_id, lane_type, s) or None)
+KNOWN_LOCATIONS = [
+    (365.73, 330.61, None, (7, -1, "driving", 18.0)),
+    (365.73, 326.61, None, (7, 1, "driving", 18.0)),
+    (365.73, 334.6, None, (7, -3, "sidewalk", 18.0)),
+    # the sidewalk is more than search_distance away from the driving lane
+    (365.73, 334.6, ["driving"], None),
+    (365.73, 332.76, None, (7, -2, "shoulder", 18.0)),
+    # on the shoulder, next to the driving lane
+    (365.73, 332.76, ["driving"], (7, -1, "driving", 18.0)),
+    (201.42, 133.46, None, (4, -1, "driving", 100.0)),
+    (201.42, 129.46, ["driving", "sidewalk"], (4, 1, "driving", 100.0)),
+    (1000.0, 1000.0, None, None),
+]
+
+
+@pytest.fixture(scope="module")
+def lane_map():
+    return OpenDriveLaneMap.from_file(XODR_FILE)
+
+
+def get_random_points(count, seed=0):
+    rng = np.random.RandomState(seed)
+    # the map covers about x in [-10, 405] and y in [-10, 340], include some points outside of it
+    return np.column_stack((rng.uniform(-30, 430, count), rng.uniform(-30, 360, count)))
+
+
+def assert_same_lane(lane, other):
+    if lane is None or other is None:
+        assert lane is None and other is None
+        return
+    assert (lane.road_id, lane.section_id, lane.lane_id, lane.lane_type, lane.inside) == \
+        (other.road_id, other.section_id, other.lane_id, other.lane_type, other.inside)
+    assert (lane.s, lane.offset, lane.lane_width) == pytest.approx((other.s, other.offset, other.lane_width), abs=1e-6)
+
+
+@pytest.mark.parametrize("x, y, lane_types, expected", KNOWN_LOCATIONS)
+def test_known_locations(lane_map, x, y, lane_types, expected):
+    for lane in (lane_map.query(x, y, lane_types), lane_map.query_batch([(x, y)], lane_types)[0]):
+        if expected is None:
+            assert lane is None
+        else:
+            assert (lane.road_id, lane.lane_id, lane.lane_type) == expected[:3]
+            assert lane.s == pytest.approx(expected[3], abs=0.05)
+
+
+@pytest.mark.parametrize("lane_types", [None, ["driving"], ["sidewalk", "shoulder"]])
+def test_query_and_query_batch_agree(lane_map, lane_types):
+    points = get_random_points(20000)
+    result = lane_map.query_batch(points, lane_types)
+
+    assert len(result) == len(points)
+    # most of the town is not covered by lanes
+    assert 0 < np.count_nonzero(result.found) < len(points)
+    if lane_types is not None:
+        assert set(result.lane_type[result.found]) <= set(lane_types)
+
+    for index, (x, y) in enumerate(points):
+        assert_same_lane(lane_map.query(x, y, lane_types), result[index])
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+OpenScenarioParser.replace_parameter_references() has to give the same result as the
+previous sequential replacement of one parameter after the other, including references
+within parameter values.
+
+Run standalone (python tests/test_parameter_references.py) for a benchmark of both versions.
+"""
+
+from __future__ import print_function
+
+import glob
+import os
+import random
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+pytest.importorskip("carla")
+pytest.importorskip("py_trees")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from srunner.tools.openscenario_parser import OpenScenarioParser  # pylint: disable=wrong-import-position
+
+SCENARIO_FILES = sorted(glob.glob(os.path.join(ROOT, "srunner", "examples", "*.xosc")) +
+                        glob.glob(os.path.join(os.path.dirname(ROOT), "*.xosc")))
+
+
+def sequential_replace(xml_tree, parameter_dict):
+    """
+    The replacement before the single pass version
+    """
+    for node in xml_tree.iter():
+        for key in node.attrib:
+            for param in sorted(parameter_dict, key=len, reverse=True):
+                if "$" + param in node.attrib[key]:
+                    node.attrib[key] = node.attrib[key].replace("$" + param, parameter_dict[param])
+
+
+def get_declared_parameters(xml_tree):
+    return dict((parameter.attrib.get("name"), parameter.attrib.get("value"))
+                for parameter in xml_tree.iter("ParameterDeclaration"))
+
+
+def create_synthetic_tree(num_parameters, num_nodes, seed=0):
+    """
+    Tree with many parameters, overlapping names (speed, speed_1, speed_10, ...) and chained references
+    """
+    rng = random.Random(seed)
+    parameter_dict = {}
+    names = ["speed_{}".format(i) for i in range(num_parameters)] + ["speed", "s", "speed_max"]
+    for i, name in enumerate(names):
+        if i % 10 == 0 and i > 0:
+            # reference to a shorter (or equally long) name, which was expanded by the sequential replacement
+            parameter_dict[name] = "${}".format(rng.choice(names[:i]))
+        else:
+            parameter_dict[name] = str(rng.uniform(0, 100))
+
+    root = ET.Element("OpenSCENARIO")
+    for i in range(num_nodes):
+        node = ET.SubElement(root, "Node{}".format(i % 7))
+        node.set("value", "${}".format(rng.choice(names)))
+        node.set("expression", "${}*${}+1".format(rng.choice(names), rng.choice(names)))
+        node.set("literal", str(i))
+    return ET.ElementTree(root), parameter_dict
+
+
+def get_attributes(xml_tree):
+    return [sorted(node.attrib.items()) for node in xml_tree.iter()]
+
+
+def compare(xml_tree, parameter_dict):
+    expected_tree = ET.ElementTree(ET.fromstring(ET.tostring(xml_tree.getroot())))
+    sequential_replace(expected_tree, parameter_dict)
+    OpenScenarioParser.replace_parameter_references(xml_tree, parameter_dict)
+    return get_attributes(xml_tree), get_attributes(expected_tree)
+
+
+@pytest.mark.parametrize("filename", SCENARIO_FILES, ids=os.path.basename)
+def test_scenario_files(filename):
+    xml_tree = ET.parse(filename)
+    actual, expected = compare(xml_tree, get_declared_parameters(xml_tree))
+    assert actual == expected
+
+
+def test_chained_references():
+    xml_tree = ET.ElementTree(ET.fromstring(
+        '<Root><Node a="$far_distance" b="$distance" c="$speed_max / $speed" d="$speed$speed"/></Root>'))
+    parameter_dict = {"far_distance": "$distance", "distance": "$gap", "speed_max": "$speed", "speed": "10", "gap": "5"}
+    actual, expected = compare(xml_tree, parameter_dict)
+    assert actual == expected
+    assert dict(actual[1]) == {"a": "5", "b": "5", "c": "10 / 10", "d": "1010"}
+
+
+def test_synthetic():
+    actual, expected = compare(*create_synthetic_tree(300, 1000))
+    assert actual == expected
+
+
+def benchmark(num_parameters=3000, num_nodes=3000):
+    for name, fct in [("sequential", sequential_replace),
+                      ("single pass", OpenScenarioParser.replace_parameter_references)]:
+        xml_tree, parameter_dict = create_synthetic_tree(num_parameters, num_nodes)
+        start_time = time.time()
+        fct(xml_tree, parameter_dict)
+        print("{:12s} {} parameters, {} nodes: {:.1f} ms".format(
+            name, len(parameter_dict), num_nodes, 1e3 * (time.time() - start_time)))
+
+    for filename in SCENARIO_FILES:
+        xml_tree = ET.parse(filename)
+        parameter_dict = get_declared_parameters(xml_tree)
+        timings = []
+        for fct in [sequential_replace, OpenScenarioParser.replace_parameter_references]:
+            trees = [ET.ElementTree(ET.fromstring(ET.tostring(xml_tree.getroot()))) for _ in range(100)]
+            start_time = time.time()
+            for tree in trees:
+                fct(tree, parameter_dict)
+            timings.append(1e3 * (time.time() - start_time) / len(trees))
+        print("{:40s} sequential {:.3f} ms, single pass {:.3f} ms".format(os.path.basename(filename), *timings))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Expansion of parameter sweep ranges
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from srunner.tools.parameter_sweep import ParameterSweep  # pylint: disable=wrong-import-position
+
+
+@pytest.mark.parametrize("sweep, expected", [
+    ("Speed=5:15:2.5", ["5", "7.5", "10", "12.5", "15"]),
+    ("Speed=0:1:0.6", ["0", "0.6"]),
+    ("Speed=0:1:0.1", ["0", "0.1", "0.2", "0.3", "0.4", "0.5", "0.6", "0.7", "0.8", "0.9", "1"]),
+    ("Speed=3:3:1", ["3"]),
+    ("Speed=1.0;1.39;2.0", ["1.0", "1.39", "2.0"]),
+])
+def test_range_does_not_exceed_stop(sweep, expected):
+    assert ParameterSweep.parse(sweep).parameters == [("Speed", expected)]
+
+
+def test_empty_range():
+    with pytest.raises(ValueError):
+        ParameterSweep.parse("Speed=5:1:1")
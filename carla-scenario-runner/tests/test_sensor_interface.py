@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+The data returned by SensorInterface.get_data() must not be overwritten by the sensor callbacks
+before the next call of get_data(), also if the agent is slower than the sensors.
+
+Requires the CARLA PythonAPI, but no running simulator.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("carla")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from srunner.autoagents.sensor_interface import SensorInterface  # pylint: disable=wrong-import-position
+
+SLOTS = 4
+
+
+def create_interface(stale_policy):
+    interface = SensorInterface(timeout=0.1, stale_policy=stale_policy, buffer_slots=SLOTS)
+    interface.register_sensor('Center', object())
+    return interface
+
+
+def image(frame):
+    return np.full((8, 8, 4), frame % 256, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("stale_policy", SensorInterface.STALE_POLICIES)
+def test_returned_data_is_not_overwritten(stale_policy):
+    interface = create_interface(stale_policy)
+    frame = 0
+    for _ in range(SLOTS):
+        frame += 1
+        interface.update_sensor('Center', image(frame), frame)
+
+    for _ in range(20):
+        bundle = interface.get_data()
+        data_frame, data = bundle['Center']
+        # the sensors deliver more frames than the buffer holds while the agent works on the data
+        for _ in range(2 * SLOTS):
+            frame += 1
+            interface.update_sensor('Center', image(frame), frame)
+            assert np.all(data == data_frame % 256)
+
+
+def test_queue_delivers_frames_in_order():
+    interface = create_interface('queue')
+    for frame in range(1, SLOTS + 1):
+        interface.update_sensor('Center', image(frame), frame)
+    frames = [interface.get_data().frame for _ in range(SLOTS)]
+    assert frames == list(range(1, SLOTS + 1))
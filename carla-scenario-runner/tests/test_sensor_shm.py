@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Shared memory sensor transport, including segments left behind by crashed processes
+and segments of the same name used by another process
+"""
+
+import os
+import struct
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+shared_memory = pytest.importorskip("multiprocessing.shared_memory")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from srunner.autoagents.sensor_shm import (GLOBAL_HEADER,  # pylint: disable=wrong-import-position
+                                           MAGIC,
+                                           SharedMemorySensorReader,
+                                           SharedMemorySensorWriter,
+                                           get_segment_name)
+
+
+@pytest.fixture
+def segment_name():
+    return get_segment_name("srunner_test", "{}_Center".format(os.getpid()))
+
+
+def test_write_and_read(segment_name):
+    image = np.arange(4 * 6 * 4, dtype=np.uint8).reshape(4, 6, 4)
+    writer = SharedMemorySensorWriter(segment_name, image.nbytes, slots=2)
+    reader = SharedMemorySensorReader(segment_name)
+    try:
+        for frame in range(5):
+            assert writer.write(image + frame, frame, 0.1 * frame)
+        data = reader.read_latest()
+        assert data.frame == 4
+        assert np.array_equal(data.copy(), image + 4)
+        assert reader.read(3).frame == 3
+        assert reader.read(1) is None
+        assert not writer.write(np.zeros(image.nbytes + 1, dtype=np.uint8), 5)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def create_segment(name, header):
+    # left behind by another process: created, but never unlinked
+    segment = shared_memory.SharedMemory(name=name, create=True, size=128)
+    segment.buf[:len(header)] = header
+    segment.close()
+
+
+def get_terminated_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+@pytest.mark.parametrize("owner", [0, "terminated"])
+def test_stale_segment_is_replaced(segment_name, owner):
+    owner = get_terminated_pid() if owner == "terminated" else owner
+    create_segment(segment_name, GLOBAL_HEADER.pack(MAGIC, 4, 16, 3, owner))
+
+    data = np.ones(1000, dtype=np.float32)
+    writer = SharedMemorySensorWriter(segment_name, data.nbytes)
+    reader = SharedMemorySensorReader(segment_name)
+    try:
+        assert writer.write(data, 7)
+        assert reader.slot_size == data.nbytes
+        assert reader.writer_pid == os.getpid()
+        assert np.array_equal(reader.read(7).copy(), data)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_segment_of_a_running_writer_is_kept(segment_name):
+    data = np.ones(10, dtype=np.float32)
+    writer = SharedMemorySensorWriter(segment_name, data.nbytes)
+    try:
+        with pytest.raises(FileExistsError):
+            SharedMemorySensorWriter(segment_name, data.nbytes)
+        assert writer.write(data, 1)
+        reader = SharedMemorySensorReader(segment_name)
+        assert reader.read(1).frame == 1
+        reader.close()
+    finally:
+        writer.close()
+
+
+def test_foreign_segment_is_kept(segment_name):
+    create_segment(segment_name, struct.pack('<8s', b'OTHERAPP'))
+    try:
+        with pytest.raises(FileExistsError):
+            SharedMemorySensorWriter(segment_name, 16)
+    finally:
+        segment = shared_memory.SharedMemory(name=segment_name)
+        segment.close()
+        segment.unlink()
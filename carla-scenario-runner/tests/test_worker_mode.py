@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Intel Corporation
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Repeated executions of the same OpenSCENARIO file (worker mode, parameter sweeps)
+have to build the same test criteria every time.
+
+Requires the CARLA PythonAPI, but no running simulator: the client is replaced by a fake.
+"""
+
+import argparse
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("carla")
+pytest.importorskip("py_trees")
+pytest.importorskip("xmlschema")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scenario_runner import ScenarioRunner  # pylint: disable=wrong-import-position
+from srunner.scenarioconfigs.openscenario_configuration import OpenScenarioConfiguration  # pylint: disable=wrong-import-position
+from srunner.scenarios.open_scenario import OpenScenario  # pylint: disable=wrong-import-position
+
+SCENARIO_FILE = os.path.join(ROOT, "srunner", "examples", "LaneChangeSimple.xosc")
+CRITERIA_COUNT = 7
+
+
+class FakeSettings(object):
+    synchronous_mode = False
+
+
+class FakeActorList(list):
+
+    def filter(self, _):
+        return FakeActorList()
+
+
+class FakeMap(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_spawn_points(self):
+        return []
+
+
+class FakeWorld(object):
+
+    def __init__(self, town):
+        self._map = FakeMap(town)
+
+    def get_settings(self):
+        return FakeSettings()
+
+    def get_map(self):
+        return self._map
+
+    def get_actors(self):
+        return FakeActorList()
+
+    def get_blueprint_library(self):
+        return []
+
+
+class FakeClient(object):
+
+    """
+    Client of a simulator which already runs the town of the scenario
+    """
+
+    def __init__(self, town):
+        self._world = FakeWorld(town)
+
+    def get_world(self):
+        return self._world
+
+
+def count_criteria_conditions(storyboard):
+    return sum(1 for trigger in storyboard.iter("StopTrigger") for condition in trigger.iter("Condition")
+               if condition.attrib.get('name').startswith('criteria_'))
+
+
+def test_same_file_twice_has_the_same_criteria(monkeypatch):
+    monkeypatch.setattr(OpenScenarioConfiguration, "cache_dir", "")
+
+    runner = ScenarioRunner.__new__(ScenarioRunner)
+    runner._args = argparse.Namespace(openscenario=SCENARIO_FILE)  # pylint: disable=protected-access
+    runner.client = FakeClient("Town04")
+
+    criteria_counts = []
+    for _ in range(2):
+        config = runner._get_openscenario_configuration({})  # pylint: disable=protected-access
+        # as done by OpenScenario._create_test_criteria() while building the scenario
+        criteria = OpenScenario.get_criteria_conditions(config.storyboard)
+        criteria_counts.append(len(criteria))
+
+        assert all(not condition.attrib.get('name').startswith('criteria_') for condition in criteria)
+        assert count_criteria_conditions(config.storyboard) == CRITERIA_COUNT
+
+    assert criteria_counts == [CRITERIA_COUNT, CRITERIA_COUNT]
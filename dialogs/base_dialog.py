@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import pygame
+from text_cache import get_text_cache
 
 class BaseDialog(object):
     def __init__(self, width, height):
@@ -13,21 +14,9 @@ class BaseDialog(object):
         self._font_extrahuge = pygame.font.Font('fonts/intelone-display-light.ttf', 76)
     
     def blit_text(self, surface, text, pos, font, color=pygame.Color('white')):
-        words = [word.split(' ') for word in text.splitlines()]  # 2D array where each row is a list of words.
-        space = font.size(' ')[0]  # The width of a space.
         max_width, _ = surface.get_size()
-        x, y = pos
-        for line in words:
-            for word in line:
-                word_surface = font.render(word, True, color)
-                word_width, word_height = word_surface.get_size()
-                if x + word_width >= max_width:
-                    x = pos[0]  # Reset the x.
-                    y += word_height  # Start on new row.
-                surface.blit(word_surface, (x, y))
-                x += word_width + space
-            x = pos[0]  # Reset the x.
-            y += word_height  # Start on new row.
+        for word_surface, word_pos in get_text_cache().layout(font, text, pos, max_width, color):
+            surface.blit(word_surface, word_pos)
 
     def is_enabled(self):
         return self._render
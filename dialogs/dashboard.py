@@ -22,6 +22,9 @@ class Dashboard(BaseDialog):
         self._rss_proper_response = None
         self._speed_limit = 0
         self._throttle_input = 0
+        self._snapshot = None
+        self._rendered_snapshot = None
+        self._dynamic_surface = None
 
         self._dim = (800,130)
         self._bg_surface = pygame.Surface(self._dim)
@@ -49,32 +52,46 @@ class Dashboard(BaseDialog):
             restrict_lateral_active,
             speed_limit,
             throttle_input):
-        self._vehicle_control = player.get_control()
+        vehicle_control = player.get_control()
 
         v = player.get_velocity()
         speed = 3.6 * math.sqrt(v.x**2 + v.y**2 + v.z**2)
-        if speed > 0.1 and self._vehicle_control.reverse:
+        if speed > 0.1 and vehicle_control.reverse:
             speed = -speed
 
         if speed > speed_limit:
             speed = speed_limit
 
-        self._throttle_input = throttle_input
-        self._current_speed = '%2.0f' % (speed)
-
-        self._restricted_vehicle_control = restricted_vehicle_control
-        self._restrict_longitudinal_active = restrict_longitudinal_active
-        self._restrict_lateral_active = restrict_lateral_active
+        rss_proper_response = None
         if rss_sensor:
-            self._rss_proper_response = rss_sensor.proper_response
-        self.render_dynamic()
+            rss_proper_response = rss_sensor.proper_response
+        elif self._snapshot is not None:
+            rss_proper_response = self._snapshot[5]
+
+        # the snapshot is consumed by the render thread, it is replaced as a whole and never modified
+        self._snapshot = ('%2.0f' % (speed),
+            vehicle_control,
+            restricted_vehicle_control,
+            restrict_longitudinal_active,
+            restrict_lateral_active,
+            rss_proper_response,
+            throttle_input)
+
+    def render_dynamic(self, snapshot):
+        (self._current_speed,
+            self._vehicle_control,
+            self._restricted_vehicle_control,
+            self._restrict_longitudinal_active,
+            self._restrict_lateral_active,
+            self._rss_proper_response,
+            self._throttle_input) = snapshot
 
-    def render_dynamic(self):
         self._dynamic_surface = pygame.Surface(self._dim)
         self._dynamic_surface.set_colorkey(pygame.Color('black'))
 
         #speed
-        self.blit_text(self._dynamic_surface, self._current_speed, (60,30), self._font_extrahuge)
+        # the speed changes all the time, so it is not put into the shared text cache
+        self._dynamic_surface.blit(self._font_extrahuge.render(self._current_speed, True, pygame.Color('white')), (60,30))
 
         if self._restricted_vehicle_control is not None:
             self.drawBar((215,10), " Throttle", (310, 13), self._throttle_input, 0.0, 1.0, self._restricted_vehicle_control.throttle, self._restrict_longitudinal_active)
@@ -155,7 +172,11 @@ class Dashboard(BaseDialog):
         self.blit_text(self._dynamic_surface, text, text_pos, self._font_normal, text_color)
 
     def render(self, display):
-        if self._render:
+        snapshot = self._snapshot
+        if self._render and snapshot is not None:
+            if snapshot is not self._rendered_snapshot:
+                self.render_dynamic(snapshot)
+                self._rendered_snapshot = snapshot
             display.blit(self._bg_surface, self._pos)
             display.blit(self._surface, self._pos)
             display.blit(self._dynamic_surface, self._pos)
@@ -1,7 +1,8 @@
 
 import math
-import collections
 import pygame
+import numpy as np
+from text_cache import render_text
 
 try:
     from carla import ad
@@ -9,38 +10,126 @@ except ImportError:
     print("Module 'carla' not found.")
     pass
 
+# ==============================================================================
+# -- RssInterventionHistory ----------------------------------------------------
+# ==============================================================================
+
+
+class RssInterventionHistory(object):
+    """
+    Fixed-size ring buffer of per-frame RSS interventions, indexed by frame number.
+
+    Frames without an update are filled with the value of the next update, as the control loop
+    might run slower than the simulation.
+    """
+
+    def __init__(self, size=4096):
+        self._size = size
+        self._frames = np.full(size, -1, dtype=np.int64)
+        self._values = np.zeros(size, dtype=bool)
+        self._last_frame = None
+
+    def __len__(self):
+        if self._last_frame is None:
+            return 0
+        return int(np.count_nonzero(self._frames >= 0))
+
+    def clear(self):
+        self._frames.fill(-1)
+        self._values.fill(False)
+        self._last_frame = None
+
+    def append(self, frame, intervention):
+        if self._last_frame is not None and frame < self._last_frame:
+            # frame counter was reset (e.g. new world), start a new timeline
+            self.clear()
+
+        if self._last_frame is None or frame == self._last_frame:
+            idx = frame % self._size
+            if self._frames[idx] == frame:
+                self._values[idx] |= intervention
+            else:
+                self._frames[idx] = frame
+                self._values[idx] = intervention
+        else:
+            # fill missing frames, at most one full turn of the ring
+            first = max(self._last_frame + 1, frame - self._size + 1)
+            frames = np.arange(first, frame + 1)
+            idx = frames % self._size
+            self._frames[idx] = frames
+            self._values[idx] = intervention
+        self._last_frame = frame
+
+    def last(self, count, end_frame):
+        """
+        Returns the interventions of the frames [end_frame - count, end_frame) as float array.
+        Unknown frames are reported as no intervention.
+        """
+        frames = np.arange(end_frame - count, end_frame)
+        idx = frames % self._size
+        return np.where(self._frames[idx] == frames, self._values[idx], False).astype(np.float32)
+
+    def timeline(self):
+        """
+        Returns (frames, interventions) of all stored frames, sorted by frame.
+        """
+        valid = self._frames >= 0
+        frames = self._frames[valid]
+        order = np.argsort(frames)
+        return frames[order], self._values[valid][order]
+
+    def export(self, file_name):
+        frames, values = self.timeline()
+        np.savetxt(file_name, np.column_stack((frames, values.astype(np.int64))),
+                   fmt='%d', delimiter=',', header='frame,intervention', comments='')
+
 # ==============================================================================
 # -- HUD -----------------------------------------------------------------------
 # ==============================================================================
 
 
 class HUD(object):
-    def __init__(self, width, height):
+
+    RSS_STATE_LINE_HEIGHT = 14
+    RSS_STATE_ICON_X = 200
+    # icon column: up to 4 icons of 14 px
+    RSS_STATE_SURFACE_WIDTH = RSS_STATE_ICON_X + 4 * 14
+
+    def __init__(self, width, height, max_rss_states=10):
+        """
+        Only the max_rss_states most relevant RSS states (dangerous first, then nearest) are listed,
+        and not more than fit onto the display.
+        """
         self.dim = (width, height)
+        self._max_rss_states = max_rss_states
         self._font_mono = pygame.font.Font('fonts/intelone-display-regular.ttf', 14)
         self._font_mono_big = pygame.font.Font('fonts/intelone-display-regular.ttf', 22)
         self.frame = 0
         self._show_info = False
         self._info_text = []
         self.velocity = 0
-        self.rss_intervention_history = []
+        self.rss_intervention_history = RssInterventionHistory()
+        self.rss_states = None
+        self._rss_state_signature = None
+        self._rss_state_surface = None
+        self._actor_registry = None
 
     def on_world_tick(self, world_snapshot):
         self.frame = world_snapshot.frame
 
-    def tick(self, world, player, rss_sensor, vehicles, clock):
+    def tick(self, world, player, rss_sensor, actor_registry, frame_stats=None):
+        # called from the control loop, render() only sees completely built values
         if not self._show_info:
             return
         self.rss_states = None
         if not rss_sensor:
             return
 
+        self._actor_registry = actor_registry
         self.rss_states = rss_sensor.individual_rss_states
-        self.vehicles = vehicles
-        rsshist = self.get_rss_intervention_history()
-        rss_interventions = [rsshist[x + self.frame - 220] for x in range(0, 220)]
+        rss_interventions = self.rss_intervention_history.last(220, self.frame)
 
-        self._info_text = [
+        info_text = [
             'Response Valid:   {}'.format("true" if rss_sensor.response_valid else "false"),
             '',
             'RSS Proper Response:',
@@ -81,31 +170,25 @@ class HUD(object):
             'maxSpeedOnAccel: % 3.2f' % (rss_sensor.current_vehicle_parameters.maxSpeedOnAcceleration)
             ]
 
-        self._info_text += [
+        info_text += [
             '',
             'RSS Interventions:',
             rss_interventions,
             '']
 
-    def get_rss_intervention_history(self):
-        history = collections.defaultdict(bool)
-        last_frame = None
-        for frame, intervention in self.rss_intervention_history:
-            if last_frame is None:
-                last_frame = frame
-            else:
-                #fill missing frames
-                if last_frame+1 < frame-1:
-                    for x in range(last_frame+1, frame):
-                        history[x] = intervention
-                last_frame = frame
-
-            if not frame in history:
-                history[frame] = intervention
-            else:
-                if intervention:
-                    history[frame] = True
-        return history
+        if frame_stats:
+            info_text.append('Frame Timing:')
+            for name, stats in frame_stats:
+                info_text.append('%-8s% 3.0ffps % 5.1fms' % (name + ':', stats["fps"], stats["busy_ms"]))
+                info_text.append('  max:  % 5.1fms late: %d' % (stats["max_frame_ms"], stats["late_frames"]))
+
+        self._info_text = info_text
+
+    def export_rss_intervention_history(self, file_name):
+        if len(self.rss_intervention_history) == 0:
+            return False
+        self.rss_intervention_history.export(file_name)
+        return True
 
     def enable_info(self):
         self._show_info = True
@@ -116,6 +199,118 @@ class HUD(object):
     def toggle_info(self):
         self._show_info = not self._show_info
 
+    def _get_rss_object_name(self, state):
+        object_name = "Obj"
+        if state.rss_state.objectId == 18446744073709551614:
+            object_name = "Border Left"
+        elif state.rss_state.objectId==18446744073709551615:
+            object_name = "Border Right"
+        else:
+            actor = self._actor_registry.find(state.rss_state.objectId)
+            if actor:
+                li = list(actor.type_id.split("."))
+                if li:
+                    li.pop(0)
+                li = [element.capitalize() for element in li]
+
+                object_name = " ".join(li).strip()[:18]
+        return object_name
+
+    @staticmethod
+    def _get_rss_state_signature(rss_states, object_names):
+        return tuple((object_name,
+                      int(state.margin),
+                      state.is_dangerous,
+                      state.actor_calculation_mode,
+                      state.rss_state.longitudinalState.isSafe,
+                      state.rss_state.longitudinalState.rssStateInformation.evaluator,
+                      state.rss_state.lateralStateLeft.isSafe,
+                      str(state.rss_state.lateralStateLeft.rssStateInformation.evaluator),
+                      state.rss_state.lateralStateRight.isSafe,
+                      str(state.rss_state.lateralStateRight.rssStateInformation.evaluator),
+                      state.rss_state.unstructuredSceneState.response) for state, object_name in zip(rss_states, object_names))
+
+    @staticmethod
+    def _get_relevant_rss_states(rss_states, max_states):
+        """
+        Returns the max_states most relevant states (dangerous first, then nearest) and the number of hidden ones
+        """
+        states = sorted(rss_states, key=lambda state: (not state.is_dangerous, state.distance))
+        if len(states) <= max_states:
+            return states, 0
+        return states[:max_states], len(states) - max_states
+
+    def _get_rss_state_surface(self, rss_states, max_states):
+        """
+        Returns the surface listing the RSS states. It is only rebuilt if a displayed value changed,
+        the states are usually the same for many frames.
+        """
+        rss_states, hidden_count = self._get_relevant_rss_states(rss_states, max_states)
+        object_names = [self._get_rss_object_name(state) for state in rss_states]
+        signature = (self._get_rss_state_signature(rss_states, object_names), hidden_count)
+        if signature == self._rss_state_signature:
+            return self._rss_state_surface
+        self._rss_state_signature = signature
+
+        lines = len(rss_states) + (1 if hidden_count else 0)
+        state_surface = pygame.Surface((self.RSS_STATE_SURFACE_WIDTH, 26 + self.RSS_STATE_LINE_HEIGHT * lines))
+        state_surface.set_colorkey(pygame.Color('black'))
+        surface = render_text(self._font_mono, 'RSS States:', (255, 255, 255))
+        state_surface.blit(surface, (16, 0))
+        v_offset = 26
+        for state, object_name in zip(rss_states, object_names):
+            item = '% 5dm %8s' % (state.margin, object_name)
+            # print("X {}".format(state.rss_state))
+            # print("XXX {}".format(state.rss_state.longitudinalState.rssStateInformation.evaluator))
+
+            surface = self._font_mono.render(item, True, (255, 255, 255))
+            state_surface.blit(surface, (15, v_offset))
+            color = (0, 255, 0)
+            if state.is_dangerous:
+                color = (255,0,0)
+            pygame.draw.circle(state_surface, color, (20, v_offset+7), 5)
+            # print(type(state.rss_state.longitudinalState.rssStateInformation.evaluator))
+            xpos = self.RSS_STATE_ICON_X
+            if state.actor_calculation_mode == ad.rss.map.RssMode.Structured:
+                if not state.rss_state.longitudinalState.isSafe and ((state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceSameDirectionOtherInFront) or (state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceSameDirectionEgoFront)):
+                    pygame.draw.polygon(state_surface, (255, 255, 255), ((xpos+1, v_offset+1+4), (xpos+6, v_offset+1+0), (xpos+11, v_offset+1+4), (xpos+7, v_offset+1+4), (xpos+7, v_offset+1+12), (xpos+5, v_offset+1+12), (xpos+5, v_offset+1+4)))
+                    xpos += 14
+
+                if not state.rss_state.longitudinalState.isSafe and ((state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceOppositeDirectionEgoCorrectLane) or (state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceOppositeDirection)):
+                    pygame.draw.polygon(state_surface, (255, 255, 255), ((xpos+2, v_offset+1+8), (xpos+6, v_offset+1+12), (xpos+10, v_offset+1+8), (xpos+7, v_offset+1+8), (xpos+7, v_offset+1+0), (xpos+5, v_offset+1+0), (xpos+5, v_offset+1+8)))
+                    xpos += 14
+
+                if not state.rss_state.lateralStateRight.isSafe and not (str(state.rss_state.lateralStateRight.rssStateInformation.evaluator) == "None"):
+                    pygame.draw.polygon(state_surface, (255, 255, 255), ((xpos+0, v_offset+1+4), (xpos+8, v_offset+1+4), (xpos+8, v_offset+1+1), (xpos+12, v_offset+1+6), (xpos+8, v_offset+1+10), (xpos+8, v_offset+1+8), (xpos+0, v_offset+1+8)))
+                    xpos += 14
+                if not state.rss_state.lateralStateLeft.isSafe and not (str(state.rss_state.lateralStateLeft.rssStateInformation.evaluator) == "None"):
+                    pygame.draw.polygon(state_surface, (255, 255, 255), ((xpos+0, v_offset+1+6), (xpos+4, v_offset+1+1), (xpos+4, v_offset+1+4), (xpos+12, v_offset+1+4), (xpos+12, v_offset+1+8), (xpos+4, v_offset+1+8), (xpos+4, v_offset+1+10)))
+                    xpos += 14
+                #arrow up
+
+                #pygame.draw.polygon(state_surface, (255, 255, 255), ((1, 4), (6, 0), (11, 4), (7, 4), (7, 12), (5, 12), (5, 4)))
+                #arrow down
+                #pygame.draw.polygon(state_surface, (255, 255, 255), ((1, 8), (6, 12), (11, 8), (7, 8), (7, 0), (5, 0), (5, 8)))
+            elif state.actor_calculation_mode == ad.rss.map.RssMode.Unstructured:
+                text = ""
+                if state.rss_state.unstructuredSceneState.response == ad.rss.state.UnstructuredSceneResponse.DriveAway:
+                    text = "  D"
+                elif state.rss_state.unstructuredSceneState.response == ad.rss.state.UnstructuredSceneResponse.ContinueForward:
+                    text = "  C"
+                elif state.rss_state.unstructuredSceneState.response == ad.rss.state.UnstructuredSceneResponse.Brake:
+                    text = "  B"
+                surface = render_text(self._font_mono, text, (255, 255, 255))
+                state_surface.blit(surface, (xpos, v_offset))
+
+            v_offset += self.RSS_STATE_LINE_HEIGHT
+
+        if hidden_count:
+            surface = self._font_mono.render('+{} more'.format(hidden_count), True, (255, 255, 255))
+            state_surface.blit(surface, (15, v_offset))
+
+        self._rss_state_surface = state_surface
+        return state_surface
+
     def render(self, display):
 
         if self._show_info:
@@ -131,10 +326,10 @@ class HUD(object):
                 text_color = (255, 255, 255)
                 if v_offset + 18 > self.dim[1]:
                     break
-                if isinstance(item, list):
+                if isinstance(item, np.ndarray):
                     if len(item) > 1:
-                        points = [(x + 8, v_offset + 8 + (1.0 - y) * 30) for x, y in enumerate(item)]
-                        pygame.draw.lines(display, (255, 136, 0), False, points, 2)
+                        points = np.column_stack((np.arange(len(item)) + 8, v_offset + 8 + (1.0 - item) * 30))
+                        pygame.draw.lines(display, (255, 136, 0), False, points.tolist(), 2)
                     item = None
                     v_offset += 18
                 elif isinstance(item, tuple):
@@ -164,6 +359,7 @@ class HUD(object):
                 #workaround, as sometimes item seems to get discarded (render reports 'empty string')
                 if isinstance(item, str) and len(item) > 0:  # At this point has to be a str and not empty
                     try:
+                        # info lines change every frame, caching them would only evict the static labels
                         surface = self._font_mono.render(item, True, text_color)
                         display.blit(surface, (16, v_offset))
                     except pygame.error as message:
@@ -174,66 +370,8 @@ class HUD(object):
             v_offset += 10
             #rss states
             if self.rss_states:
-                surface = self._font_mono.render('RSS States:', True, (255, 255, 255))
-                display.blit(surface, (16, v_offset))
-                v_offset += 26
-                for state in self.rss_states:
-                    object_name = "Obj"
-                    if state.rss_state.objectId == 18446744073709551614:
-                        object_name = "Border Left"
-                    elif state.rss_state.objectId==18446744073709551615:
-                        object_name = "Border Right"
-                    else:
-                        actor = self.vehicles.find(state.rss_state.objectId)
-                        if actor:
-                            li = list(actor.type_id.split("."))
-                            if li:
-                                li.pop(0)
-                            li = [element.capitalize() for element in li]
-
-                            object_name = " ".join(li).strip()[:18]
-
-                    item = '% 5dm %8s' % (state.margin, object_name)
-                    # print("X {}".format(state.rss_state))
-                    # print("XXX {}".format(state.rss_state.longitudinalState.rssStateInformation.evaluator))
-
-                    surface = self._font_mono.render(item, True, text_color)
-                    display.blit(surface, (15, v_offset))
-                    color = (0, 255, 0)
-                    if state.is_dangerous:
-                        color = (255,0,0)
-                    pygame.draw.circle(display, color, (20, v_offset+7), 5)
-                    # print(type(state.rss_state.longitudinalState.rssStateInformation.evaluator))
-                    xpos = 200
-                    if state.actor_calculation_mode == ad.rss.map.RssMode.Structured:
-                        if not state.rss_state.longitudinalState.isSafe and ((state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceSameDirectionOtherInFront) or (state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceSameDirectionEgoFront)):
-                            pygame.draw.polygon(display, (255, 255, 255), ((xpos+1, v_offset+1+4), (xpos+6, v_offset+1+0), (xpos+11, v_offset+1+4), (xpos+7, v_offset+1+4), (xpos+7, v_offset+1+12), (xpos+5, v_offset+1+12), (xpos+5, v_offset+1+4)))
-                            xpos += 14
-
-                        if not state.rss_state.longitudinalState.isSafe and ((state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceOppositeDirectionEgoCorrectLane) or (state.rss_state.longitudinalState.rssStateInformation.evaluator == ad.rss.state.RssStateEvaluator.LongitudinalDistanceOppositeDirection)):
-                            pygame.draw.polygon(display, (255, 255, 255), ((xpos+2, v_offset+1+8), (xpos+6, v_offset+1+12), (xpos+10, v_offset+1+8), (xpos+7, v_offset+1+8), (xpos+7, v_offset+1+0), (xpos+5, v_offset+1+0), (xpos+5, v_offset+1+8)))
-                            xpos += 14
-
-                        if not state.rss_state.lateralStateRight.isSafe and not (str(state.rss_state.lateralStateRight.rssStateInformation.evaluator) == "None"):
-                            pygame.draw.polygon(display, (255, 255, 255), ((xpos+0, v_offset+1+4), (xpos+8, v_offset+1+4), (xpos+8, v_offset+1+1), (xpos+12, v_offset+1+6), (xpos+8, v_offset+1+10), (xpos+8, v_offset+1+8), (xpos+0, v_offset+1+8)))
-                            xpos += 14
-                        if not state.rss_state.lateralStateLeft.isSafe and not (str(state.rss_state.lateralStateLeft.rssStateInformation.evaluator) == "None"):
-                            pygame.draw.polygon(display, (255, 255, 255), ((xpos+0, v_offset+1+6), (xpos+4, v_offset+1+1), (xpos+4, v_offset+1+4), (xpos+12, v_offset+1+4), (xpos+12, v_offset+1+8), (xpos+4, v_offset+1+8), (xpos+4, v_offset+1+10)))
-                            xpos += 14
-                        #arrow up
-
-                        #pygame.draw.polygon(display, (255, 255, 255), ((1, 4), (6, 0), (11, 4), (7, 4), (7, 12), (5, 12), (5, 4)))
-                        #arrow down
-                        #pygame.draw.polygon(display, (255, 255, 255), ((1, 8), (6, 12), (11, 8), (7, 8), (7, 0), (5, 0), (5, 8)))
-                    elif state.actor_calculation_mode == ad.rss.map.RssMode.Unstructured:
-                        text = ""
-                        if state.rss_state.unstructuredSceneState.response == ad.rss.state.UnstructuredSceneResponse.DriveAway:
-                            text = "  D"
-                        elif state.rss_state.unstructuredSceneState.response == ad.rss.state.UnstructuredSceneResponse.ContinueForward:
-                            text = "  C"
-                        elif state.rss_state.unstructuredSceneState.response == ad.rss.state.UnstructuredSceneResponse.Brake:
-                            text = "  B"
-                        surface = self._font_mono.render(text, True, text_color)
-                        display.blit(surface, (xpos, v_offset))
-
-                    v_offset += 14
+                # title, states and the '+N more' line have to fit onto the display
+                max_states = min(self._max_rss_states,
+                                 (self.dim[1] - v_offset - 26) // self.RSS_STATE_LINE_HEIGHT - 1)
+                if max_states > 0:
+                    display.blit(self._get_rss_state_surface(self.rss_states, max_states), (0, v_offset))
@@ -2,6 +2,7 @@
 
 import pygame
 from base_dialog import BaseDialog
+from text_cache import render_text
 
 class Notification(BaseDialog):
     def __init__(self, width, height):
@@ -16,7 +17,7 @@ class Notification(BaseDialog):
     def set_notification(self, text, color=(255, 255, 255), seconds=2.0):
         if self._static_warning_active:
             return
-        text_texture = self._font_bigger.render(text, True, color)
+        text_texture = render_text(self._font_bigger, text, color)
 
         self._bg_surface = pygame.Surface((text_texture.get_width() + 40, text_texture.get_height() + 20))
         self._bg_surface.set_alpha(150)
@@ -31,7 +32,7 @@ class Notification(BaseDialog):
 
     def set_static_warning(self, text, color=(255, 255, 255)):
         self._static_warning_active = True
-        text_texture = self._font_bigger.render(text, True, color)
+        text_texture = render_text(self._font_bigger, text, color)
 
         self._bg_surface = pygame.Surface((text_texture.get_width() + 140, text_texture.get_height() + 20))
         self._bg_surface.set_alpha(150)
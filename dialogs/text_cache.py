@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+# shared cache of rendered text surfaces
+#
+
+from collections import OrderedDict
+import pygame
+
+
+class TextCache(object):
+    """
+    Size bounded LRU cache of rendered text surfaces and word-wrap layouts.
+
+    Cached surfaces are shared between all users, so they must only be blitted and never be modified.
+    """
+
+    def __init__(self, max_surfaces=512, max_layouts=64):
+        self._max_surfaces = max_surfaces
+        self._max_layouts = max_layouts
+        self._surfaces = OrderedDict()
+        self._layouts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _color_key(color):
+        color = tuple(color)
+        if len(color) == 3:
+            color += (255,)
+        return color
+
+    def render(self, font, text, color=(255, 255, 255), antialias=True):
+        key = (font, text, self._color_key(color), antialias)
+        surface = self._surfaces.pop(key, None)
+        if surface is not None:
+            self._surfaces[key] = surface
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self._max_surfaces:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def layout(self, font, text, pos, max_width, color=(255, 255, 255)):
+        """
+        Word-wrap text starting at pos within max_width.
+
+        Returns a list of (surface, (x, y)) tuples. The layout is calculated once per distinct input.
+        """
+        key = (font, text, tuple(pos), max_width, self._color_key(color))
+        layout = self._layouts.pop(key, None)
+        if layout is not None:
+            self._layouts[key] = layout
+            return layout
+
+        layout = []
+        words = [word.split(' ') for word in text.splitlines()]  # 2D array where each row is a list of words.
+        space = font.size(' ')[0]  # The width of a space.
+        x, y = pos
+        word_height = 0
+        for line in words:
+            for word in line:
+                word_surface = self.render(font, word, color)
+                word_width, word_height = word_surface.get_size()
+                if x + word_width >= max_width:
+                    x = pos[0]  # Reset the x.
+                    y += word_height  # Start on new row.
+                layout.append((word_surface, (x, y)))
+                x += word_width + space
+            x = pos[0]  # Reset the x.
+            y += word_height  # Start on new row.
+
+        self._layouts[key] = layout
+        if len(self._layouts) > self._max_layouts:
+            self._layouts.popitem(last=False)
+        return layout
+
+    def clear(self):
+        self._surfaces.clear()
+        self._layouts.clear()
+
+
+_text_cache = TextCache()
+
+
+def get_text_cache():
+    return _text_cache
+
+
+def render_text(font, text, color=(255, 255, 255), antialias=True):
+    return _text_cache.render(font, text, color, antialias)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2020 Intel Corporation
+#
+"""
+Client side cache of the actors of a carla world
+"""
+import fnmatch
+import time
+from threading import Lock
+
+
+class ActorRegistry(object):
+
+    """
+    Caches the actors of the world with an id->actor and a type_id->ids index.
+
+    Spawned and destroyed actors are detected from the world snapshots (on_world_tick, no RPC).
+    The cache is then updated by refresh(), fetching only the new actors in a single request,
+    at most every min_refresh_interval seconds. Without snapshots, the cache is fully refreshed
+    every max_refresh_interval seconds.
+
+    get_actor() has the same signature as carla.World.get_actor(), so the registry can be
+    used in place of the world for actor lookups.
+    """
+
+    def __init__(self, world, min_refresh_interval=0.1, max_refresh_interval=2.0):
+        self._world = world
+        self._min_refresh_interval = min_refresh_interval
+        self._max_refresh_interval = max_refresh_interval
+        self._lock = Lock()
+        self._actors = dict()
+        self._type_index = dict()
+        self._bounding_boxes = dict()
+        self._snapshot_ids = None
+        self._dirty = True
+        self._last_refresh = 0
+
+    def on_world_tick(self, world_snapshot):
+        snapshot_ids = frozenset(actor_snapshot.id for actor_snapshot in world_snapshot)
+        if snapshot_ids != self._snapshot_ids:
+            self._snapshot_ids = snapshot_ids
+            self._dirty = True
+
+    def refresh(self, force=False):
+        now = time.time()
+        elapsed = now - self._last_refresh
+        if not force and not (self._dirty and elapsed >= self._min_refresh_interval) and \
+                elapsed < self._max_refresh_interval:
+            return
+        self._last_refresh = now
+        self._dirty = False
+
+        snapshot_ids = self._snapshot_ids
+        if snapshot_ids is None or force:
+            actors = dict((actor.id, actor) for actor in self._world.get_actors())
+        else:
+            actors = dict((actor_id, actor) for actor_id, actor in self._actors.items() if actor_id in snapshot_ids)
+            new_ids = [actor_id for actor_id in snapshot_ids if actor_id not in actors]
+            if new_ids:
+                for actor in self._world.get_actors(new_ids):
+                    actors[actor.id] = actor
+
+        type_index = dict()
+        for actor_id, actor in actors.items():
+            type_index.setdefault(actor.type_id, set()).add(actor_id)
+
+        with self._lock:
+            self._actors = actors
+            self._type_index = type_index
+            for actor_id in list(self._bounding_boxes):
+                if actor_id not in actors:
+                    del self._bounding_boxes[actor_id]
+
+    def get_actor(self, actor_id):
+        actor = self._actors.get(actor_id)
+        if actor is None:
+            actor = self._world.get_actor(actor_id)
+            if actor is not None:
+                with self._lock:
+                    self._actors[actor_id] = actor
+                    self._type_index.setdefault(actor.type_id, set()).add(actor_id)
+        return actor
+
+    def find(self, actor_id):
+        """
+        Like carla.ActorList.find(), only looks into the cache.
+        """
+        return self._actors.get(actor_id)
+
+    def get_actors(self, actor_ids):
+        """
+        Returns the actors with the given ids. Actors not in the cache are fetched with a single request.
+        """
+        actors = self._actors
+        missing = [actor_id for actor_id in actor_ids if actor_id not in actors]
+        if missing:
+            fetched = self._world.get_actors(missing)
+            with self._lock:
+                for actor in fetched:
+                    self._actors[actor.id] = actor
+                    self._type_index.setdefault(actor.type_id, set()).add(actor.id)
+            actors = self._actors
+        return [actors[actor_id] for actor_id in actor_ids if actor_id in actors]
+
+    def get_ids_by_type(self, wildcard_pattern):
+        """
+        Returns the ids of all cached actors with a type_id matching the pattern (e.g. 'vehicle.*').
+        """
+        ids = set()
+        for type_id, type_ids in list(self._type_index.items()):
+            if fnmatch.fnmatch(type_id, wildcard_pattern):
+                ids |= type_ids
+        return ids
+
+    def filter(self, wildcard_pattern):
+        actors = self._actors
+        return [actors[actor_id] for actor_id in self.get_ids_by_type(wildcard_pattern) if actor_id in actors]
+
+    def get_bounding_box(self, actor):
+        """
+        Returns the bounding box of the actor, cached per actor id.
+        """
+        bounding_box = self._bounding_boxes.get(actor.id)
+        if bounding_box is None:
+            bounding_box = actor.bounding_box
+            self._bounding_boxes[actor.id] = bounding_box
+        return bounding_box
+
+    def clear(self):
+        with self._lock:
+            self._actors = dict()
+            self._type_index = dict()
+            self._bounding_boxes = dict()
+        self._dirty = True
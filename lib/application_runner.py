@@ -4,15 +4,22 @@
 #
 """
 Execute monitor an application.
-The status is published via ros topic
+
+The output of all applications is handled by a single event loop thread (ApplicationEventLoop),
+which reads the output in non-blocking chunks as soon as it is available and matches the ready
+string incrementally. Status changes are reported via callbacks from the event loop thread.
+Errors of the callbacks are logged and do not affect the other applications. If the event loop
+itself fails, all its applications are killed and reported as exited with ApplicationStatus.ERROR.
 """
-import sys
+import errno
 import os
+import selectors
+import signal
 import time
 import pexpect
-from threading import Timer, Thread, Event, Lock
+from collections import deque
+from threading import Thread, Event, Lock
 from enum import Enum
-from datetime import datetime, timedelta
 
 class ApplicationStatus(Enum):
     STOPPED = 0
@@ -21,70 +28,282 @@ class ApplicationStatus(Enum):
     SHUTTINGDOWN = 3
     ERROR = 4
 
+
+class OutputMatcher(object):
+
+    """
+    Finds a string in a stream of output chunks, also if it is split across chunks.
+    """
+
+    def __init__(self, pattern, fct, once=False):
+        self._pattern = pattern.encode() if not isinstance(pattern, bytes) else pattern
+        self._fct = fct
+        self._once = once
+        self.reset()
+
+    def reset(self):
+        self._tail = b""
+        self.matched = False
+
+    def feed(self, chunk):
+        if self._once and self.matched:
+            return
+        if not self._pattern:
+            # an empty pattern matches any output
+            self.matched = True
+            self._fct()
+            return
+        data = self._tail + chunk
+        # the tail is shorter than the pattern, so every match ends within the new chunk
+        position = data.find(self._pattern)
+        while position != -1:
+            self.matched = True
+            self._fct()
+            if self._once:
+                return
+            position = data.find(self._pattern, position + len(self._pattern))
+        self._tail = data[-(len(self._pattern) - 1):] if len(self._pattern) > 1 else b""
+
+
+class ApplicationEventLoop(object):
+
+    """
+    Handles the output, readiness and shutdown of any number of child processes in one thread.
+    """
+
+    SHUTDOWN_TIMEOUT = 8.0
+    READ_SIZE = 4096
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = Lock()
+        self._pending = []
+        self._thread = None
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+
+    def _wakeup(self):
+        os.write(self._wakeup_write, b"x")
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def add(self, runner):
+        with self._lock:
+            self._pending.append(runner)
+            self._ensure_running()
+        self._wakeup()
+
+    def request_shutdown(self, runner):
+        runner._shutdown_deadline = None
+        runner._shutdown_requested_event.set()
+        self._wakeup()
+
+    def _run(self):
+        runners = []
+        try:
+            self._loop(runners)
+        except Exception as e:  # pylint: disable=broad-except
+            self._fail(runners, e)
+
+    def _fail(self, runners, error):
+        """
+        The loop can not continue: give up all applications, so nobody waits for them forever.
+        The next add() starts a new loop thread.
+        """
+        with self._lock:
+            runners = runners + self._pending
+            self._pending = []
+            self._thread = None
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                self._selector.unregister(key.fd)
+        for runner in runners:
+            runner._handle_failure("Application event loop failed: {}".format(error), close=True)
+
+    @staticmethod
+    def _call(runner, fct, *args):
+        try:
+            fct(*args)
+        except Exception as e:  # pylint: disable=broad-except
+            # a failing callback must not stop the handling of the other applications
+            runner._log_fct("Error while handling application output: {}".format(e))
+
+    def _loop(self, runners):
+        while True:
+            with self._lock:
+                for runner in self._pending:
+                    # the process is kept, the runner might already execute a new one when this one is closed
+                    self._selector.register(runner._process.child_fd, selectors.EVENT_READ, (runner, runner._process))
+                    runners.append(runner)
+                self._pending = []
+
+            # apply shutdown requests and escalate them if the application does not exit
+            now = time.time()
+            timeout = None
+            for runner in runners:
+                if not runner._shutdown_requested_event.is_set():
+                    continue
+                if runner._shutdown_deadline is None:
+                    runner._shutdown_deadline = now + self.SHUTDOWN_TIMEOUT
+                    runner._log_fct("Shutdown requested while process is still running. Sending SIGHUP/SIGINT...")
+                    self._signal(runner, signal.SIGHUP)
+                    self._signal(runner, signal.SIGINT)
+                elif now > runner._shutdown_deadline and not runner._killed:
+                    runner._log_fct("Waited {}s for application to exit. Forcing Shutdown. Sending SIGKILL".format(
+                        self.SHUTDOWN_TIMEOUT))
+                    self._signal(runner, signal.SIGKILL)
+                    runner._killed = True
+                if not runner._killed:
+                    remaining = max(runner._shutdown_deadline - now, 0.)
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    os.read(self._wakeup_read, self.READ_SIZE)
+                    continue
+                runner, process = key.data
+                try:
+                    chunk = os.read(key.fd, self.READ_SIZE)
+                except OSError as e:
+                    # a pty signals EOF with EIO, any other error ends the handling of this application as well
+                    if e.errno not in (errno.EIO, errno.EBADF):
+                        runner._log_fct("Error while reading application output: {}".format(e))
+                    chunk = b""
+                if chunk:
+                    self._call(runner, runner._handle_output, chunk)
+                else:
+                    self._selector.unregister(key.fd)
+                    runners.remove(runner)
+                    self._call(runner, runner._handle_exit, process)
+
+    @staticmethod
+    def _signal(runner, signum):
+        try:
+            runner._process.kill(signum)
+        except (OSError, AttributeError):
+            # already exited or given up (see ApplicationRunner._handle_failure)
+            pass
+
+
+_default_event_loop = None
+_default_event_loop_lock = Lock()
+
+
+def get_default_event_loop():
+    global _default_event_loop
+    with _default_event_loop_lock:
+        if _default_event_loop is None:
+            _default_event_loop = ApplicationEventLoop()
+        return _default_event_loop
+
+
 class ApplicationRunner(object):
 
     """
     Execute application
+
+    The output lines are kept in a bounded log ring buffer (see get_log()) instead of being printed.
     """
-    def __init__(self, status_updated_fct, log_fct, ready_string=""):
+
+    SHUTDOWN_GRACE_TIME = 4.0
+
+    def __init__(self, status_updated_fct, log_fct, ready_string="", log_size=1000, event_loop=None):
         """
         Constructor
         """
-        self._app_thread = None
         self._status_updated_fct = status_updated_fct
         self._log_fct = log_fct
         self._shutdown_requested_event = Event()
+        self._exited_event = Event()
+        self._exited_event.set()
         self._ready_string = ready_string
+        self._event_loop = event_loop
+        self._process = None
+        self._process_lock = Lock()
+        self._matchers = []
+        self._ready_matcher = None
+        self._log = deque(maxlen=log_size)
+        self._partial_line = b""
+        self._shutdown_deadline = None
+        self._killed = False
+
+    def add_output_matcher(self, pattern, fct):
+        """
+        Calls fct() (from the event loop thread) every time pattern appears in the output
+        """
+        self._matchers.append(OutputMatcher(pattern, fct))
+
+    def get_log(self, count=None):
+        """
+        Returns the last count output lines (all buffered lines if count is None)
+        """
+        lines = list(self._log)
+        return lines if count is None else lines[-count:]
 
     def execute(self, cmdline, env=None, cwd=None):
         """
-        Starts a thread to execute the application
+        Starts the application. Its output is handled by the event loop.
         """
         if self.is_running():
             self._log_fct("Application already running!")
             return False
 
         self._shutdown_requested_event.clear()
-        self._app_thread = Thread(target=self.start_and_run, args=(cmdline,
-            env,
-            cwd,
-            self._shutdown_requested_event,
-            self._ready_string,
-            self._status_updated_fct,
-            self._log_fct,))
-        self._app_thread.start()
-
-        return True
-
-    def start_and_run(self, cmdline, env, cwd, shutdown_requested_event, ready_string, status_updated_fct, log_fct):
-        status_updated_fct(ApplicationStatus.STARTING)
+        self._shutdown_deadline = None
+        self._killed = False
+        self._partial_line = b""
+        for matcher in self._matchers:
+            matcher.reset()
+        self._status_updated_fct(ApplicationStatus.STARTING)
         try:
-            print(cmdline)
-            process = self.start_process(cmdline, log_fct, env=env, cwd=cwd)
-            self.run(process, shutdown_requested_event, ready_string, status_updated_fct, log_fct)
+            process = self.start_process(cmdline, self._log_fct, env=env, cwd=cwd)
         except (KeyError, pexpect.ExceptionPexpect) as e:
             self._log_fct("Error while starting process: {}".format(e))
-            status_updated_fct(ApplicationStatus.ERROR)
+            self._status_updated_fct(ApplicationStatus.ERROR)
+            return False
 
+        self._ready_matcher = OutputMatcher(self._ready_string, self._on_ready, once=True)
+        with self._process_lock:
+            self._process = process
+        self._exited_event.clear()
+        if self._event_loop is None:
+            self._event_loop = get_default_event_loop()
+        self._event_loop.add(self)
+        return True
 
+    def send_line(self, line):
+        """
+        Sends a line to stdin of the running application
+        """
+        with self._process_lock:
+            if self._process is None or not self._process.isalive():
+                return False
+            self._process.sendline(line)
+        return True
 
     def is_running(self):
-        if self._app_thread is None:
-            return False
+        return not self._exited_event.is_set()
 
-        return self._app_thread.is_alive()
+    def wait_for_exit(self, timeout=None):
+        return self._exited_event.wait(timeout)
 
     def shutdown(self):
         """
-        Shut down the application thread
+        Shut down the application and wait until it exited.
+        Must not be called from a status or matcher callback.
         """
         if not self.is_running():
             return
         self._log_fct("Requesting shutdown...")
         self._status_updated_fct(ApplicationStatus.SHUTTINGDOWN)
-        self._shutdown_requested_event.set()
-        if self._app_thread:
-            self._app_thread.join()
+        self._event_loop.request_shutdown(self)
+        # the event loop kills the application after SHUTDOWN_TIMEOUT, only wait for a stuck event loop a bit longer
+        if not self._exited_event.wait(self._event_loop.SHUTDOWN_TIMEOUT + self.SHUTDOWN_GRACE_TIME):
+            self._handle_failure("Application did not exit in time.")
         self._log_fct("Shutdown finished.")
 
     def start_process(self, argument_list, log_fct, env=None, cwd=None):
@@ -99,46 +318,71 @@ class ApplicationRunner(object):
 
         log_fct("Executing: {}".format(" ".join(argument_list)))
         process = pexpect.spawn(" ".join(argument_list), env=env, cwd=cwd)
-        #process.logfile_read = sys.stdout
         return process
 
-    def run(self, process, shutdown_requested_event, ready_string, status_updated_fct, log_fct):
+    def _on_ready(self):
+        self._status_updated_fct(ApplicationStatus.RUNNING)
+        self._log_fct("Application is ready.")
+
+    def _handle_output(self, chunk):
+        """
+        Called by the event loop with each output chunk
         """
-        Threaded application execution
+        self._ready_matcher.feed(chunk)
+        for matcher in self._matchers:
+            matcher.feed(chunk)
+        lines = (self._partial_line + chunk).split(b"\n")
+        self._partial_line = lines.pop()
+        for line in lines:
+            self._log.append(line.rstrip(b"\r").decode(errors="replace"))
 
-        :return:
+    def _handle_exit(self, process):
         """
-        shutting_down_trigger_time = None
-        signaled_running = False
-        while True:
-            if shutdown_requested_event.is_set():
-                if shutting_down_trigger_time is None:
-                    shutting_down_trigger_time = datetime.now()
-                    log_fct("Shutdown requested while process is still running. Sending SIGHUP/SIGINT...")
-                    process.terminate(force=False)
+        Called by the event loop once the output of the application process is closed
+        """
+        with self._process_lock:
+            given_up = self._process is not process
+            if not given_up:
+                self._process = None
+        if given_up:
+            # already reported as exited (see _handle_failure), only close it
+            process.close()
+            return
+
+        if self._partial_line:
+            self._log.append(self._partial_line.rstrip(b"\r").decode(errors="replace"))
+            self._partial_line = b""
+        self._log_fct("Application exited.")
+        try:
+            process.close()
+            if process.exitstatus == 0:
+                status = ApplicationStatus.STOPPED
+            else:
+                status = ApplicationStatus.ERROR
+            self._status_updated_fct(status)
+        finally:
+            self._exited_event.set()
+
+    def _handle_failure(self, message, close=False):
+        """
+        Kill the application and report it as exited, if the event loop can not handle its exit.
+        The process is only closed if close is set, otherwise its output is still registered at the event loop,
+        which closes it at EOF.
+        """
+        if self._exited_event.is_set():
+            return
+        with self._process_lock:
+            process = self._process
+            self._process = None
+        try:
+            self._log_fct("{} Killing application.".format(message))
+            if process is not None:
+                if close:
+                    process.close(force=True)
                 else:
-                    if (datetime.now() - shutting_down_trigger_time) > timedelta(seconds=8):
-                        log_fct("Waited 8s for application to exit. Forcing Shutdown. Sending SIGKILL")
-                        process.terminate(force=True)
-            try:
-                process.expect( ".*\n", timeout=0.1)
-                log_fct(process.after.strip())
-                if not signaled_running:
-                    if process.after.decode().find(ready_string) != -1:
-                        status_updated_fct(ApplicationStatus.RUNNING)
-                        log_fct("Application is ready.")
-                        signaled_running = True
-            except pexpect.EOF:
-                # application exited
-                log_fct(process.before.strip())
-                log_fct("Application exited. Exiting run loop")
-                break
-            except pexpect.TIMEOUT:
-                # no output received
-                pass
-
-        process.close()
-        if process.exitstatus == 0:
-            status_updated_fct(ApplicationStatus.STOPPED)
-        else:
-            status_updated_fct(ApplicationStatus.ERROR)
+                    process.kill(signal.SIGKILL)
+            self._status_updated_fct(ApplicationStatus.ERROR)
+        except Exception as e:  # pylint: disable=broad-except
+            print("Error while killing application: {}".format(e))
+        finally:
+            self._exited_event.set()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2020 Intel Corporation
+#
+"""
+Fixed rate frame scheduling with timing statistics
+"""
+import time
+from threading import Lock
+
+
+class FrameScheduler(object):
+
+    """
+    Paces a loop to a fixed rate by sleeping until the next frame slot (instead of busy waiting).
+
+    If a frame takes longer than the period, the missed slots are skipped and counted as late frames.
+    """
+
+    def __init__(self, name, rate, stats_window=1.0):
+        self.name = name
+        self._period = 1.0 / rate
+        self._next_time = None
+        self._last_time = None
+        self._frame_start = None
+        self._stats_window = stats_window
+        self._stats_lock = Lock()
+        self._window_start = None
+        self._window_frames = 0
+        self._window_busy = 0.
+        self._window_max_frame = 0.
+        self._late_frames = 0
+        self._stats = {"fps": 0., "busy_ms": 0., "max_frame_ms": 0., "late_frames": 0}
+
+    def wait(self):
+        """
+        Sleeps until the next frame slot. Returns the time since the previous frame in milliseconds.
+        """
+        now = time.time()
+        if self._frame_start is not None:
+            self._record_frame(now - self._frame_start, now)
+        if self._next_time is None:
+            self._next_time = now
+        else:
+            self._next_time += self._period
+            if now > self._next_time:
+                # frame took too long, skip missed slots
+                self._late_frames += int((now - self._next_time) / self._period) + 1
+                self._next_time = now
+            else:
+                time.sleep(self._next_time - now)
+                now = time.time()
+
+        delta_ms = 0 if self._last_time is None else 1e3 * (now - self._last_time)
+        self._last_time = now
+        self._frame_start = now
+        return delta_ms
+
+    def _record_frame(self, busy, now):
+        if self._window_start is None:
+            self._window_start = now
+        self._window_frames += 1
+        self._window_busy += busy
+        self._window_max_frame = max(self._window_max_frame, busy)
+        elapsed = now - self._window_start
+        if elapsed >= self._stats_window:
+            with self._stats_lock:
+                self._stats = {
+                    "fps": self._window_frames / elapsed,
+                    "busy_ms": 1e3 * self._window_busy / self._window_frames,
+                    "max_frame_ms": 1e3 * self._window_max_frame,
+                    "late_frames": self._late_frames}
+            self._window_start = now
+            self._window_frames = 0
+            self._window_busy = 0.
+            self._window_max_frame = 0.
+
+    def get_stats(self):
+        """
+        Returns the statistics of the last completed window:
+        achieved frame rate, average and maximum busy time per frame and number of late frames overall.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2020 Intel Corporation
+#
+"""
+Loads the geofence definition of a scenario.
+
+The definition is a json sidecar next to the OpenSCENARIO file (e.g. scenarios/F6.geofence.json
+for scenarios/F6.xosc):
+
+    {
+        "extends": "../CARLADemo.geofence.json",
+        "routing_targets": [[x, y], ...],
+        "intro": {"action": "rss_info_dialog", "arg": "longitudinal"},
+        "events": [
+            {"pos": [x, y], "radius": 15, "action": "navigation", "arg": "left"},
+            {"pos": [x, y], "radius": 50, "action": "taking_prio", "id": 1007},
+            ...
+        ]
+    }
+
+"extends" names another definition (relative to this file) whose keys are used unless overridden.
+The definition is compiled into an event table with a precomputed grid index for the
+LocationEventHandler. Compiled definitions are cached on disk as json in a private per-user
+directory, keyed by the content of all involved files.
+"""
+import hashlib
+import json
+import os
+
+from location_event_handler import LocationEventHandler # pylint: disable=relative-import
+
+GEOFENCE_SCRIPT_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rss_demo_geofences")
+
+
+def get_geofence_script_path(scenario_file):
+    return os.path.splitext(scenario_file)[0] + ".geofence.json"
+
+
+class GeofenceScript(object):
+
+    """
+    Compiled geofence definition of a scenario
+    """
+
+    def __init__(self, source_hash, routing_targets, intro, events, grid, cell_size):
+        self.source_hash = source_hash
+        self.routing_targets = routing_targets
+        self.intro = intro
+        self.events = events
+        self.grid = grid
+        self.cell_size = cell_size
+        self.events_hash = hashlib.sha1(repr((events, cell_size)).encode()).hexdigest()
+
+    def to_json(self):
+        return {
+            "source_hash": self.source_hash,
+            "routing_targets": self.routing_targets,
+            "intro": self.intro,
+            "events": self.events,
+            "grid": [[cell[0], cell[1], indices] for cell, indices in self.grid.items()],
+            "cell_size": self.cell_size}
+
+    @staticmethod
+    def from_json(data):
+        return GeofenceScript(data["source_hash"],
+                              [tuple(target) for target in data["routing_targets"]],
+                              data["intro"],
+                              [(tuple(pos), radius, action, arg, id) for pos, radius, action, arg, id in data["events"]],
+                              dict(((cell_x, cell_y), indices) for cell_x, cell_y, indices in data["grid"]),
+                              data["cell_size"])
+
+    @staticmethod
+    def _read_sources(path):
+        sources = []
+        visited = set()
+        while path:
+            path = os.path.normpath(path)
+            if path in visited:
+                raise ValueError("Cyclic 'extends' in geofence definition {}".format(path))
+            visited.add(path)
+            with open(path) as source_file:
+                text = source_file.read()
+            definition = json.loads(text)
+            sources.append((path, text, definition))
+            extends = definition.get("extends")
+            path = os.path.join(os.path.dirname(path), extends) if extends else None
+        return sources
+
+    @staticmethod
+    def compile(source_hash, definition, cell_size):
+        events = []
+        grid = dict()
+        for event in definition.get("events", []):
+            pos = (float(event["pos"][0]), float(event["pos"][1]))
+            radius = float(event["radius"])
+            index = len(events)
+            events.append((pos, radius, event["action"], event.get("arg"), event.get("id")))
+            for cell in LocationEventHandler.get_cells(pos, radius, cell_size):
+                grid.setdefault(cell, []).append(index)
+        routing_targets = [(float(x), float(y)) for x, y in definition.get("routing_targets", [])]
+        return GeofenceScript(source_hash, routing_targets, definition.get("intro"), events, grid, cell_size)
+
+    @staticmethod
+    def load(scenario_file, cell_size=50.0, cache_dir=None):
+        """
+        Returns the compiled geofence script of the scenario or None if there is no definition.
+        """
+        path = get_geofence_script_path(scenario_file)
+        if not os.path.isfile(path):
+            return None
+
+        sources = GeofenceScript._read_sources(path)
+        source_hash = hashlib.sha1()
+        source_hash.update("{}:{}".format(GEOFENCE_SCRIPT_VERSION, cell_size).encode())
+        for _, text, _ in sources:
+            source_hash.update(text.encode())
+        source_hash = source_hash.hexdigest()
+
+        if cache_dir is None:
+            cache_dir = DEFAULT_CACHE_DIR
+        cache_file = os.path.join(cache_dir, source_hash + ".json")
+        try:
+            with open(cache_file) as cached:
+                script = GeofenceScript.from_json(json.load(cached))
+            if script.source_hash == source_hash:
+                return script
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+
+        # base definitions first, every file overrides the keys of the files it extends
+        definition = dict()
+        for _, _, source_definition in reversed(sources):
+            definition.update(source_definition)
+        script = GeofenceScript.compile(source_hash, definition, cell_size)
+
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0o700)
+            # write atomically, another demo instance might read the cache at the same time
+            temp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+            with open(temp_file, "w") as cached:
+                json.dump(script.to_json(), cached)
+            os.rename(temp_file, cache_file)
+        except (IOError, OSError) as e:
+            print("Could not cache geofence script {}: {}".format(path, e))
+        return script
@@ -2,47 +2,119 @@
 
 # handle events depending on location
 #
+# Events are stored in a uniform grid. Per tick only the events of the grid cell of the player
+# (and the currently active ones) are evaluated. An event gets active within max_distance and
+# inactive beyond max_distance + hysteresis, to avoid flapping at the border.
+#
 
 import math
+
+
 class LocationEventHandler(object):
 
-    def __init__(self):
+    def __init__(self, cell_size=50.0, hysteresis=1.0):
         self._registered_events = []
+        self._cell_size = float(cell_size)
+        self._hysteresis = hysteresis
+        self._grid = dict()
+        self._active_events = set()
 
-    def register_event(self, pos, max_distance, id, fct):
+    def _get_cell(self, x, y):
+        return self.get_cell(x, y, self._cell_size)
+
+    @staticmethod
+    def get_cell(x, y, cell_size):
+        return (int(math.floor(x / cell_size)), int(math.floor(y / cell_size)))
+
+    @staticmethod
+    def get_cells(pos, max_distance, cell_size):
+        """
+        Returns all grid cells overlapped by the circle
+        """
+        min_cell = LocationEventHandler.get_cell(pos[0] - max_distance, pos[1] - max_distance, cell_size)
+        max_cell = LocationEventHandler.get_cell(pos[0] + max_distance, pos[1] + max_distance, cell_size)
+        return [(cell_x, cell_y) for cell_x in range(min_cell[0], max_cell[0] + 1)
+                for cell_y in range(min_cell[1], max_cell[1] + 1)]
+
+    def _create_event(self, pos, max_distance, id, fct):
         event = {}
+        event["index"] = len(self._registered_events)
         event["pos"] = pos
         event["distance"] = max_distance
+        event["distance_sq"] = max_distance ** 2
+        event["release_distance_sq"] = (max_distance + self._hysteresis) ** 2
         event["id"] = id
         event["fct"] = fct
         event["active"] = False
         self._registered_events.append(event)
+        return event
+
+    def register_event(self, pos, max_distance, id, fct):
+        event = self._create_event(pos, max_distance, id, fct)
+        for cell in self.get_cells(pos, max_distance, self._cell_size):
+            self._grid.setdefault(cell, []).append(event["index"])
+
+    def load_events(self, events, grid, cell_size, bind_fct):
+        """
+        Replaces all events by a precompiled event table (see geofence_script).
+        events is a list of (pos, max_distance, action, arg, id), grid maps a cell to event indices.
+        bind_fct(action, arg, id) has to return the (id, fct) to register.
+        """
+        self.clear()
+        self._cell_size = float(cell_size)
+        for pos, max_distance, action, arg, id in events:
+            id, fct = bind_fct(action, arg, id)
+            self._create_event(pos, max_distance, id, fct)
+        # the grid is shared with the cached script, register_event() must not modify it
+        self._grid = {cell: list(indices) for cell, indices in grid.items()}
+
+    def clear(self):
+        """
+        Removes all events. Active events get inactive first.
+        """
+        for index in sorted(self._active_events):
+            event = self._registered_events[index]
+            event["active"] = False
+            print("Event {} gets inactive.".format(event["id"]))
+            event["fct"](event["id"], False)
+        self._active_events = set()
+        self._registered_events = []
+        self._grid = dict()
 
     def retrigger(self, player, id):
+        location = player.get_location()
         for event in self._registered_events:
             if event["id"] == id:
-                distance = self.calculate_distance((player.get_transform().location.x, player.get_transform().location.y), event["pos"])
-                if distance < event["distance"] and not event["active"]:
-                    event["active"] = True
-                    print("Event {} gets active.".format(event["id"]))
-                    event["fct"](event["id"], True)
-                elif event["active"] and distance > event["distance"]:
-                    event["active"] = False
-                    print("Event {} gets inactive.".format(event["id"]))
-                    event["fct"](event["id"], False)
-
+                self._update_event(event, (location.x, location.y))
 
     def calculate_distance(self, pos1, pos2):
-        return math.sqrt((pos1[0]-pos2[0])**2 + (pos1[1] - pos2[1])**2)
+        return math.sqrt(self.calculate_distance_sq(pos1, pos2))
+
+    @staticmethod
+    def calculate_distance_sq(pos1, pos2):
+        return (pos1[0]-pos2[0])**2 + (pos1[1] - pos2[1])**2
+
+    def _update_event(self, event, pos):
+        distance_sq = self.calculate_distance_sq(pos, event["pos"])
+        if distance_sq < event["distance_sq"] and not event["active"]:
+            event["active"] = True
+            self._active_events.add(event["index"])
+            print("Event {} gets active.".format(event["id"]))
+            event["fct"](event["id"], True)
+        elif event["active"] and distance_sq > event["release_distance_sq"]:
+            event["active"] = False
+            self._active_events.discard(event["index"])
+            print("Event {} gets inactive.".format(event["id"]))
+            event["fct"](event["id"], False)
 
     def tick(self, player):
-        for event in self._registered_events:
-            distance = self.calculate_distance((player.get_transform().location.x, player.get_transform().location.y), event["pos"])
-            if distance < event["distance"] and not event["active"]:
-                event["active"] = True
-                print("Event {} gets active.".format(event["id"]))
-                event["fct"](event["id"], True)
-            elif event["active"] and distance > event["distance"]:
-                event["active"] = False
-                print("Event {} gets inactive.".format(event["id"]))
-                event["fct"](event["id"], False)
+        if player is None:
+            return
+        location = player.get_location()
+        pos = (location.x, location.y)
+        candidates = set(self._grid.get(self._get_cell(pos[0], pos[1]), ()))
+        # active events have to be evaluated as well, to get inactive if the player left their cells
+        candidates |= self._active_events
+        # keep registration order, callbacks might depend on it
+        for index in sorted(candidates):
+            self._update_event(self._registered_events[index], pos)
@@ -83,7 +83,7 @@ class RssStateInfo(object):
 
 class RssSensor(object):
 
-    def __init__(self, parent_actor, world, unstructured_scene_visualizer, bounding_box_visualizer, state_visualizer, routing_targets=None):
+    def __init__(self, parent_actor, world, unstructured_scene_visualizer, bounding_box_visualizer, state_visualizer, routing_targets=None, actor_registry=None):
         self.sensor = None
         self.unstructured_scene_visualizer = unstructured_scene_visualizer
         self.bounding_box_visualizer = bounding_box_visualizer
@@ -99,7 +99,7 @@ class RssSensor(object):
         self.ego_dynamics_on_route = None
         self.current_vehicle_parameters = self.get_default_parameters()
         self.route = None
-        self.debug_visualizer = RssDebugVisualizer(parent_actor, world)
+        self.debug_visualizer = RssDebugVisualizer(parent_actor, world, actor_registry)
         self.state_visualizer = state_visualizer
         self.change_to_unstructured_position_map = dict()
 
@@ -31,6 +31,9 @@ from base_dialog import BaseDialog
 
 class RssStateVisualizer(object):
 
+    BORDER_LEFT_ID = 18446744073709551614
+    BORDER_RIGHT_ID = 18446744073709551615
+
     def __init__(self, display_dimensions, font, world):
         self._surface = None
         self._display_dimensions = display_dimensions
@@ -443,10 +446,11 @@ class RssUnstructuredSceneVisualizer(BaseDialog):
 
 class RssBoundingBoxVisualizer(object):
 
-    def __init__(self, display_dimensions, world, camera):
+    def __init__(self, display_dimensions, world, camera, actor_registry=None):
         self._last_camera_frame = 0
         self._surface_for_frame = []
         self._world = world
+        self._actor_registry = actor_registry
         self._dim = display_dimensions
         self._calibration = np.identity(3)
         self._calibration[0, 2] = self._dim[0] / 2.0
@@ -473,7 +477,7 @@ class RssBoundingBoxVisualizer(object):
         surface.set_alpha(80)
         try:
             bounding_boxes = RssBoundingBoxVisualizer.get_bounding_boxes(
-                individual_rss_states, self._camera.get_transform(), self._calibration, self._world)
+                individual_rss_states, self._camera.get_transform(), self._calibration, self._world, self._actor_registry)
             RssBoundingBoxVisualizer.draw_bounding_boxes(surface, bounding_boxes)
             self._surface_for_frame.append((frame, surface, len(bounding_boxes)))
         except RuntimeError:
@@ -493,13 +497,21 @@ class RssBoundingBoxVisualizer(object):
         self._last_camera_frame = current_camera_frame
 
     @staticmethod
-    def get_bounding_boxes(individual_rss_states, camera_transform, calibration, world):
+    def get_bounding_boxes(individual_rss_states, camera_transform, calibration, world, actor_registry=None):
         """
         Creates 3D bounding boxes based on carla vehicle list and camera.
         """
         bounding_boxes = []
-        for state in individual_rss_states:
-            if state.actor_calculation_mode != ad.rss.map.RssMode.NotRelevant and state.is_dangerous:
+        dangerous_states = [state for state in individual_rss_states
+                            if state.actor_calculation_mode != ad.rss.map.RssMode.NotRelevant and state.is_dangerous]
+        if actor_registry:
+            object_ids = [state.rss_state.objectId for state in dangerous_states
+                          if state.rss_state.objectId not in (RssStateVisualizer.BORDER_LEFT_ID, RssStateVisualizer.BORDER_RIGHT_ID)]
+            for other_actor in actor_registry.get_actors(object_ids):
+                bounding_boxes.append(RssBoundingBoxVisualizer.get_bounding_box(
+                    other_actor, camera_transform, calibration, actor_registry.get_bounding_box(other_actor)))
+        else:
+            for state in dangerous_states:
                 other_actor = state.get_actor(world)
                 if other_actor:
                     bounding_boxes.append(RssBoundingBoxVisualizer.get_bounding_box(
@@ -533,26 +545,28 @@ class RssBoundingBoxVisualizer(object):
             pygame.draw.polygon(surface, color, polygon)
 
     @staticmethod
-    def get_bounding_box(vehicle, camera_transform, calibration):
+    def get_bounding_box(vehicle, camera_transform, calibration, bounding_box=None):
         """
         Returns 3D bounding box for a vehicle based on camera view.
         """
 
-        bb_cords = RssBoundingBoxVisualizer._create_bb_points(vehicle)
-        cords_x_y_z = RssBoundingBoxVisualizer._vehicle_to_sensor(bb_cords, vehicle, camera_transform)[:3, :]
+        if bounding_box is None:
+            bounding_box = vehicle.bounding_box
+        bb_cords = RssBoundingBoxVisualizer._create_bb_points(bounding_box)
+        cords_x_y_z = RssBoundingBoxVisualizer._vehicle_to_sensor(bb_cords, vehicle, bounding_box, camera_transform)[:3, :]
         cords_y_minus_z_x = np.concatenate([cords_x_y_z[1, :], -cords_x_y_z[2, :], cords_x_y_z[0, :]])
         bbox = np.transpose(np.dot(calibration, cords_y_minus_z_x))
         camera_bbox = np.concatenate([bbox[:, 0] / bbox[:, 2], bbox[:, 1] / bbox[:, 2], bbox[:, 2]], axis=1)
         return camera_bbox
 
     @staticmethod
-    def _create_bb_points(vehicle):
+    def _create_bb_points(bounding_box):
         """
         Returns 3D bounding box for a vehicle.
         """
 
         cords = np.zeros((8, 4))
-        extent = vehicle.bounding_box.extent
+        extent = bounding_box.extent
         cords[0, :] = np.array([extent.x, extent.y, -extent.z, 1])
         cords[1, :] = np.array([-extent.x, extent.y, -extent.z, 1])
         cords[2, :] = np.array([-extent.x, -extent.y, -extent.z, 1])
@@ -564,22 +578,22 @@ class RssBoundingBoxVisualizer(object):
         return cords
 
     @staticmethod
-    def _vehicle_to_sensor(cords, vehicle, camera_transform):
+    def _vehicle_to_sensor(cords, vehicle, bounding_box, camera_transform):
         """
         Transforms coordinates of a vehicle bounding box to sensor.
         """
 
-        world_cord = RssBoundingBoxVisualizer._vehicle_to_world(cords, vehicle)
+        world_cord = RssBoundingBoxVisualizer._vehicle_to_world(cords, vehicle, bounding_box)
         sensor_cord = RssBoundingBoxVisualizer._world_to_sensor(world_cord, camera_transform)
         return sensor_cord
 
     @staticmethod
-    def _vehicle_to_world(cords, vehicle):
+    def _vehicle_to_world(cords, vehicle, bounding_box):
         """
         Transforms coordinates of a vehicle bounding box to world.
         """
 
-        bb_transform = carla.Transform(vehicle.bounding_box.location)
+        bb_transform = carla.Transform(bounding_box.location)
         bb_vehicle_matrix = get_matrix(bb_transform)
         vehicle_world_matrix = get_matrix(vehicle.get_transform())
         bb_world_matrix = np.dot(vehicle_world_matrix, bb_vehicle_matrix)
@@ -612,8 +626,9 @@ class RssDebugVisualizationMode(Enum):
 
 class RssDebugVisualizer(object):
 
-    def __init__(self, player, world):
+    def __init__(self, player, world, actor_registry=None):
         self._world = world
+        self._actor_registry = actor_registry
         self._player = player
         self._visualization_mode = RssDebugVisualizationMode.Off
 
@@ -681,7 +696,7 @@ class RssDebugVisualizer(object):
 
     def visualize_rss_results(self, state_snapshot):
         for state in state_snapshot:
-            other_actor = state.get_actor(self._world)
+            other_actor = state.get_actor(self._actor_registry or self._world)
             if not other_actor:
                 # print("Actor not found. Skip visualizing state {}".format(state))
                 continue
@@ -6,6 +6,8 @@
 Executes scenario runner
 """
 import os
+import json
+import time
 from application_runner import ApplicationRunner, ApplicationStatus
 from datetime import datetime, timedelta
 try:
@@ -13,38 +15,121 @@ try:
 except ImportError:
     import Queue as queue
 
+SCENARIO_READY_STRING = "ScenarioManager: Running scenario Demo"
+WORKER_READY_STRING = "ScenarioRunner worker: ready"
+WORKER_IDLE_STRING = "ScenarioRunner worker: idle"
+
 class ScenarioRunnerRunner(ApplicationRunner):
 
-    def __init__(self):
+    """
+    Executes scenarios with scenario runner.
+
+    By default, a new scenario runner process is started per scenario. With use_worker, a single
+    scenario runner process is kept alive (scenario_runner.py --worker) and the scenarios are
+    requested via its stdin, so that startup, imports and scenario parsing are only paid once.
+    """
+
+    def __init__(self, use_worker=False):
         self._application_result = None
         self._status_updates = queue.Queue()
+        self._scenario_updates = queue.Queue()
+        self._scenario_active = False
+        self._use_worker = use_worker
+        self.last_ready_latency = None
         self._path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
-        super(ScenarioRunnerRunner, self).__init__(self.status_updated, self.log_output, "ScenarioManager: Running scenario Demo")
+        ready_string = WORKER_READY_STRING if use_worker else SCENARIO_READY_STRING
+        super(ScenarioRunnerRunner, self).__init__(self.status_updated, self.log_output, ready_string)
+        if use_worker:
+            self.add_output_matcher(SCENARIO_READY_STRING, lambda: self._scenario_updates.put(ApplicationStatus.RUNNING))
+            self.add_output_matcher(WORKER_IDLE_STRING, lambda: self._scenario_updates.put(ApplicationStatus.STOPPED))
 
     def status_updated(self, status):
         print("[SC STATUS] Status changed to {}".format(status))
+        if status == ApplicationStatus.ERROR:
+            print("[SC] Last output of scenario runner:")
+            for line in self.get_log(20):
+                print("[SC]{}".format(line))
         self._status_updates.put(status)
+        if status == ApplicationStatus.ERROR or status == ApplicationStatus.STOPPED:
+            # worker process is gone
+            self._scenario_updates.put(status)
 
     def log_output(self, log):
         print("[SC]{}".format(log))
 
+    def _get_cmdline(self):
+        return ["/usr/bin/python", "{}/carla-scenario-runner/scenario_runner.py".format(self._path), "--timeout",  "1000", "--waitForEgo"]
+
+    def _wait_for_status(self, status_queue, timeout):
+        """
+        Waits until the application is running. Returns False if it stopped or failed instead.
+        """
+        execution_time = datetime.now()
+        while (datetime.now() - execution_time) < timedelta(seconds=timeout):
+            try:
+                status = status_queue.get(block=True, timeout=1)
+                if status == ApplicationStatus.RUNNING:
+                    return True
+                elif status == ApplicationStatus.ERROR or status == ApplicationStatus.STOPPED:
+                    return False
+            except queue.Empty:
+                pass
+        return False
+
     def execute_scenario(self, scenario_file):
-        self._status_updates = queue.Queue()
+        start_time = time.time()
+        if self._use_worker:
+            result = self._execute_scenario_in_worker(scenario_file)
+        else:
+            self._status_updates = queue.Queue()
+            cmdline = self._get_cmdline() + ["--openscenario", "{}/{}".format(self._path, scenario_file)]
+            result = self.execute(cmdline, env=os.environ)
+            if result is True:
+                result = self._wait_for_status(self._status_updates, 16)
+
+        if result:
+            self.last_ready_latency = time.time() - start_time
+            print("[SC] Scenario {} ready after {:.0f} ms".format(scenario_file, 1e3 * self.last_ready_latency))
+        return result
 
-        cmdline = ["/usr/bin/python", "{}/carla-scenario-runner/scenario_runner.py".format(self._path), "--timeout",  "1000", "--openscenario", "{}/{}".format(self._path, scenario_file), "--waitForEgo"]
-        result = self.execute(cmdline, env=os.environ)
+    def _execute_scenario_in_worker(self, scenario_file):
+        self.stop_scenario()
+        if not self.is_running():
+            self._status_updates = queue.Queue()
+            self._scenario_updates = queue.Queue()
+            if not self.execute(self._get_cmdline() + ["--worker"], env=os.environ):
+                return False
+            if not self._wait_for_status(self._status_updates, 16):
+                return False
 
+        # drop the idle notification of the worker
+        while not self._scenario_updates.empty():
+            self._scenario_updates.get()
+
+        command = {"command": "run", "openscenario": "{}/{}".format(self._path, scenario_file)}
+        if not self.send_line(json.dumps(command)):
+            return False
+        self._scenario_active = True
+        return self._wait_for_status(self._scenario_updates, 16)
+
+    def stop_scenario(self):
+        """
+        Stops the current scenario. The worker process is kept alive (if used).
+        """
+        if not self._use_worker:
+            self.shutdown()
+            return
+        if not self._scenario_active:
+            return
+        self._scenario_active = False
+        if not self.send_line(json.dumps({"command": "stop"})):
+            return
         execution_time = datetime.now()
-        if result is True:
-            result = False
-            while (datetime.now() - execution_time) < timedelta(seconds=16):
-                try:
-                    status = self._status_updates.get(block=True, timeout=1)
-                    if status == ApplicationStatus.RUNNING:
-                        result = True
-                        break
-                    elif status == ApplicationStatus.ERROR or status == ApplicationStatus.STOPPED:
-                        break
-                except queue.Empty:
-                    pass
-        return result
+        while (datetime.now() - execution_time) < timedelta(seconds=8):
+            try:
+                if self._scenario_updates.get(block=True, timeout=1) != ApplicationStatus.RUNNING:
+                    return
+            except queue.Empty:
+                pass
+        print("[SC] Worker did not stop the scenario within 8s. Restarting worker.")
+        self.shutdown()
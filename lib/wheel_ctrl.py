@@ -10,6 +10,7 @@ from threading import Lock
 from enum import Enum
 import math
 import time
+from collections import namedtuple
 try:
     import pygame
     from pygame.locals import KMOD_CTRL
@@ -66,6 +67,10 @@ except:
   pass
 
 
+# keyboard, mouse and joystick state, sampled by the thread handling the pygame events
+ControlInput = namedtuple('ControlInput', ['keys', 'mods', 'mouse_pressed', 'mouse_pos', 'joystick_axes', 'joystick_buttons'])
+
+
 class SteeringWheelInitState(Enum):
     START = 1
     TOGGLE = 2
@@ -186,6 +191,7 @@ class WheelControl(object):
         self._reverse_idx = 5
         self._handbrake_idx = 4
         self._evasive_active = False
+        self._input = None
 
         self.restart()
 
@@ -236,8 +242,8 @@ class WheelControl(object):
         self.steering_wheel_auto_center(False)
         self.set_leds(False)
 
-    def update_wheel_position(self):
-        steering_wheel_position = self._joystick.get_axis(self._steer_idx)
+    def update_wheel_position(self, player, control_input):
+        steering_wheel_position = control_input.joystick_axes[self._steer_idx]
         #print("New Wheel Position {}".format(steering_wheel_position))
         if self._initialize_steering_wheel:
             print("Initializing steering wheel... {}".format(self._steering_wheel_init_state))
@@ -277,7 +283,7 @@ class WheelControl(object):
         force = 0
 
         if self._autopilot_enabled:
-            target_value = self._world.player.get_control().steer
+            target_value = player.get_control().steer
             initial_force_level = 0.2 # for autopilot as low as possible
             #print("New Wheel Position {} (expected {})".format(steering_wheel_position, target_value))
             #max distance is 2, therefore divide by 2
@@ -308,7 +314,11 @@ class WheelControl(object):
             self.steer_left(force)
 
 
-    def parse_events(self, world, clock):
+    def parse_events(self, world):
+        '''
+        Handle pygame events. Has to be called from the thread owning the display.
+        Returns True if the application should quit.
+        '''
         for event in pygame.event.get():
             #print("Unknown key: {}".format(event))
             if event.type == pygame.QUIT:
@@ -445,101 +455,133 @@ class WheelControl(object):
             elif event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 1:
                     self._mouse_steering_center = None
+        return False
+
+    def sample_input(self):
+        '''
+        Read the keyboard, mouse and joystick state for the next tick(). pygame input has to be read
+        by the thread handling the events, so this is called by the render thread.
+        '''
+        joystick_axes = None
+        joystick_buttons = None
+        if self._joystick:
+            joystick_axes = tuple(float(self._joystick.get_axis(i)) for i in range(self._joystick.get_numaxes()))
+            joystick_buttons = tuple(float(self._joystick.get_button(i)) for i in range(self._joystick.get_numbuttons()))
+        self._input = ControlInput(pygame.key.get_pressed(), pygame.key.get_mods(), pygame.mouse.get_pressed()[0],
+                                   pygame.mouse.get_pos(), joystick_axes, joystick_buttons)
 
+    def tick(self, world, player, rss_sensor, milliseconds):
+        '''
+        Calculate and apply the vehicle control. Called by the control loop with the time since the last call,
+        outside of the world lock: player and rss_sensor are the ones at the start of the tick, a restart
+        on the render thread can replace them (and the control) meanwhile. The control is calculated on a copy,
+        which is only taken over if the control was not replaced.
+        '''
+        control_input = self._input
+        if control_input is None:
+            return
+        with world.lock:
+            shared_control = self._control
+            control = self._copy_control(shared_control)
         if not self._autopilot_enabled:
-            if self._joystick:
-                self._parse_vehicle_wheel()
-            self._parse_vehicle_keys(pygame.key.get_pressed(), clock.get_time())
-            if pygame.mouse.get_pressed()[0]:
-                self._parse_mouse(pygame.mouse.get_pos())
-            self._control.reverse = self._control.gear < 0
+            if control_input.joystick_axes is not None:
+                self._parse_vehicle_wheel(control, control_input.joystick_axes, control_input.joystick_buttons)
+            self._parse_vehicle_keys(control, control_input.keys, milliseconds)
+            if control_input.mouse_pressed:
+                self._parse_mouse(control, control_input.mouse_pos)
+            control.reverse = control.gear < 0
 
             #limit speed to 30kmh
-            v = world.player.get_velocity()
-            self._world.throttle_input = self._control.throttle # used for display
-            self._world.speed_limit = self._speed_limit
+            v = player.get_velocity()
+            world.throttle_input = control.throttle # used for display
+            world.speed_limit = self._speed_limit
 
             self._current_speed = 3.6 * math.sqrt(v.x**2 + v.y**2 + v.z**2)
             if self._current_speed >= self._speed_limit:
-                self._control.throttle = 0
+                control.throttle = 0
 
             if self._restrictor:
-                proper_response = self._world.rss_sensor.proper_response if self._world.rss_sensor and self._world.rss_sensor.response_valid else None
+                proper_response = rss_sensor.proper_response if rss_sensor and rss_sensor.response_valid else None
                 if proper_response:
-                    rss_ego_dynamics_on_route = self._world.rss_sensor.ego_dynamics_on_route
+                    rss_ego_dynamics_on_route = rss_sensor.ego_dynamics_on_route
 
-                    if not (pygame.key.get_mods() & KMOD_CTRL) and self._world.rss_restrict:
-                        proper_response = self.add_evasive_maneuver_to_response(proper_response)
+                    if not (control_input.mods & KMOD_CTRL) and world.rss_restrict:
+                        proper_response = self.add_evasive_maneuver_to_response(proper_response, rss_sensor)
 
-                        self._world.restricted_vehicle_control = self._restrictor.restrict_vehicle_control(self._control, proper_response, rss_ego_dynamics_on_route, self.vehicle_physics)
+                        world.restricted_vehicle_control = self._restrictor.restrict_vehicle_control(control, proper_response, rss_ego_dynamics_on_route, self.vehicle_physics)
 
                         current_time = pygame.time.get_ticks()
 
                         #set leds if restrict is active
-                        restrict_active = not self._world.restricted_vehicle_control == self._control
+                        restrict_active = not world.restricted_vehicle_control == control
                         restrict_longitudinal_active = False
                         restrict_lateral_active = False
                         if not restrict_active:
-                            self._world.restricted_vehicle_control = None
-                            self._world.restrict_longitudinal_active = False
-                            self._world.restrict_lateral_active = False
+                            world.restricted_vehicle_control = None
+                            world.restrict_longitudinal_active = False
+                            world.restrict_lateral_active = False
                             #fade in steering
-                            self._control.steer = min(1.0, (current_time - self._last_lat_restriction_ms) / self._fade_in_time) * self._control.steer
+                            control.steer = min(1.0, (current_time - self._last_lat_restriction_ms) / self._fade_in_time) * control.steer
                         else:
-                            prev_lon_active = self._world.restrict_longitudinal_active
-                            restrict_longitudinal_active = (self._control.brake != self._world.restricted_vehicle_control.brake or self._control.throttle != self._world.restricted_vehicle_control.throttle)
+                            prev_lon_active = world.restrict_longitudinal_active
+                            restrict_longitudinal_active = (control.brake != world.restricted_vehicle_control.brake or control.throttle != world.restricted_vehicle_control.throttle)
                             if not prev_lon_active and restrict_longitudinal_active:
                                 self.steering_wheel_vibrate()
                                 #self.steering_wheel_vibrate_on()
 
-                            restrict_lateral_active = self._control.steer != self._world.restricted_vehicle_control.steer
+                            restrict_lateral_active = control.steer != world.restricted_vehicle_control.steer
                             if restrict_lateral_active:
                                 self._last_lat_restriction_ms = current_time
-                                self._control.steer = self._world.restricted_vehicle_control.steer
+                                control.steer = world.restricted_vehicle_control.steer
                             else:
                                 #fade in steering
-                                self._control.steer = min(1.0, (current_time - self._last_lat_restriction_ms) / self._fade_in_time) *  self._world.restricted_vehicle_control.steer
-                            self._control.brake = self._world.restricted_vehicle_control.brake
-                            self._control.throttle = self._world.restricted_vehicle_control.throttle
-                            self._steer_cache = self._world.restricted_vehicle_control.steer
+                                control.steer = min(1.0, (current_time - self._last_lat_restriction_ms) / self._fade_in_time) *  world.restricted_vehicle_control.steer
+                            control.brake = world.restricted_vehicle_control.brake
+                            control.throttle = world.restricted_vehicle_control.throttle
+                            self._steer_cache = world.restricted_vehicle_control.steer
 
                         #if not restrict_longitudinal_active:
                         #    self.steering_wheel_vibrate_off()
 
-                        self._world.update_rss_restricts(restrict_lateral_active, restrict_longitudinal_active)
+                        world.update_rss_restricts(restrict_lateral_active, restrict_longitudinal_active)
                         self.set_leds(restrict_active)
                     else:
-                        self._world.restricted_vehicle_control = None
+                        world.restricted_vehicle_control = None
                         self._notification_fct("RSS temporary Inactive!")
 
-                    #world.hud.restricted_vehicle_control = self._control
+                    #world.hud.restricted_vehicle_control = control
         if not world.move_player_target_transform:
             # control only active if not moving vehicle
             if self._light_state == None:
-                self._light_state = world.player.get_light_state()
+                self._light_state = player.get_light_state()
 
             if not self._light_state:
                 brake_light_active = False
             else:
                 brake_light_active = (self._light_state | carla.VehicleLightState.Brake) == carla.VehicleLightState.Brake
 
-            if self._control.brake > 0 and not brake_light_active:
+            if control.brake > 0 and not brake_light_active:
                 self._light_state = carla.VehicleLightState(self._light_state | carla.VehicleLightState.Brake)
-                world.player.set_light_state(carla.VehicleLightState(self._light_state))
-            elif self._control.brake <= 0 and brake_light_active:
+                player.set_light_state(carla.VehicleLightState(self._light_state))
+            elif control.brake <= 0 and brake_light_active:
                 self._light_state = carla.VehicleLightState(self._light_state & ~carla.VehicleLightState.Brake)
-                world.player.set_light_state(carla.VehicleLightState(self._light_state))
-            world.player.apply_control(self._control)
-        if self._joystick:
-            self.update_wheel_position()
+                player.set_light_state(carla.VehicleLightState(self._light_state))
+            player.apply_control(control)
+        with world.lock:
+            if self._control is shared_control:
+                # the gear is changed by the render thread (parse_events)
+                for attribute in ('throttle', 'steer', 'brake', 'hand_brake', 'reverse'):
+                    setattr(self._control, attribute, getattr(control, attribute))
+        if control_input.joystick_axes is not None:
+            self.update_wheel_position(player, control_input)
 
     def set_evasive(self, active):
         self._evasive_active = active
 
-    def add_evasive_maneuver_to_response(self, proper_response):
+    def add_evasive_maneuver_to_response(self, proper_response, rss_sensor):
         if self._evasive_active and ( proper_response.accelerationRestrictions.longitudinalRange.maximum > 0. ):
             is_dangerous = False
-            for state in self._world.rss_sensor.individual_rss_states:
+            for state in rss_sensor.individual_rss_states:
                 if state.is_dangerous:
                     is_dangerous = True
                     brake_dist_brake_min = ad.physics.Distance()
@@ -548,15 +590,15 @@ class WheelControl(object):
                         self._current_speed/3.6,
                         self._speed_limit/3.6,
                         response_time,
-                        self._world.rss_sensor.current_vehicle_parameters.alphaLon.accelMax,
-                        self._world.rss_sensor.current_vehicle_parameters.alphaLon.brakeMin,
+                        rss_sensor.current_vehicle_parameters.alphaLon.accelMax,
+                        rss_sensor.current_vehicle_parameters.alphaLon.brakeMin,
                         brake_dist_brake_min)
                     # rss state provides distance of center points, so we have to subtract a complete vehicle length
                     distance_to_other = state.distance - 0.5 * float(state.ego_state.dimension.length + state.object_state.dimension.length)
                     # print("Dangerous {}, but no response, d={}, d_b_max={}".format(state.rss_state.objectId, distance_to_other, brake_dist_brake_min))
                     if brake_dist_brake_min >= distance_to_other:
                         print("EVASIVE brake")
-                        proper_response.accelerationRestrictions.longitudinalRange.maximum = self._world.rss_sensor.current_vehicle_parameters.alphaLon.brakeMin
+                        proper_response.accelerationRestrictions.longitudinalRange.maximum = rss_sensor.current_vehicle_parameters.alphaLon.brakeMin
         return proper_response
 
 
@@ -588,7 +630,7 @@ class WheelControl(object):
         with self._steering_wheel_write_lock:
             os.write(self.raw_dev,bytearray([0x23, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]))
 
-    def _parse_vehicle_keys(self, keys, milliseconds):
+    def _parse_vehicle_keys(self, control, keys, milliseconds):
         steer_increment = 5e-4 * milliseconds
         if keys[K_LEFT] or keys[K_a]:
             self._steer_cache -= steer_increment
@@ -598,26 +640,22 @@ class WheelControl(object):
             self._steer_cache = 0.0
         self._steer_cache = min(0.7, max(-0.7, self._steer_cache))
         if not self._joystick:
-            self._control.throttle = 1.0 if keys[K_UP] or keys[K_w] else 0.0
-            self._control.steer = round(self._steer_cache, 1)
-            self._control.brake = 1.0 if keys[K_DOWN] or keys[K_s] else 0.0
-            self._control.hand_brake = keys[K_SPACE]
+            control.throttle = 1.0 if keys[K_UP] or keys[K_w] else 0.0
+            control.steer = round(self._steer_cache, 1)
+            control.brake = 1.0 if keys[K_DOWN] or keys[K_s] else 0.0
+            control.hand_brake = keys[K_SPACE]
         else:
             if keys[K_UP] or keys[K_w]:
-                self._control.throttle = 1.0 if keys[K_UP] or keys[K_w] else 0.0
+                control.throttle = 1.0 if keys[K_UP] or keys[K_w] else 0.0
             if keys[K_LEFT] or keys[K_a] or keys[K_RIGHT] or keys[K_d]:
-                self._control.steer = round(self._steer_cache, 1)
+                control.steer = round(self._steer_cache, 1)
             if keys[K_DOWN] or keys[K_s]:
-                self._control.brake = 1.0 if keys[K_DOWN] or keys[K_s] else 0.0
+                control.brake = 1.0 if keys[K_DOWN] or keys[K_s] else 0.0
             if keys[K_SPACE]:
-                self._control.hand_brake = keys[K_SPACE]
+                control.hand_brake = keys[K_SPACE]
 
-    def _parse_vehicle_wheel(self):
-        numAxes = self._joystick.get_numaxes()
-        jsInputs = [float(self._joystick.get_axis(i)) for i in range(numAxes)]
+    def _parse_vehicle_wheel(self, control, jsInputs, jsButtons):
         # print (jsInputs)
-        jsButtons = [float(self._joystick.get_button(i)) for i in
-                     range(self._joystick.get_numbuttons())]
         # Custom function to map range of inputs [1, -1] to outputs [0, 1] i.e 1 from inputs means nothing is pressed
         # For the steering, it seems fine as it is
         K1 = 0.4#0.5#1.0  # 0.55
@@ -643,15 +681,15 @@ class WheelControl(object):
             elif brakeCmd > 1:
                 brakeCmd = 1
 
-        self._control.steer = steerCmd
-        self._control.brake = brakeCmd
-        self._control.throttle = throttleCmd
+        control.steer = steerCmd
+        control.brake = brakeCmd
+        control.throttle = throttleCmd
 
         #toggle = jsButtons[self._reverse_idx]
 
-        self._control.hand_brake = bool(jsButtons[self._handbrake_idx])
+        control.hand_brake = bool(jsButtons[self._handbrake_idx])
 
-    def _parse_mouse(self, pos):
+    def _parse_mouse(self, control, pos):
         if not self._mouse_steering_center:
             return
 
@@ -660,13 +698,19 @@ class WheelControl(object):
         max_val = self.MOUSE_STEERING_RANGE
         lateral = -max_val if lateral < -max_val else max_val if lateral > max_val else lateral
         longitudinal = -max_val if longitudinal < -max_val else max_val if longitudinal > max_val else longitudinal
-        self._control.steer = lateral/max_val
+        control.steer = lateral/max_val
         if longitudinal < 0.0:
-            self._control.throttle = -longitudinal / max_val
-            self._control.brake = 0.0
+            control.throttle = -longitudinal / max_val
+            control.brake = 0.0
         elif longitudinal > 0.0:
-            self._control.throttle = 0.0
-            self._control.brake = longitudinal / max_val
+            control.throttle = 0.0
+            control.brake = longitudinal / max_val
+
+    @staticmethod
+    def _copy_control(control):
+        return carla.VehicleControl(throttle=control.throttle, steer=control.steer, brake=control.brake,
+                                    hand_brake=control.hand_brake, reverse=control.reverse,
+                                    manual_gear_shift=control.manual_gear_shift, gear=control.gear)
 
     @staticmethod
     def _is_quit_shortcut(key):
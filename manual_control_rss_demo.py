@@ -54,7 +54,7 @@ import random
 import re
 import math
 import weakref
-from threading import Lock, Thread
+from threading import Event, Lock, RLock, Thread
 try:
     import queue
 except ImportError:
@@ -71,7 +71,10 @@ except ImportError:
     raise RuntimeError('cannot import numpy, make sure numpy package is installed')
 
 from lib.scenario_runner_runner import ScenarioRunnerRunner
+from lib.frame_scheduler import FrameScheduler
 from lib.location_event_handler import LocationEventHandler
+from lib.geofence_script import GeofenceScript
+from lib.actor_registry import ActorRegistry
 
 from lib.rss_sensor import RssSensor
 from lib.rss_visualization import RssUnstructuredSceneVisualizer, RssBoundingBoxVisualizer
@@ -152,14 +155,14 @@ class CollisionSensor(object):
 
 class World(object):
 
-    def __init__(self, client, scenario_runner, overlay_dialog, display, scenario_file, enable_autopilot, use_rss, use_walkers, demo_mode, use_wheel):
+    def __init__(self, client, scenario_runner, overlay_dialog, display, scenario_file, enable_autopilot, use_rss, use_walkers, demo_mode, use_wheel, intervention_log_dir=None):
         self.client = client
         self._wheel_ctrl = None
         self.world = client.get_world()
         self._map = self.world.get_map()
         self.location_event_handler = LocationEventHandler()
+        self.actor_registry = ActorRegistry(self.world)
         self._paused = False
-        self.vehicles = []
         self.rss_restrict_count = 0
         self.player = None
         self.move_player_target_transform = None
@@ -185,8 +188,12 @@ class World(object):
         self._scenario_runner = scenario_runner
         self._overlay_dialog = overlay_dialog
         self._display = display
-        self._routing_targets_dict = dict()
+        self._geofence_scripts = dict()
+        self._loaded_events_hash = None
         self.unstructured_scene_drawer = None
+        self._intervention_log_dir = intervention_log_dir
+        # serializes the control thread with event handling (e.g. restart) of the render thread
+        self.lock = RLock()
 
         self._logo = pygame.image.load("images/intellabs_logo_70.png")
         self._logo_pos = (20, self._display.get_height() - self._logo.get_height() - 20)
@@ -205,22 +212,9 @@ class World(object):
             self._left_navigation_id = self._navigation_dialog.load_image("images/arrow_left2.png", (self._display.get_width()/2 - 162/2 - 57, 140))
             self._right_navigation_id = self._navigation_dialog.load_image("images/arrow_right2.png", (self._display.get_width()/2 - 162/2 + 57, 140))
             self._straight_navigation_id = self._navigation_dialog.load_image("images/arrow_straight2.png", (self._display.get_width()/2 - 82/2, 140))
-            self.location_event_handler.register_event((349.5,117.4 + 2), 17.8 + 5, self._right_navigation_id, self.show_navigation)
-            self.location_event_handler.register_event((108,131), 15, self._left_navigation_id, self.show_navigation)
-            self.location_event_handler.register_event((91,178), 15, self._straight_navigation_id, self.show_navigation)
-            self.location_event_handler.register_event((91,309), 17, self._left_navigation_id, self.show_navigation)
-            self.location_event_handler.register_event((321.9,328.6), 15, self._left_navigation_id, self.show_navigation)
-            #self.location_event_handler.register_event((214,130), 123 - 40, 0, self.change_speed_limit)
-            #self.location_event_handler.register_event((214,328.6), 123 - 40, 0, self.change_speed_limit)
-            #self.location_event_handler.register_event((91,229.8), 98.8 - 40, 0, self.change_speed_limit)
-
             self._left_the_road_dialog = LeftTheRoadDialog(self._display.get_width(), self._display.get_height())
-
             self._welcome_dialog = WelcomeDialog(self._display.get_width(), self._display.get_height())
-            self.location_event_handler.register_event((336.9,70), 5, 1001, self.show_welcome_dialog)
-
             self._finish_dialog = FinishDialog(self._display.get_width(), self._display.get_height())
-            self.location_event_handler.register_event((320,328), 20, 1002, self.show_finish_dialog)
 
             self._rss_info_dialog = RssInfoDialog(self._display.get_width(), self._display.get_height())
             self._rss_info_dialog_longitudinal = self._rss_info_dialog.load_content("images/longitudinal3.png", "RSS assures a longitudinal safe distance.", (20,140))
@@ -229,33 +223,28 @@ class World(object):
             self._rss_info_dialog_pedestrians = self._rss_info_dialog.load_content("images/rss-unstructured.png", "RSS assures safety for Vulnerable Road Users.", (20,140))
             self._rss_info_dialog_parameters = self._rss_info_dialog.load_content("images/parameter_sets2.png", "RSS supports multiple driving profiles.", (20,140))
             #self._rss_info_dialog_assertive = self._rss_info_dialog.load_content("images/parameter_sets2.png", "RSS parameters set to 'assertive'.", (20,140))
-            self.location_event_handler.register_event((311,129.7), 5, self._rss_info_dialog_longitudinal, self.show_rss_info_dialog)
-            self.location_event_handler.register_event((245,129.7), 5, self._rss_info_dialog_lateral, self.show_rss_info_dialog)
-            self.location_event_handler.register_event((85,154.5), 10, self._rss_info_dialog_right_of_way, self.show_rss_info_dialog)
-            self.location_event_handler.register_event((124.9,331), 5, self._rss_info_dialog_pedestrians, self.show_rss_info_dialog)
-            self.location_event_handler.register_event((170,331), 5, self._rss_info_dialog_parameters, self.show_rss_info_dialog)
-
-
-            #self.location_event_handler.register_event((200,328.6), 5, self._rss_info_dialog_assertive, self.show_rss_info_dialog)
-
-
-            # Scene: taking prio
-            self.location_event_handler.register_event((70,195), 50, 1007, self.switch_to_taking_prio)
 
-            # Scene: Change RSS Parameters
-            self.location_event_handler.register_event((290,331), 50, 1003, self.switch_to_assertive_parameters)
-            self.location_event_handler.register_event((290,331), 130.1, 1004, self.display_rss_parameter_set)
-
-            # Scene: Pedestrian
-            self.location_event_handler.register_event((250,331), 130.1, 1005, self.display_unstructured)
-
-            #TODO: move route to openscenario
-            self._routing_targets_dict = {
-            "CARLADemo.xosc": [carla.Transform(carla.Location(x=88, y=175)), carla.Transform(carla.Location(x=108, y=331)), carla.Transform(carla.Location(x=339, y=245))],
-            "scenarios/F6.xosc": [carla.Transform(carla.Location(x=88, y=175)), carla.Transform(carla.Location(x=108, y=331)), carla.Transform(carla.Location(x=339, y=245))],
-            "scenarios/F7.xosc": [carla.Transform(carla.Location(x=108, y=331)), carla.Transform(carla.Location(x=339, y=245))],
-            "scenarios/F8.xosc": [carla.Transform(carla.Location(x=339, y=245))],
-            "scenarios/F9.xosc": [carla.Transform(carla.Location(x=339, y=245))]}
+            # actions available to the geofence scripts (see lib/geofence_script.py): action -> (fct, arg -> event id)
+            self._event_actions = {
+                "navigation": (self.show_navigation, {
+                    "left": self._left_navigation_id,
+                    "right": self._right_navigation_id,
+                    "straight": self._straight_navigation_id}),
+                "welcome_dialog": (self.show_welcome_dialog, None),
+                "finish_dialog": (self.show_finish_dialog, None),
+                "rss_info_dialog": (self.show_rss_info_dialog, {
+                    "longitudinal": self._rss_info_dialog_longitudinal,
+                    "lateral": self._rss_info_dialog_lateral,
+                    "right_of_way": self._rss_info_dialog_right_of_way,
+                    "pedestrians": self._rss_info_dialog_pedestrians,
+                    "parameters": self._rss_info_dialog_parameters}),
+                # Scene: taking prio
+                "taking_prio": (self.switch_to_taking_prio, None),
+                # Scene: Change RSS Parameters
+                "assertive_parameters": (self.switch_to_assertive_parameters, None),
+                "rss_parameter_display": (self.display_rss_parameter_set, None),
+                # Scene: Pedestrian
+                "unstructured_display": (self.display_unstructured, None)}
 
         # Scene: Change RSS Parameters
         self.switch_to_assertive_parameters(0, False)
@@ -389,6 +378,7 @@ class World(object):
 
     def on_world_tick(self, world_snapshot):
         self._hud.on_world_tick(world_snapshot)
+        self.actor_registry.on_world_tick(world_snapshot)
 
         if self._demo_mode:
             #check distance between vehicle and next waypoint.
@@ -447,12 +437,40 @@ class World(object):
             pass
         self.client.set_timeout(global_client_timeout)
 
+    def bind_event(self, action, arg, event_id):
+        """
+        Resolves an action of a geofence script to the (event id, callback) of the location event handler
+        """
+        if action not in self._event_actions:
+            raise ValueError("Unknown geofence action '{}'".format(action))
+        fct, arg_ids = self._event_actions[action]
+        if arg_ids is not None:
+            if arg not in arg_ids:
+                raise ValueError("Unknown argument '{}' of geofence action '{}'".format(arg, action))
+            event_id = arg_ids[arg]
+        return event_id, fct
+
+    def get_geofence_script(self, scenario_file):
+        if not self._demo_mode or not scenario_file:
+            return None
+        if scenario_file not in self._geofence_scripts:
+            self._geofence_scripts[scenario_file] = GeofenceScript.load(scenario_file)
+        return self._geofence_scripts[scenario_file]
+
     def restart(self, scenario_file, reset_position=False):
-        if scenario_file in self._routing_targets_dict:
-            routing_targets = self._routing_targets_dict[scenario_file]
+        restart_time = time.time()
+        geofence_script = self.get_geofence_script(scenario_file)
+        if geofence_script is not None and geofence_script.routing_targets:
+            routing_targets = [carla.Transform(carla.Location(x=x, y=y)) for x, y in geofence_script.routing_targets]
         else:
             print("Could not find routing for scenario {}. RSS might not work as expected!".format(scenario_file))
             routing_targets = []
+        if geofence_script is not None and geofence_script.events_hash != self._loaded_events_hash:
+            self.location_event_handler.load_events(geofence_script.events, geofence_script.grid,
+                                                    geofence_script.cell_size, self.bind_event)
+            self._loaded_events_hash = geofence_script.events_hash
+
+        self.export_rss_interventions()
 
         #disable reverse gear
         if self._wheel_ctrl:
@@ -476,29 +494,20 @@ class World(object):
             print(e)
 
         if self._demo_mode:
-            if not scenario_file or scenario_file == "CARLADemo.xosc":
+            intro = geofence_script.intro if geofence_script is not None else None
+            if not scenario_file:
+                intro = {"action": "welcome_dialog"}
+            if intro and intro.get("action") == "welcome_dialog":
                 self._welcome_dialog.show_loading(True)
                 self._welcome_dialog.enable()
                 self._welcome_dialog.render(self._display)
-            elif scenario_file == "scenarios/F6.xosc":
+            elif intro and intro.get("action") == "rss_info_dialog":
                 self._rss_info_dialog.show_loading(True)
-                self._rss_info_dialog.enable_id(self._rss_info_dialog_longitudinal)
-                self._rss_info_dialog.render(self._display)
-            elif scenario_file == "scenarios/F7.xosc":
-                self._rss_info_dialog.show_loading(True)
-                self._rss_info_dialog.enable_id(self._rss_info_dialog_right_of_way)
-                self._rss_info_dialog.render(self._display)
-            elif scenario_file == "scenarios/F8.xosc":
-                self._rss_info_dialog.show_loading(True)
-                self._rss_info_dialog.enable_id(self._rss_info_dialog_pedestrians)
-                self._rss_info_dialog.render(self._display)
-            elif scenario_file == "scenarios/F9.xosc":
-                self._rss_info_dialog.show_loading(True)
-                self._rss_info_dialog.enable_id(self._rss_info_dialog_parameters)
+                self._rss_info_dialog.enable_id(self.bind_event("rss_info_dialog", intro.get("arg"), None)[0])
                 self._rss_info_dialog.render(self._display)
 
         pygame.display.flip()
-        self._scenario_runner.shutdown()
+        self._scenario_runner.stop_scenario()
         # Keep same camera config if the camera manager exists.
         cam_index = self.camera_manager.index if self.camera_manager is not None else 0
         cam_pos_index = self.camera_manager.transform_index if self.camera_manager is not None else 0
@@ -525,10 +534,10 @@ class World(object):
             dim = (self._display.get_width(), self._display.get_height())
             self.unstructured_scene_drawer = RssUnstructuredSceneVisualizer(self.player, self.world, dim)
             self.location_event_handler.retrigger(self.player, 1005)
-            self._bounding_box_drawer = RssBoundingBoxVisualizer(dim, self.world, self.camera_manager.sensor)
+            self._bounding_box_drawer = RssBoundingBoxVisualizer(dim, self.world, self.camera_manager.sensor, self.actor_registry)
             # TODO: check for hud state visualizer to pass to rss sensor, currently None
             self.rss_sensor = RssSensor(self.player, self.world,
-                                        self.unstructured_scene_drawer, self._bounding_box_drawer, None, routing_targets)
+                                        self.unstructured_scene_drawer, self._bounding_box_drawer, None, routing_targets, self.actor_registry)
             self.rss_sensor.sensor.set_log_level(self.rss_sensor_log_level)
             self.rss_sensor.sensor.set_map_log_level(self.rss_sensor_log_level)
 
@@ -547,6 +556,7 @@ class World(object):
             if not scenario_started:
                 self._overlay_dialog.set_text("Error while starting scenario.")
             else:
+                print("Restart of scenario {} ready after {:.0f} ms".format(scenario_file, 1e3 * (time.time() - restart_time)))
                 self._welcome_dialog.show_loading(False)
                 self._rss_info_dialog.show_loading(False)
         else:
@@ -654,29 +664,61 @@ class World(object):
 
         #write to rss history
         if self._hud.frame:
-            self._hud.rss_intervention_history.append((self._hud.frame, restrict_active))
-            if len(self._hud.rss_intervention_history) > 4000:
-                self._hud.rss_intervention_history.pop(0)
+            self._hud.rss_intervention_history.append(self._hud.frame, restrict_active)
 
-    def tick(self, clock):
-        if self._wheel_ctrl.parse_events(self, clock):
-            return True
-        self.location_event_handler.tick(self.player)
+    def export_rss_interventions(self):
+        if not self._intervention_log_dir:
+            return
+        file_name = os.path.join(self._intervention_log_dir, "rss_interventions_{}.csv".format(datetime.datetime.now().strftime("%Y%m%d_%H%M%S")))
+        try:
+            if self._hud.export_rss_intervention_history(file_name):
+                print("Saved RSS intervention timeline to {}".format(file_name))
+        except (IOError, OSError) as e:
+            # losing the log must not prevent the restart / shutdown
+            logging.error('Could not save RSS intervention timeline to %s: %s', file_name, e)
+        self._hud.rss_intervention_history.clear()
 
-        self.vehicles = self.world.get_actors().filter('vehicle.*')
+    def tick(self, clock):
+        """
+        Render thread: handle pygame events and location events (which might show dialogs).
+        Returns True if the application should quit.
+        """
+        with self.lock:
+            if self._wheel_ctrl.parse_events(self):
+                return True
+            self._wheel_ctrl.sample_input()
+            self.location_event_handler.tick(self.player)
 
         self._notifications.tick(clock)
-        self._hud.tick(self, self.player, self.rss_sensor, self.vehicles, clock)
-        self._dashboard.tick(self.player,
-            self.rss_sensor,
+        return False
+
+    def tick_control(self, milliseconds, frame_stats=None):
+        """
+        Control thread: calculate and apply the vehicle control and update the dialog snapshots.
+
+        The lock is only held to take a consistent snapshot of the player and its sensors, the RPCs are
+        made outside of it so they never block the event handling of the render thread. If a restart
+        destroys the player meanwhile, the RPCs fail with a RuntimeError and the tick is skipped.
+        """
+        with self.lock:
+            player = self.player
+            rss_sensor = self.rss_sensor
+        if player is None:
+            return
+
+        self._wheel_ctrl.tick(self, player, rss_sensor, milliseconds)
+
+        self.actor_registry.refresh()
+
+        self._hud.tick(self, player, rss_sensor, self.actor_registry, frame_stats)
+        self._dashboard.tick(player,
+            rss_sensor,
             self.restricted_vehicle_control,
             self.restrict_longitudinal_active,
             self.restrict_lateral_active,
             self.speed_limit,
             self.throttle_input)
 
-        return False
-
     def render(self, display):
         self.camera_manager.render(display)
         if self._bounding_box_drawer:
@@ -743,6 +785,7 @@ class World(object):
 
     def destroy(self):
         print("Shutting down manual control.")
+        self.export_rss_interventions()
         self.destroy_player()
         self.remove_traffic_participants()
         self._scenario_runner.shutdown()
@@ -909,6 +952,57 @@ class CameraManager(object):
             image.save_to_disk('_out/%08d' % image.frame)
 
 
+# ==============================================================================
+# -- ControlLoop ---------------------------------------------------------------
+# ==============================================================================
+
+
+class ControlLoop(object):
+    """
+    Runs World.tick_control at a fixed rate in its own thread,
+    to decouple the control latency from the rendering.
+    """
+
+    def __init__(self, world, rate, render_scheduler):
+        self._world = world
+        self._scheduler = FrameScheduler("control", rate)
+        self._render_scheduler = render_scheduler
+        self._stop_event = Event()
+        self._thread = None
+        self.error = None
+
+    def start(self):
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_frame_stats(self):
+        return [(self._render_scheduler.name, self._render_scheduler.get_stats()),
+                (self._scheduler.name, self._scheduler.get_stats())]
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            milliseconds = self._scheduler.wait()
+            try:
+                self._world.tick_control(milliseconds, self.get_frame_stats())
+            except RuntimeError as e:
+                # carla errors (e.g. timeouts while paused) are not fatal
+                print(e)
+            except Exception as e:
+                print("Control loop failed: {}".format(e))
+                self.error = e
+                return
+
+
 # ==============================================================================
 # -- game_loop() ---------------------------------------------------------------
 # ==============================================================================
@@ -919,6 +1013,7 @@ def game_loop(args):
     pygame.font.init()
     pygame.display.set_caption("CARLA RSS Demo")
     world = None
+    control_loop = None
 
     try:
         client = carla.Client(args.host, args.port)
@@ -936,7 +1031,7 @@ def game_loop(args):
             pygame.display.toggle_fullscreen()
 
         overlay_dialog = OverlayDialog(args.width, args.height)
-        scenario_runner = ScenarioRunnerRunner()
+        scenario_runner = ScenarioRunnerRunner(args.scenario_worker)
 
 
         clock = pygame.time.Clock()
@@ -945,12 +1040,16 @@ def game_loop(args):
         overlay_dialog.render(display)
         pygame.display.flip()
 
-        world = World(client, scenario_runner, overlay_dialog, display, args.scenario, args.autopilot, not args.norss, args.walkers, not args.nodemo, not args.nowheel)
+        world = World(client, scenario_runner, overlay_dialog, display, args.scenario, args.autopilot, not args.norss, args.walkers, not args.nodemo, not args.nowheel, args.intervention_log)
         world.start()
 
-        while True:
-            clock.tick_busy_loop(60)
-            #print(clock.get_fps())
+        render_scheduler = FrameScheduler("render", args.fps)
+        control_loop = ControlLoop(world, args.control_rate, render_scheduler)
+        control_loop.start()
+
+        while control_loop.is_alive():
+            render_scheduler.wait()
+            clock.tick()
 
             if world.tick(clock):
                 return
@@ -967,6 +1066,8 @@ def game_loop(args):
     except Exception as e:
         print(e)
     finally:
+        if control_loop is not None:
+            control_loop.stop()
 
         if world is not None:
             world.destroy()
@@ -1032,10 +1133,37 @@ def main():
         '--nowheel',
         action='store_true',
         help='do not use steering wheel')
+    argparser.add_argument(
+        '--intervention-log',
+        metavar='DIR',
+        default=None,
+        help='save the RSS intervention timeline of each session as csv into this directory')
+    argparser.add_argument(
+        '--fps',
+        metavar='FPS',
+        default=60,
+        type=int,
+        help='render frame rate (default: 60)')
+    argparser.add_argument(
+        '--control-rate',
+        metavar='HZ',
+        default=60,
+        type=int,
+        help='rate of the vehicle control loop (default: 60)')
+    argparser.add_argument(
+        '--scenario-worker',
+        action='store_true',
+        help='keep a scenario runner process alive to restart scenarios faster')
     args = argparser.parse_args()
 
     args.width, args.height = [int(x) for x in args.res.split('x')]
 
+    if args.intervention_log:
+        try:
+            os.makedirs(args.intervention_log, exist_ok=True)
+        except OSError as e:
+            argparser.error("cannot create intervention log directory {}: {}".format(args.intervention_log, e))
+
     log_level = logging.DEBUG if args.debug else logging.INFO
     logging.basicConfig(format='%(levelname)s: %(message)s', level=log_level)
 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2020 Intel Corporation
+#
+"""
+Load test of the grid index of the LocationEventHandler: thousands of geofences,
+the events triggered while driving through them have to be the same as with a brute force
+evaluation of all events (including the hysteresis when leaving them).
+
+Run with pytest or standalone (python tests/test_location_event_handler.py) to print timings.
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
+
+from location_event_handler import LocationEventHandler  # pylint: disable=wrong-import-position
+from geofence_script import GeofenceScript  # pylint: disable=wrong-import-position
+
+NUM_EVENTS = 5000
+NUM_STEPS = 5000
+CELL_SIZE = 50.0
+HYSTERESIS = 1.0
+WORLD_SIZE = 2000.0
+
+
+class Location(object):
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Player(object):
+
+    def __init__(self):
+        self.location = Location(0.0, 0.0)
+
+    def get_location(self):
+        return self.location
+
+
+class BruteForceEventHandler(object):
+
+    """
+    Reference: evaluates every event on every tick
+    """
+
+    def __init__(self, hysteresis):
+        self._hysteresis = hysteresis
+        self._events = []
+
+    def register_event(self, pos, max_distance, id, fct):
+        self._events.append([pos, max_distance, id, fct, False])
+
+    def tick(self, player):
+        location = player.get_location()
+        for event in self._events:
+            pos, max_distance, id, fct, active = event
+            distance = math.sqrt((location.x - pos[0]) ** 2 + (location.y - pos[1]) ** 2)
+            if distance < max_distance and not active:
+                event[4] = True
+                fct(id, True)
+            elif active and distance > max_distance + self._hysteresis:
+                event[4] = False
+                fct(id, False)
+
+
+def create_events(rng):
+    return [((rng.uniform(0, WORLD_SIZE), rng.uniform(0, WORLD_SIZE)), rng.choice([2.0, 5.0, 15.0, 50.0, 120.0]))
+            for _ in range(NUM_EVENTS)]
+
+
+def create_trajectory(rng):
+    """
+    Random walk, which often stops or turns around at event borders to exercise the hysteresis
+    """
+    x, y = WORLD_SIZE / 2, WORLD_SIZE / 2
+    heading = 0.0
+    trajectory = []
+    for _ in range(NUM_STEPS):
+        heading += rng.gauss(0.0, 0.3)
+        step = rng.choice([0.0, 0.3, 1.0, 3.0])
+        if rng.random() < 0.05:
+            # jitter back and forth
+            heading += math.pi
+        x = min(max(x + step * math.cos(heading), -100.0), WORLD_SIZE + 100.0)
+        y = min(max(y + step * math.sin(heading), -100.0), WORLD_SIZE + 100.0)
+        trajectory.append((x, y))
+    return trajectory
+
+
+def drive(handler, trajectory):
+    player = Player()
+    start_time = time.time()
+    for x, y in trajectory:
+        player.location = Location(x, y)
+        handler.tick(player)
+    return time.time() - start_time
+
+
+def record_into(log):
+    def record(id, active):
+        log.append((id, active))
+    return record
+
+
+def _silence_handler_output():
+    import location_event_handler  # pylint: disable=import-outside-toplevel
+    location_event_handler.print = lambda *args, **kwargs: None
+
+
+def run(verbose=False):
+    _silence_handler_output()
+    rng = random.Random(42)
+    events = create_events(rng)
+    trajectory = create_trajectory(rng)
+
+    reference_log = []
+    reference = BruteForceEventHandler(HYSTERESIS)
+    for id, (pos, max_distance) in enumerate(events):
+        reference.register_event(pos, max_distance, id, record_into(reference_log))
+    reference_time = drive(reference, trajectory)
+
+    grid_log = []
+    handler = LocationEventHandler(CELL_SIZE, HYSTERESIS)
+    for id, (pos, max_distance) in enumerate(events):
+        handler.register_event(pos, max_distance, id, record_into(grid_log))
+    grid_time = drive(handler, trajectory)
+
+    # precompiled event table of a geofence script
+    script = GeofenceScript.compile("load_test", {
+        "events": [{"pos": list(pos), "radius": max_distance, "action": "test", "id": id}
+                   for id, (pos, max_distance) in enumerate(events)]}, CELL_SIZE)
+    script_log = []
+    script_handler = LocationEventHandler(hysteresis=HYSTERESIS)
+    script_handler.load_events(script.events, script.grid, script.cell_size,
+                               lambda action, arg, id: (id, record_into(script_log)))
+    script_time = drive(script_handler, trajectory)
+
+    if verbose:
+        print("{} events, {} ticks, {} state changes".format(NUM_EVENTS, NUM_STEPS, len(reference_log)))
+        print("brute force: {:.1f} us per tick".format(1e6 * reference_time / NUM_STEPS))
+        print("grid:        {:.1f} us per tick".format(1e6 * grid_time / NUM_STEPS))
+        print("script grid: {:.1f} us per tick".format(1e6 * script_time / NUM_STEPS))
+
+    return reference_log, grid_log, script_log
+
+
+def test_grid_matches_brute_force():
+    reference_log, grid_log, script_log = run()
+    # the walk has to activate and release events, otherwise nothing is compared
+    assert any(active for _, active in reference_log)
+    assert any(not active for _, active in reference_log)
+    assert grid_log == reference_log
+    assert script_log == reference_log
+
+
+def test_hysteresis():
+    _silence_handler_output()
+    log = []
+    handler = LocationEventHandler(CELL_SIZE, HYSTERESIS)
+    handler.register_event((0.0, 0.0), 10.0, 1, record_into(log))
+    player = Player()
+    for x in [20.0, 9.9, 10.5, 9.5, 10.9, 11.1, 10.5, 9.9]:
+        player.location = Location(x, 0.0)
+        handler.tick(player)
+    # active below 10, released only beyond 11
+    assert log == [(1, True), (1, False), (1, True)]
+
+
+if __name__ == '__main__':
+    reference_log, grid_log, script_log = run(verbose=True)
+    if grid_log != reference_log or script_log != reference_log:
+        print("MISMATCH between grid and brute force evaluation")
+        sys.exit(1)
+    print("grid and brute force evaluation triggered the same events")